@@ -89,7 +89,7 @@ def setup_module(module):
     print("******************************************\n")
 
     print("Cleanup old Mininet runs")
-    os.system('sudo mn -c > /dev/null 2>&1')
+    topotest.mininet_cleanup()
     os.system('sudo rm /tmp/r* > /dev/null 2>&1')
 
     thisDir = os.path.dirname(os.path.realpath(__file__))
@@ -55,11 +55,10 @@ sys.path.append(os.path.join(CWD, "../lib/"))
 
 # pylint: disable=C0413
 # Import topogen and topotest helpers
-from lib.topogen import Topogen, get_topogen
+from lib.topogen import get_topogen
 from mininet.topo import Topo
 
 from lib.common_config import (
-    start_topology,
     write_test_header,
     write_test_footer,
     reset_config_on_routers,
@@ -77,7 +76,11 @@ from lib.bgp import (
     clear_bgp_and_verify,
     verify_bgp_timers_and_functionality,
 )
-from lib.topojson import build_topo_from_json, build_config_from_json
+from lib.topojson import (
+    build_topo_from_json,
+    build_config_from_json,
+    start_topology_from_json,
+)
 
 # Reading the data from JSON File for topology creation
 jsonFile = "{}/bgp_basic_functionality.json".format(CWD)
@@ -120,16 +123,10 @@ def setup_module(mod):
 
     logger.info("Running setup_module to create topology")
 
-    # This function initiates the topology build with Topogen...
-    tgen = Topogen(CreateTopo, mod.__name__)
-    # ... and here it calls Mininet initialization functions.
-
-    # Starting topology, create tmp files which are loaded to routers
-    #  to start deamons and then start routers
-    start_topology(tgen)
-
-    # Creating configuration from JSON
-    build_config_from_json(tgen, topo)
+    # This function initiates the topology build with Topogen, starts the
+    # routers and loads the configuration from JSON (or reuses the topology
+    # kept running by a previous test module, see `reuse_topology`).
+    tgen = start_topology_from_json(CreateTopo, mod.__name__, topo)
 
     global BGP_CONVERGENCE
     BGP_CONVERGENCE = verify_bgp_convergence(tgen, topo)
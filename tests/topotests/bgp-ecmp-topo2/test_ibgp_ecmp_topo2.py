@@ -49,11 +49,10 @@ sys.path.append(os.path.join(CWD, "../../"))
 
 # pylint: disable=C0413
 # Import topogen and topotest helpers
-from lib.topogen import Topogen, get_topogen
+from lib.topogen import get_topogen
 from mininet.topo import Topo
 
 from lib.common_config import (
-    start_topology,
     write_test_header,
     write_test_footer,
     verify_rib,
@@ -64,7 +63,11 @@ from lib.common_config import (
 )
 from lib.topolog import logger
 from lib.bgp import verify_bgp_convergence, create_router_bgp, clear_bgp
-from lib.topojson import build_topo_from_json, build_config_from_json
+from lib.topojson import (
+    build_topo_from_json,
+    build_config_from_json,
+    start_topology_from_json,
+)
 
 # Reading the data from JSON File for topology and configuration creation
 jsonFile = "{}/ibgp_ecmp_topo2.json".format(CWD)
@@ -114,15 +117,10 @@ def setup_module(mod):
 
     logger.info("Running setup_module to create topology")
 
-    # This function initiates the topology build with Topogen...
-    tgen = Topogen(CreateTopo, mod.__name__)
-
-    # Starting topology, create tmp files which are loaded to routers
-    #  to start deamons and then start routers
-    start_topology(tgen)
-
-    # Creating configuration from JSON
-    build_config_from_json(tgen, topo)
+    # This function initiates the topology build with Topogen, starts the
+    # routers and loads the configuration from JSON (or reuses the topology
+    # kept running by a previous test module, see `reuse_topology`).
+    tgen = start_topology_from_json(CreateTopo, mod.__name__, topo)
 
     # Don't run this test if we have any failure.
     if tgen.routers_have_failure():
@@ -76,13 +76,12 @@ sys.path.append(os.path.join(CWD, "../"))
 # pylint: disable=C0413
 # Import topogen and topotest helpers
 from lib import topotest
-from lib.topogen import Topogen, get_topogen
+from lib.topogen import get_topogen
 from mininet.topo import Topo
 
 # Required to instantiate the topology builder class.
 from lib.topojson import *
 from lib.common_config import (
-    start_topology,
     write_test_header,
     write_test_footer,
     verify_bgp_community,
@@ -105,7 +104,11 @@ from lib.bgp import (
     clear_bgp_and_verify,
     verify_bgp_attributes,
 )
-from lib.topojson import build_topo_from_json, build_config_from_json
+from lib.topojson import (
+    build_topo_from_json,
+    build_config_from_json,
+    start_topology_from_json,
+)
 
 
 # Global variables
@@ -157,16 +160,10 @@ def setup_module(mod):
 
     logger.info("Running setup_module to create topology")
 
-    # This function initiates the topology build with Topogen...
-    tgen = Topogen(CreateTopo, mod.__name__)
-    # ... and here it calls Mininet initialization functions.
-
-    # Starting topology, create tmp files which are loaded to routers
-    #  to start deamons and then start routers
-    start_topology(tgen)
-
-    # Creating configuration from JSON
-    build_config_from_json(tgen, topo)
+    # This function initiates the topology build with Topogen, starts the
+    # routers and loads the configuration from JSON (or reuses the topology
+    # kept running by a previous test module, see `reuse_topology`).
+    tgen = start_topology_from_json(CreateTopo, mod.__name__, topo)
 
     # Checking BGP convergence
     global bgp_convergence
@@ -1,4 +1,5 @@
 from lutil import luCommand
+from lib import memstats
 
 num = 50000
 b = int(num / (256 * 256))
@@ -12,23 +13,20 @@ if c > 0:
 else:
     d = r
 wait = 2 * num / 1000
-mem_z = {}
-mem_b = {}
+mem = {}
 rtrs = ["ce1", "ce2", "ce3", "r1", "r2", "r3", "r4"]
 for rtr in rtrs:
-    mem_z[rtr] = {"value": 0, "units": "unknown"}
-    mem_b[rtr] = {"value": 0, "units": "unknown"}
+    mem[rtr] = {}
     ret = luCommand(
         rtr,
         'vtysh -c "show memory"',
-        "zebra: System allocator statistics:   Total heap allocated: *(\d*) ([A-Za-z]*) .*bgpd: System allocator statistics:   Total heap allocated: *(\d*) ([A-Za-z]*)",
+        ".*",
         "none",
-        "collect bgpd memory stats",
+        "collect memory stats",
     )
-    found = luLast()
+    found = luLast(usenl=True)
     if ret != False and found != None:
-        mem_z[rtr] = {"value": int(found.group(1)), "units": found.group(2)}
-        mem_b[rtr] = {"value": int(found.group(3)), "units": found.group(4)}
+        mem[rtr] = memstats.parse_show_memory(found.group())
 
 luCommand(
     "ce1", 'vtysh -c "show mem"', "qmem sharpd", "none", "check if sharpd running"
@@ -188,47 +186,36 @@ else:
         ret = luCommand(
             rtr,
             'vtysh -c "show memory"',
-            "zebra: System allocator statistics:   Total heap allocated: *(\d*) ([A-Za-z]*) .*bgpd: System allocator statistics:   Total heap allocated: *(\d*) ([A-Za-z]*)",
+            ".*",
             "none",
-            "collect bgpd memory stats",
+            "collect memory stats",
         )
-        found = luLast()
+        found = luLast(usenl=True)
         if ret != False and found != None:
-            val_z = int(found.group(1))
-            if mem_z[rtr]["units"] != found.group(2):
-                val_z *= 1000
-            delta_z = val_z - int(mem_z[rtr]["value"])
-            ave_z = float(delta_z) / float(num)
-
-            val_b = int(found.group(3))
-            if mem_b[rtr]["units"] != found.group(4):
-                val_b *= 1000
-            delta_b = val_b - int(mem_b[rtr]["value"])
-            ave_b = float(delta_b) / float(num)
-            luCommand(
-                rtr,
-                'vtysh -c "show thread cpu"',
-                ".",
-                "pass",
-                "BGPd heap: {0} {1} --> {2} {3} ({4} {1}/vpn route)".format(
-                    mem_b[rtr]["value"],
-                    mem_b[rtr]["units"],
-                    found.group(3),
-                    found.group(4),
-                    round(ave_b, 4),
-                ),
-            )
-            luCommand(
-                rtr,
-                'vtysh -c "show thread cpu"',
-                ".",
-                "pass",
-                "Zebra heap: {0} {1} --> {2} {3} ({4} {1}/vpn route)".format(
-                    mem_z[rtr]["value"],
-                    mem_z[rtr]["units"],
-                    found.group(1),
-                    found.group(2),
-                    round(ave_z, 4),
-                ),
-            )
+            after = memstats.parse_show_memory(found.group())
+            delta = memstats.diff(mem[rtr], after)
+            for daemon in ["bgpd", "zebra"]:
+                if daemon not in delta:
+                    continue
+                before = mem[rtr].get(daemon, {"allocator": {}})
+                heap = delta[daemon]["allocator"].get("Total heap allocated", 0)
+                growth = [
+                    "{}: {} +{} bytes ({} bytes/vpn route)".format(
+                        group, mtype, size, round(float(size) / num, 4)
+                    )
+                    for group, mtype, size, _ in memstats.top_growth(delta[daemon], 3)
+                ]
+                luCommand(
+                    rtr,
+                    'vtysh -c "show thread cpu"',
+                    ".",
+                    "pass",
+                    "{0} heap: {1} --> {2} bytes ({3} bytes/vpn route) {4}".format(
+                        daemon,
+                        before["allocator"].get("Total heap allocated"),
+                        after[daemon]["allocator"].get("Total heap allocated"),
+                        round(float(heap) / num, 4),
+                        "; ".join(growth),
+                    ),
+                )
 # done
@@ -2,9 +2,19 @@
 Topotest conftest.py file.
 """
 
-from lib.topogen import get_topogen, diagnose_env
-from lib.topotest import json_cmp_result
+import os
+
+from lib.topogen import get_topogen, diagnose_env, release_topology_cache
+from lib.topotest import json_cmp_result, get_logdir_base, get_worker_id
 from lib.topolog import logger
+from lib import telemetry
+from lib import vtyshprofile
+from lib import sleepcheck
+from lib import threadcpu
+from lib import procsampler
+from lib import benchmark
+from lib import durations
+from lib import vtyshreplay
 import pytest
 
 topology_only = False
@@ -20,15 +30,91 @@ def pytest_addoption(parser):
         action="store_true",
         help="Only set up this topology, don't run tests",
     )
+    parser.addoption(
+        "--telemetry",
+        action="store_true",
+        help="Write a performance telemetry report for every test module",
+    )
+    parser.addoption(
+        "--vtysh-profile",
+        action="store_true",
+        help="Write latency and output size histograms of the vtysh commands",
+    )
+    parser.addoption(
+        "--sleep-report",
+        action="store_true",
+        help="Write a report of the (possibly) wasted sleeps by call site",
+    )
+    parser.addoption(
+        "--sleep-sample",
+        action="store_true",
+        help="Check the awaited conditions before sleeping (implies --sleep-report)",
+    )
+    parser.addoption(
+        "--thread-cpu",
+        metavar="DAEMONS",
+        help="Attribute the CPU of the daemons (comma separated list or 'all') "
+        "to the test steps with 'show thread cpu'",
+    )
+    parser.addoption(
+        "--proc-sample",
+        metavar="SECONDS",
+        type=float,
+        help="Sample the daemons memory, CPU and file descriptors every SECONDS",
+    )
+    parser.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        help="Default fraction of the baseline a benchmark metric may regress "
+        "(default 0.1)",
+    )
+    parser.addoption(
+        "--benchmark-window",
+        type=int,
+        help="Number of previous results in a benchmark baseline (default 10)",
+    )
+    parser.addoption(
+        "--longest-first",
+        action="store_true",
+        help="Run the test modules that took longest in previous runs first",
+    )
+    parser.addoption(
+        "--vtysh-record",
+        metavar="ARCHIVE",
+        help="Record the vtysh command outputs to ARCHIVE for offline replay",
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def topology_cache():
+    """
+    Session scoped topology reuse (see `reuse_topology` in pytest.ini): JSON
+    topologies are kept running between test modules and the last one is
+    stopped when the session ends.
+    """
+    yield
+    release_topology_cache()
 
 
-def pytest_runtest_call():
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    "Attribute the telemetry to the test setup (including setup_module())."
+    telemetry.begin(item.module.__name__, item.name, "setup")
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
     """
     This function must be run after setup_module(), it does standarized post
-    setup routines. It is only being used for the 'topology-only' option.
+    setup routines. It is used for the 'topology-only' option and to check
+    the metrics of the `frr_benchmark` tests against their baselines.
     """
     global topology_only
 
+    telemetry.begin(item.module.__name__, item.name, "call")
+    procsampler.annotate(item.name)
+    threadcpu.begin_test(item.module.__name__, item.name)
+
     if topology_only:
         tgen = get_topogen()
         if tgen is not None:
@@ -37,6 +123,78 @@ def pytest_runtest_call():
 
         pytest.exit("the topology executed successfully")
 
+    marker = item.get_closest_marker("frr_benchmark")
+    if marker is not None:
+        benchmark.begin(item.nodeid, **marker.kwargs)
+    outcome = yield
+    if marker is not None:
+        regressions = benchmark.finish(success=outcome.excinfo is None)
+        if regressions:
+            pytest.fail(benchmark.format_regressions(regressions))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """
+    Attribute the telemetry to the test teardown and write the module reports
+    after its last test.
+    """
+    threadcpu.end_test()
+    telemetry.begin(item.module.__name__, item.name, "teardown")
+    yield
+    if nextitem is not None and nextitem.module is item.module:
+        return
+    logdir = os.path.join(get_logdir_base(), item.module.__name__)
+    if telemetry.enabled():
+        telemetry.write_report(logdir)
+    if threadcpu.enabled():
+        threadcpu.write_report(logdir)
+
+
+def pytest_collection_modifyitems(session, config, items):
+    "Order the test modules longest first when asked to."
+    if not (
+        config.getoption("--longest-first") or os.environ.get("TOPOTESTS_LONGEST_FIRST")
+    ):
+        return
+    estimates = durations.module_estimates()
+    durations.order_items(items, estimates)
+    if get_worker_id() in [None, "gw0"]:
+        workers = getattr(config.option, "numprocesses", None)
+        modules = []
+        for item in items:
+            module = durations.module_of(item.nodeid)
+            if module not in modules:
+                modules.append(module)
+        durations.log_estimate(
+            modules, estimates, workers if isinstance(workers, int) else 1
+        )
+
+
+def pytest_runtest_logreport(report):
+    "Record the test durations (pytest-xdist: in the controller only)."
+    if get_worker_id() is None:
+        durations.record(report.nodeid, report.when, report.duration, report.outcome)
+
+
+def pytest_sessionfinish(session):
+    "Write the reports collected over the whole session."
+    if get_worker_id() is None:
+        durations.save()
+    if vtyshprofile.enabled():
+        vtyshprofile.write_report(get_logdir_base())
+    if sleepcheck.enabled():
+        sleepcheck.write_report(get_logdir_base())
+    benchmark.write_report(get_logdir_base())
+    archive = session.config.getoption("--vtysh-record") or os.environ.get(
+        "TOPOTESTS_VTYSH_RECORD"
+    )
+    if archive and vtyshreplay.recording():
+        worker = get_worker_id()
+        if worker is not None:
+            archive = "{}.{}".format(archive, worker)
+        vtyshreplay.write_archive(archive)
+
 
 def pytest_assertrepr_compare(op, left, right):
     """
@@ -62,6 +220,52 @@ def pytest_configure(config):
     if config.getoption("--topology-only"):
         topology_only = True
 
+    if config.getoption("--telemetry") or os.environ.get("TOPOTESTS_TELEMETRY"):
+        telemetry.enable()
+
+    if config.getoption("--vtysh-profile") or os.environ.get("TOPOTESTS_VTYSH_PROFILE"):
+        vtyshprofile.enable()
+
+    sample = config.getoption("--sleep-sample") or os.environ.get(
+        "TOPOTESTS_SLEEP_SAMPLE"
+    )
+    if (
+        sample
+        or config.getoption("--sleep-report")
+        or os.environ.get("TOPOTESTS_SLEEP_REPORT")
+    ):
+        sleepcheck.enable(sample=bool(sample))
+
+    daemons = config.getoption("--thread-cpu") or os.environ.get("TOPOTESTS_THREAD_CPU")
+    if daemons:
+        daemons = [daemon.strip() for daemon in daemons.split(",") if daemon.strip()]
+        threadcpu.enable(None if "all" in daemons else daemons)
+
+    interval = config.getoption("--proc-sample") or os.environ.get(
+        "TOPOTESTS_PROC_SAMPLE"
+    )
+    if interval:
+        procsampler.enable(float(interval))
+
+    config.addinivalue_line(
+        "markers",
+        "frr_benchmark(tolerance, window, min_samples): test reporting "
+        "performance metrics (see lib/benchmark.py)",
+    )
+    if config.getoption("--vtysh-record") or os.environ.get("TOPOTESTS_VTYSH_RECORD"):
+        vtyshreplay.start_recording()
+
+    benchmark.configure(
+        tolerance=config.getoption("--benchmark-tolerance"),
+        window=config.getoption("--benchmark-window"),
+    )
+
+    # pytest-xdist: all tests of a module share the module topology, so they
+    # must run in the same worker.
+    if getattr(config.option, "dist", "no") == "load":
+        logger.info("pytest-xdist: using '--dist loadfile' instead of 'load'")
+        config.option.dist = "loadfile"
+
 
 def pytest_runtest_makereport(item, call):
     "Log all assert messages to default logger with error level"
@@ -168,7 +168,7 @@ def setup_module(module):
     print("******************************************\n")
 
     print("Cleanup old Mininet runs")
-    os.system("sudo mn -c > /dev/null 2>&1")
+    topotest.mininet_cleanup()
 
     thisDir = os.path.dirname(os.path.realpath(__file__))
     topo = NetworkTopo()
@@ -0,0 +1,244 @@
+#
+# benchmark.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Benchmark metrics with regression thresholds.
+
+Tests marked with `@pytest.mark.frr_benchmark` report named measurements
+with metric():
+
+    @pytest.mark.frr_benchmark(tolerance=0.2)
+    def test_bgp_convergence():
+        with benchmark.timer("convergence"):
+            wait_for_routes()
+        benchmark.metric("routes/s", routes / seconds, higher_is_better=True)
+
+Every result is appended to a local results store (STORE_FILE, or the
+TOPOTESTS_BENCHMARK_STORE environment variable, JSON lines) shared by all
+test runs of the host. When the test finishes, every metric is compared to
+its baseline: the median of the last `window` results of the same test and
+metric that were not regressions themselves (at least `min_samples` of
+them, otherwise there is no baseline yet). A metric worse than the baseline
+by more than `tolerance` (a fraction of the baseline) fails the test.
+
+The defaults come from `pytest --benchmark-tolerance/--benchmark-window`,
+the marker arguments (`tolerance`, `window`, `min_samples`) override them
+for a test and the metric() arguments for a metric.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from lib.topolog import logger
+from lib import reports
+
+STORE_FILE = "/tmp/topotests/benchmarks.jsonl"
+
+_options = {"tolerance": 0.1, "window": 10, "min_samples": 3}
+_lock = threading.Lock()
+_state = {"test": None, "options": None}
+_metrics = []
+_session = []
+
+
+def configure(tolerance=None, window=None, min_samples=None):
+    "Sets the default tolerance, window and minimum samples of the baselines."
+    for key, value in [
+        ("tolerance", tolerance),
+        ("window", window),
+        ("min_samples", min_samples),
+    ]:
+        if value is not None:
+            _options[key] = value
+
+
+def store_file():
+    "Returns the results store path."
+    return os.environ.get("TOPOTESTS_BENCHMARK_STORE") or STORE_FILE
+
+
+def load_results(path=None):
+    "Returns all the results of the store."
+    results = []
+    try:
+        with open(path or store_file()) as store:
+            for line in store:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    continue
+    except (IOError, OSError):
+        pass
+    return results
+
+
+def append_results(entries, path=None):
+    "Appends `entries` to the store."
+    path = path or store_file()
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # A single append keeps concurrent writers (pytest-xdist) from
+        # mixing lines
+        with open(path, "a") as store:
+            store.write(
+                "".join(json.dumps(entry, sort_keys=True) + "\n" for entry in entries)
+            )
+    except (IOError, OSError) as error:
+        logger.warning("benchmark: failed to store results: {}".format(error))
+
+
+def baseline(history, window, min_samples):
+    """
+    Returns the median of the last `window` values of `history` (the
+    results of a metric, oldest first) that were not regressions, `None`
+    with less than `min_samples` of them.
+    """
+    values = [entry["value"] for entry in history if not entry.get("regression")]
+    values = sorted(values[-window:]) if window > 0 else []
+    if len(values) < max(min_samples, 1):
+        return None
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def is_regression(value, base, tolerance, higher_is_better=False):
+    "Returns `True` when `value` is worse than `base` by more than `tolerance`."
+    if base is None:
+        return False
+    if higher_is_better:
+        return value < base * (1 - tolerance)
+    return value > base * (1 + tolerance)
+
+
+def begin(test, **options):
+    "Starts collecting the metrics of `test` (the marker arguments as `options`)."
+    with _lock:
+        _state["test"] = test
+        _state["options"] = dict(_options, **options)
+        del _metrics[:]
+
+
+def metric(name, value, unit="", higher_is_better=False, tolerance=None):
+    """
+    Reports the measurement `name` of the running benchmark test. By default
+    lower values are better (e.g. seconds), set `higher_is_better` for
+    rates. `tolerance` overrides the test tolerance for this metric.
+    """
+    with _lock:
+        if _state["test"] is None:
+            logger.warning(
+                "benchmark: metric '{}' reported outside of a "
+                "frr_benchmark test, ignored".format(name)
+            )
+            return
+        _metrics.append(
+            {
+                "metric": name,
+                "value": value,
+                "unit": unit,
+                "higher_is_better": higher_is_better,
+                "tolerance": tolerance,
+            }
+        )
+    logger.info("benchmark: {} = {} {}".format(name, value, unit))
+
+
+@contextmanager
+def timer(name, tolerance=None):
+    "Reports the seconds spent in the `with` block as metric `name`."
+    start = time.time()
+    yield
+    metric(name, round(time.time() - start, 3), "s", tolerance=tolerance)
+
+
+def finish(success=True):
+    """
+    Compares the metrics of the test to their baselines, stores them and
+    returns the regressions. Metrics of failed tests (`success` is False)
+    are not stored: they don't measure a complete run.
+    """
+    with _lock:
+        test = _state["test"]
+        options = _state["options"]
+        metrics = list(_metrics)
+        _state["test"] = None
+        del _metrics[:]
+    if test is None or not metrics or not success:
+        return []
+
+    history = {}
+    for entry in load_results():
+        if entry.get("test") == test:
+            history.setdefault(entry.get("metric"), []).append(entry)
+
+    now = time.time()
+    regressions = []
+    for entry in metrics:
+        tolerance = entry.pop("tolerance")
+        if tolerance is None:
+            tolerance = options["tolerance"]
+        base = baseline(
+            history.get(entry["metric"], []), options["window"], options["min_samples"]
+        )
+        regression = is_regression(
+            entry["value"], base, tolerance, entry["higher_is_better"]
+        )
+        entry.update(
+            test=test,
+            time=now,
+            baseline=base,
+            tolerance=tolerance,
+            regression=regression,
+        )
+        if regression:
+            regressions.append(entry)
+    append_results(metrics)
+    with _lock:
+        _session.extend(metrics)
+    return regressions
+
+
+def format_regressions(regressions):
+    "Returns the test failure message of `regressions`."
+    return "\n".join(
+        "benchmark regression: {metric} = {value} {unit} (baseline {baseline} "
+        "{unit}, tolerance {percent:.0f}%)".format(
+            percent=entry["tolerance"] * 100, **entry
+        )
+        for entry in regressions
+    )
+
+
+def write_report(directory):
+    "Writes the metrics of this session to `directory`/benchmark.json."
+    with _lock:
+        results = list(_session)
+    if not results:
+        return None
+    return reports.write_json_report(directory, "benchmark", results)
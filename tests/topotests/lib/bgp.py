@@ -43,7 +43,7 @@ from lib.common_config import (
     retry,
 )
 
-LOGDIR = "/tmp/topotests/"
+LOGDIR = topotest.get_logdir_base() + "/"
 TMPDIR = None
 
 def create_router_bgp(tgen, topo, input_dict=None, build=False, load_config=True):
@@ -1230,7 +1230,7 @@ def verify_bgp_convergence(tgen, topo, dut=None):
     return True
 
 
-@retry(attempts=3, wait=4, return_is_str=True)
+@retry(attempts=7, wait=4, return_is_str=True)
 def verify_bgp_community(
     tgen, addr_type, router, network, input_dict=None, vrf=None, bestpath=False
 ):
@@ -1277,7 +1277,6 @@ def verify_bgp_community(
 
     command = "show bgp"
 
-    sleep(5)
     for net in network:
         if vrf:
             cmd = "{} vrf {} {} {} json".format(command, vrf, addr_type, net)
@@ -1554,6 +1553,31 @@ def verify_bgp_convergence_from_running_config(tgen, dut=None):
     return True
 
 
+def _bgp_established_peers(rnode, vrf=None, afi_safi=None):
+    """
+    Returns a dictionary with the established BGP peers of `rnode` (key is
+    the peer address and value is its `connectionsEstablished` counter: the
+    uptime epoch has a one second resolution and misses quick resets).
+    Only the peers of `afi_safi` (e.g. `ipv4Unicast`) when set.
+    """
+    if vrf:
+        cmd = "show bgp vrf {} summary json".format(vrf)
+    else:
+        cmd = "show bgp summary json"
+
+    peers = {}
+    show_bgp_json = rnode.vtysh_cmd(cmd, isjson=True)
+    for key, afi_safi_data in show_bgp_json.items():
+        if not isinstance(afi_safi_data, dict):
+            continue
+        if afi_safi is not None and key != afi_safi:
+            continue
+        for peer, peer_data in afi_safi_data.get("peers", {}).items():
+            if peer_data.get("state") == "Established":
+                peers[peer] = peer_data.get("connectionsEstablished")
+    return peers
+
+
 def clear_bgp(tgen, addr_type, router, vrf=None):
     """
     This API is to clear bgp neighborship by running
@@ -1582,6 +1606,14 @@ def clear_bgp(tgen, addr_type, router, vrf=None):
         if type(vrf) is not list:
             vrf = [vrf]
 
+    # Save the established sessions to wait for them to be reset: only
+    # the peers activated in the cleared address family are reset
+    vrf_list = vrf if vrf else [None]
+    afi_safi = {"ipv4": "ipv4Unicast", "ipv6": "ipv6Unicast"}.get(addr_type)
+    peers_before_clear = dict(
+        (_vrf, _bgp_established_peers(rnode, _vrf, afi_safi)) for _vrf in vrf_list
+    )
+
     # Clearing BGP
     logger.info("Clearing BGP neighborship for router %s..", router)
     if addr_type == "ipv4":
@@ -1599,7 +1631,16 @@ def clear_bgp(tgen, addr_type, router, vrf=None):
     else:
         run_frr_cmd(rnode, "clear bgp *")
 
-    sleep(5)
+    def _peers_reestablished():
+        for _vrf, peers in peers_before_clear.items():
+            peers_now = _bgp_established_peers(rnode, _vrf, afi_safi)
+            for peer, established in peers.items():
+                if peers_now.get(peer, established) <= established:
+                    return False
+        return True
+
+    # Wait (at most 5 seconds) for the cleared sessions to come back
+    topotest.run_and_expect(_peers_reestablished, True, count=10, wait=0.5)
 
     logger.debug("Exiting lib API: {}".format(sys._getframe().f_code.co_name))
 
@@ -1640,12 +1681,13 @@ def clear_bgp_and_verify(tgen, topo, router):
     # Verifying BGP convergence before bgp clear command
     for retry in range(50):
         # Waiting for BGP to converge
-        logger.info(
-            "Waiting for %s sec for BGP to converge on router" " %s...",
-            sleeptime,
-            router,
-        )
-        sleep(sleeptime)
+        if retry > 0:
+            logger.info(
+                "Waiting for %s sec for BGP to converge on router" " %s...",
+                sleeptime,
+                router,
+            )
+            sleep(sleeptime)
 
         show_bgp_json = run_frr_cmd(rnode, "show bgp summary json", isjson=True)
         # Verifying output dictionary show_bgp_json is empty or not
@@ -1723,12 +1765,13 @@ def clear_bgp_and_verify(tgen, topo, router):
     for retry in range(50):
 
         # Waiting for BGP to converge
-        logger.info(
-            "Waiting for %s sec for BGP to converge on router" " %s...",
-            sleeptime,
-            router,
-        )
-        sleep(sleeptime)
+        if retry > 0:
+            logger.info(
+                "Waiting for %s sec for BGP to converge on router" " %s...",
+                sleeptime,
+                router,
+            )
+            sleep(sleeptime)
 
         show_bgp_json = run_frr_cmd(rnode, "show bgp summary json", isjson=True)
         # Verifying output dictionary show_bgp_json is empty or not
@@ -1836,7 +1879,6 @@ def verify_bgp_timers_and_functionality(tgen, topo, input_dict):
     """
 
     logger.debug("Entering lib API: {}".format(sys._getframe().f_code.co_name))
-    sleep(5)
     router_list = tgen.routers()
     for router in input_dict.keys():
         if router not in router_list:
@@ -1846,10 +1888,6 @@ def verify_bgp_timers_and_functionality(tgen, topo, input_dict):
 
         logger.info("Verifying bgp timers functionality, DUT is %s:", router)
 
-        show_ip_bgp_neighbor_json = run_frr_cmd(
-            rnode, "show ip bgp neighbor json", isjson=True
-        )
-
         bgp_addr_type = input_dict[router]["bgp"]["address_family"]
 
         for addr_type in bgp_addr_type:
@@ -1868,10 +1906,27 @@ def verify_bgp_timers_and_functionality(tgen, topo, input_dict):
                         neighbor_ip = data[dest_link][addr_type].split("/")[0]
                         neighbor_intf = data[dest_link]["interface"]
 
+                    # Wait (at most 5 seconds) for the timers to be applied
+                    def _neighbor_timers(neighbor_ip=neighbor_ip):
+                        neighbor_json = run_frr_cmd(
+                            rnode,
+                            "show ip bgp neighbor {} json".format(neighbor_ip),
+                            isjson=True,
+                        ).get(neighbor_ip, {})
+                        return (
+                            neighbor_json.get("bgpTimerHoldTimeMsecs"),
+                            neighbor_json.get("bgpTimerKeepAliveIntervalMsecs"),
+                        )
+
+                    _, timers = topotest.run_and_expect(
+                        _neighbor_timers,
+                        (holddowntimer * 1000, keepalivetimer * 1000),
+                        count=10,
+                        wait=0.5,
+                    )
+                    bgpHoldTimeMsecs, bgpKeepAliveTimeMsecs = timers
+
                     # Verify HoldDownTimer for neighbor
-                    bgpHoldTimeMsecs = show_ip_bgp_neighbor_json[neighbor_ip][
-                        "bgpTimerHoldTimeMsecs"
-                    ]
                     if bgpHoldTimeMsecs != holddowntimer * 1000:
                         errormsg = (
                             "Verifying holddowntimer for bgp "
@@ -1886,9 +1941,6 @@ def verify_bgp_timers_and_functionality(tgen, topo, input_dict):
                         return errormsg
 
                     # Verify KeepAliveTimer for neighbor
-                    bgpKeepAliveTimeMsecs = show_ip_bgp_neighbor_json[neighbor_ip][
-                        "bgpTimerKeepAliveIntervalMsecs"
-                    ]
                     if bgpKeepAliveTimeMsecs != keepalivetimer * 1000:
                         errormsg = (
                             "Verifying keepalivetimer for bgp "
@@ -1934,8 +1986,15 @@ def verify_bgp_timers_and_functionality(tgen, topo, input_dict):
                         router_list[bgp_neighbor], neighbor_intf, ifaceaction=False
                     )
 
-                    # Bringing up peer interface
-                    sleep(5)
+                    # Bringing up peer interface once it is down
+                    topotest.run_and_expect(
+                        lambda: topotest.interface_oper_up(
+                            router_list[bgp_neighbor], neighbor_intf
+                        ),
+                        False,
+                        count=25,
+                        wait=0.2,
+                    )
                     logger.info(
                         "Bringing up interface %s on router %s..",
                         neighbor_intf,
@@ -2182,7 +2241,7 @@ def verify_bgp_attributes(
     return True
 
 
-@retry(attempts=4, wait=2, return_is_str=True, initial_wait=2)
+@retry(attempts=8, wait=2, return_is_str=True, initial_wait=2)
 def verify_best_path_as_per_bgp_attribute(
     tgen, addr_type, router, input_dict, attribute
 ):
@@ -2241,7 +2300,6 @@ def verify_best_path_as_per_bgp_attribute(
     # Verifying show bgp json
     command = "show bgp"
 
-    sleep(2)
     logger.info("Verifying router %s RIB for best path:", router)
 
     static_route = False
@@ -2386,6 +2444,7 @@ def verify_best_path_as_per_bgp_attribute(
     return True
 
 
+@retry(attempts=4, wait=2, return_is_str=True)
 def verify_best_path_as_per_admin_distance(
     tgen, addr_type, router, input_dict, attribute
 ):
@@ -2394,6 +2453,8 @@ def verify_best_path_as_per_admin_distance(
     route. "show ip/ipv6 route json" command will be run and verify
     best path accoring to shortest admin distanc.
 
+    Retried until the best path is selected (at most 6 seconds).
+
     Parameters
     ----------
     * `addr_type` : ip type, ipv4/ipv6
@@ -2428,7 +2489,6 @@ def verify_best_path_as_per_admin_distance(
 
     rnode = tgen.routers()[router]
 
-    sleep(5)
     logger.info("Verifying router %s RIB for best path:", router)
 
     # Show ip route cmd
@@ -2497,7 +2557,7 @@ def verify_best_path_as_per_admin_distance(
     return True
 
 
-@retry(attempts=5, wait=2, return_is_str=True, initial_wait=2)
+@retry(attempts=14, wait=2, return_is_str=True, initial_wait=2)
 def verify_bgp_rib(tgen, addr_type, dut, input_dict, next_hop=None, aspath=None):
     """
     This API is to verify whether bgp rib has any
@@ -2542,7 +2602,6 @@ def verify_bgp_rib(tgen, addr_type, dut, input_dict, next_hop=None, aspath=None)
             command = "show bgp"
 
             # Static routes
-            sleep(2)
             logger.info("Checking router {} BGP RIB:".format(dut))
 
             if "static_routes" in input_dict[routerInput]:
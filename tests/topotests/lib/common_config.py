@@ -33,14 +33,25 @@ from tempfile import mkdtemp
 import StringIO
 import os
 import sys
+import time
 import ConfigParser
 import traceback
 import socket
 import ipaddress
 
 from lib.topolog import logger, logger_config
+from lib import telemetry
+from lib import sleepcheck
+from lib import threadcpu
+from lib import procsampler
+from lib import vtyshreplay
 from lib.topogen import TopoRouter, get_topogen
-from lib.topotest import interface_set_status
+from lib.topotest import (
+    interface_set_status,
+    wait_for_vty,
+    get_logdir_base,
+    get_worker_id,
+)
 
 FRRCFG_FILE = "frr_json.conf"
 FRRCFG_BKUP_FILE = "frr_json_initial.conf"
@@ -56,7 +67,7 @@ PYTESTINI_PATH = os.path.join(CD, "../pytest.ini")
 # multiple testsuites run together. All temporary files would be created
 # in this dir and this dir would be removed once testsuite run is
 # completed
-LOGDIR = "/tmp/topotests/"
+LOGDIR = get_logdir_base() + "/"
 TMPDIR = None
 
 # NOTE: to save execution logs to log file frrtest_log_dir must be configured
@@ -76,6 +87,8 @@ if config.has_option("topogen", "frrtest_log_dir"):
     frrtest_log_dir = config.get("topogen", "frrtest_log_dir")
     time_stamp = datetime.time(datetime.now())
     logfile_name = "frr_test_bgp_"
+    if get_worker_id() is not None:
+        logfile_name += get_worker_id() + "_"
     frrtest_log_file = frrtest_log_dir + logfile_name + str(time_stamp)
     print("frrtest_log_file..", frrtest_log_file)
 
@@ -574,6 +587,32 @@ def load_config_to_router(tgen, routerName, save_bkup=False):
     return True
 
 
+def save_initial_config(tgen, routerName=None):
+    """
+    Saves the configuration built in FRRCFG_FILE as the initial test
+    configuration (FRRCFG_BKUP_FILE) without loading it to the router:
+    reset_config_on_routers() applies it then.
+
+    Parameters
+    ----------
+    * `tgen` : Topogen object
+    * `routerName` : router for which configuration to be saved
+    """
+
+    for rname in ROUTER_LIST:
+        if routerName and rname != routerName:
+            continue
+
+        frr_cfg_file = "{}/{}/{}".format(TMPDIR, rname, FRRCFG_FILE)
+        frr_cfg_bkup = "{}/{}/{}".format(TMPDIR, rname, FRRCFG_BKUP_FILE)
+        with open(frr_cfg_file, "r+") as cfg:
+            with open(frr_cfg_bkup, "w") as bkup:
+                bkup.write(cfg.read())
+            cfg.truncate(0)
+
+    return True
+
+
 def get_frr_ipv6_linklocal(tgen, router, intf=None, vrf=None):
     """
     API to get the link local ipv6 address of a perticular interface using
@@ -668,6 +707,21 @@ def generate_support_bundle():
     return True
 
 
+def set_topology_globals(tgen):
+    """
+    Sets the router list and the temporary directory (where the initial
+    configurations are saved) of the running topology.
+    * `tgen`  : topogen object
+    """
+
+    global TMPDIR, ROUTER_LIST
+    router_list = tgen.routers()
+    ROUTER_LIST = sorted(
+        router_list.keys(), key=lambda x: int(re_search("\d+", x).group(0))
+    )
+    TMPDIR = os.path.join(LOGDIR, tgen.modname)
+
+
 def start_topology(tgen):
     """
     Starting topology, create tmp files which are loaded to routers
@@ -675,17 +729,11 @@ def start_topology(tgen):
     * `tgen`  : topogen object
     """
 
-    global TMPDIR, ROUTER_LIST
     # Starting topology
     tgen.start_topology()
 
     # Starting deamons
-
-    router_list = tgen.routers()
-    ROUTER_LIST = sorted(
-        router_list.keys(), key=lambda x: int(re_search("\d+", x).group(0))
-    )
-    TMPDIR = os.path.join(LOGDIR, tgen.modname)
+    set_topology_globals(tgen)
 
     router_list = tgen.routers()
     for rname in ROUTER_LIST:
@@ -766,7 +814,8 @@ def start_router(tgen, router):
         router_list[router].start()
 
         # Waiting for router to come up
-        sleep(5)
+        if not wait_for_vty(router_list[router], timeout=5):
+            logger.info("Router %s daemons are not answering yet", router)
 
     except Exception as e:
         errormsg = traceback.format_exc()
@@ -1233,6 +1282,8 @@ def retry(attempts=3, wait=2, return_is_str=True, initial_wait=0, return_is_dict
     * `return_is_str`: Return val is an errormsg in case of failure
     * `initial_wait`: Sleeps for this much seconds before executing function
 
+    When the vtysh outputs are replayed (see lib/vtyshreplay.py), nothing is
+    waited for and no support bundle is generated on failure.
     """
 
     def _retry(func):
@@ -1244,33 +1295,68 @@ def retry(attempts=3, wait=2, return_is_str=True, initial_wait=0, return_is_dict
             if _attempts < 0:
                 raise ValueError("attempts must be 0 or greater")
 
-            if initial_wait > 0:
+            # Replayed outputs (see lib/vtyshreplay.py) don't change with time
+            replaying = vtyshreplay.replaying(args[0] if args else None)
+            if replaying:
+                _wait = 0
+
+            if initial_wait > 0 and not replaying:
                 logger.info("Waiting for [%s]s as initial delay", initial_wait)
-                sleep(initial_wait)
+                sleepcheck.initial_sleep(initial_wait, func)
 
             _return_is_str = kwargs.pop("return_is_str", return_is_str)
             _return_is_dict = kwargs.pop("return_is_str", return_is_dict)
+            start_time = time.time()
+            check_time = 0.0
+            # Without the expected result, the wait can't tell if the
+            # previous sleep was needed
+            check = None
+            if kwargs.get("expected", True) is True:
+                check = lambda: func(*args, **kwargs) is True
+            token = sleepcheck.wait_started(check)
+
+            def _record(success, checks):
+                telemetry.record_wait(
+                    "retry",
+                    func.__name__,
+                    success,
+                    time.time() - start_time,
+                    checks,
+                    check_time,
+                )
+                sleepcheck.wait_done(token, success, checks)
+
             for i in range(1, _attempts + 1):
+                check_start = time.time()
                 try:
                     _expected = kwargs.setdefault("expected", True)
                     kwargs.pop("expected")
                     ret = func(*args, **kwargs)
+                    check_time += time.time() - check_start
                     logger.debug("Function returned %s" % ret)
                     if _return_is_str and isinstance(ret, bool) and _expected:
+                        _record(True, i)
                         return ret
                     if (
                         isinstance(ret, str) or isinstance(ret, unicode)
                     ) and _expected is False:
+                        _record(True, i)
                         return ret
                     if _return_is_dict and isinstance(ret, dict):
+                        _record(True, i)
                         return ret
 
                     if _attempts == i:
-                        generate_support_bundle()
+                        _record(False, i)
+                        if not replaying:
+                            generate_support_bundle()
                         return ret
                 except Exception as err:
+                    check_time += time.time() - check_start
                     if _attempts == i:
-                        generate_support_bundle()
+                        _record(False, i)
+                        if not replaying:
+                            generate_support_bundle()
                         logger.info("Max number of attempts (%r) reached", _attempts)
                         raise
                     else:
@@ -1295,10 +1381,14 @@ class Stepper:
     def __call__(self, msg, reset):
         if reset:
             Stepper.count = 1
+            label = msg
             logger.info(msg)
         else:
+            label = "STEP {}: {}".format(Stepper.count, msg)
             logger.info("STEP %s: '%s'", Stepper.count, msg)
             Stepper.count += 1
+        threadcpu.step(label)
+        procsampler.annotate(label)
 
 
 def step(msg, reset=False):
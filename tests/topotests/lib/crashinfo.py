@@ -0,0 +1,311 @@
+#
+# crashinfo.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Crash information collection: core file backtraces, memory leak reports and
+AddressSanitizer errors found in the daemon logs.
+
+The functions here are called concurrently for every daemon of every router
+(see Router.checkRouterCores()), so:
+
+* gdb runs are limited to one per CPU and their output is cached per core
+  file, in memory and next to the core file (`<core>.bt`);
+* logs are processed line by line (see lib/logreader.py);
+* results are returned as CrashReport entries instead of written to stderr,
+  so the caller can output them in one piece and aggregate them for all
+  routers.
+"""
+
+import os
+import re
+import sys
+import glob
+import subprocess
+import threading
+import multiprocessing
+
+GDB_COMMANDS = [
+    "info threads",
+    "bt full",
+    "disassemble",
+    "up",
+    "disassemble",
+    "up",
+    "disassemble",
+    "up",
+    "disassemble",
+    "up",
+    "disassemble",
+    "up",
+    "disassemble",
+]
+
+ASAN_FILE = "/tmp/AddressSanitzer.txt"
+
+ASAN_ERROR_RE = re.compile(r"(==[0-9]+==)ERROR: AddressSanitizer: ([^\s]*) ")
+LEAK_GROUP_RE = re.compile(r"(showing active allocations in memory group [a-zA-Z0-9]+)")
+
+_gdb_slots = threading.BoundedSemaphore(multiprocessing.cpu_count())
+_gdb_cache = {}
+_gdb_lock = threading.Lock()
+_file_lock = threading.Lock()
+
+
+def core_files(logdir, router, daemon):
+    "Returns the `daemon` core files in the router log directory."
+    return sorted(glob.glob("{}/{}/{}_core*.dmp".format(logdir, router, daemon)))
+
+
+def _core_key(corefile):
+    stat = os.stat(corefile)
+    return (os.path.realpath(corefile), stat.st_ino, stat.st_size, stat.st_mtime)
+
+
+def core_backtrace(daemon_path, corefile):
+    """
+    Returns the gdb backtrace of `corefile`. gdb only runs once per core file:
+    the result is kept in memory and in `<corefile>.bt`.
+    """
+    key = _core_key(corefile)
+    with _gdb_lock:
+        event = _gdb_cache.get(key)
+        owner = event is None
+        if owner:
+            event = _gdb_cache[key] = [threading.Event(), None]
+    if not owner:
+        # Someone else is (or was) running gdb for this core
+        event[0].wait()
+        return event[1]
+
+    cachefile = corefile + ".bt"
+    backtrace = None
+    try:
+        if os.path.getmtime(cachefile) >= key[3]:
+            with open(cachefile) as cache:
+                backtrace = cache.read()
+    except (IOError, OSError):
+        pass
+
+    try:
+        if backtrace is None:
+            command = ["gdb", daemon_path, corefile, "--batch"]
+            for gdbcmd in GDB_COMMANDS:
+                command += ["-ex", gdbcmd]
+            with _gdb_slots:
+                backtrace = subprocess.check_output(command)
+            if sys.version_info[0] > 2:
+                backtrace = backtrace.decode("utf-8", "replace")
+            try:
+                with open(cachefile, "w") as cache:
+                    cache.write(backtrace)
+            except IOError:
+                pass
+    finally:
+        event[1] = backtrace
+        event[0].set()
+        if backtrace is None:
+            # Failed: let the next caller try again
+            with _gdb_lock:
+                _gdb_cache.pop(key, None)
+
+    return backtrace
+
+
+def leak_report(lines, prefix="  ##", separate=False):
+    """
+    Formats the memory statistics (`memstats`) found in `lines` (an iterable,
+    e.g. LogFile.lines()): memory group lines get `prefix` (and a following
+    empty line when `separate` is set). Returns an empty string when there
+    are no leaks.
+    """
+    found = False
+    result = []
+    for line in lines:
+        if "memstats" in line:
+            found = True
+        line = line.replace("core_handler: ", "")
+        if LEAK_GROUP_RE.search(line):
+            result.append("")
+            line = LEAK_GROUP_RE.sub(r"{} \1".format(prefix), line)
+            if separate:
+                result.extend([line, ""])
+                continue
+        result.append(line.replace("memstats:  ", "    "))
+    if not found:
+        return ""
+    return "\n".join(result) + "\n"
+
+
+def asan_error(lines):
+    """
+    Looks for an AddressSanitizer error in `lines`. Returns `(kind, text)` with
+    the error kind and the sanitizer output, or `None`.
+    """
+    kind = None
+    mark = None
+    pending = []
+    report = []
+    for line in lines:
+        if mark is None:
+            match = ASAN_ERROR_RE.search(line)
+            if match is None:
+                continue
+            mark, kind = match.group(1), match.group(2)
+            line = line[match.start() + len(mark) :]
+            if mark in line:
+                report.append(line[: line.rfind(mark)])
+                line = line[line.rfind(mark) + len(mark) :]
+            pending.append(line)
+            continue
+
+        # Keep everything up to the last line with the sanitizer mark
+        if mark in line:
+            report.extend(pending)
+            pending = []
+            report.append(line[: line.rfind(mark)])
+            pending.append(line[line.rfind(mark) + len(mark) :])
+        else:
+            pending.append(line)
+
+    if mark is None:
+        return None
+    return kind, "\n".join(report)
+
+
+def asan_record(router, daemon, kind, text):
+    "Appends an AddressSanitizer error to the AddressSanitizer report file."
+    # PYTEST_CURRENT_TEST is "<file>::<test> (<phase>)"
+    current = os.environ.get("PYTEST_CURRENT_TEST", "unknown::unknown").split()[0]
+    testfile, _, testname = current.partition("::")
+    entry = (
+        "## Error: {}\n\n"
+        "### AddressSanitizer error in topotest `{}`, test `{}`, router `{}`\n\n"
+        "    {}\n"
+        "\n---------------\n"
+    ).format(
+        kind,
+        os.path.basename(testfile),
+        testname,
+        router,
+        "\n    ".join(text.splitlines()),
+    )
+    append_file(ASAN_FILE, entry)
+
+
+def append_file(path, data, header=None):
+    """
+    Appends `data` to `path` in one write, `header` is written first when the
+    file doesn't exist. Safe to call from multiple threads.
+    """
+    with _file_lock:
+        if header is not None and not os.path.isfile(path):
+            data = header + data
+        with open(path, "a") as output:
+            output.write(data)
+
+
+class CrashReport(object):
+    """
+    Crash information of one or more routers. Each entry is a
+    `(router, daemon, kind, title, details)` tuple where `kind` is `core`,
+    `leak` or `asan`.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, router, daemon, kind, title, details=""):
+        self.entries.append((router, daemon, kind, title, details))
+
+    def extend(self, other):
+        self.entries.extend(other.entries)
+
+    def summary(self):
+        """
+        Returns the errors as reported by Router.checkRouterCores(): the
+        titles and the core backtraces.
+        """
+        result = ""
+        for _, _, kind, title, details in self.entries:
+            result += "\n" + title
+            if kind == "core":
+                result += details
+        return result
+
+    def __str__(self):
+        result = ""
+        for _, _, _, title, details in self.entries:
+            result += "\n{}{}".format(title, details)
+        return result
+
+    def write(self, path):
+        "Writes the complete report to `path`."
+        with open(path, "w") as output:
+            for router, daemon, kind, _, _ in self.entries:
+                output.write("{} {} {}\n".format(router, daemon, kind))
+            output.write(str(self))
+
+
+def collect_daemon(router, daemon, reportLeaks=True):
+    """
+    Collects the crash information of `daemon` running in `router` (a
+    topotest.Router). Returns a CrashReport.
+    """
+    report = CrashReport()
+    corefiles = core_files(router.logdir, router.name, daemon)
+    if corefiles:
+        daemon_path = os.path.join(router.daemondir, daemon)
+        for corefile in corefiles:
+            report.add(
+                router.name,
+                daemon,
+                "core",
+                "%s: %s crashed. Core file found - Backtrace follows:\n"
+                % (router.name, daemon),
+                core_backtrace(daemon_path, corefile),
+            )
+    elif reportLeaks:
+        leaks = leak_report(router.getLogFile("err", daemon).lines("leaks"))
+        if leaks:
+            report.add(
+                router.name,
+                daemon,
+                "leak",
+                "%s: %s has memory leaks:\n" % (router.name, daemon),
+                leaks,
+            )
+
+    # Look for AddressSanitizer Errors and append to /tmp/AddressSanitzer.txt if found
+    error = asan_error(router.getLogFile("err", daemon).lines("asan"))
+    if error is not None:
+        asan_record(router.name, daemon, *error)
+        report.add(
+            router.name,
+            daemon,
+            "asan",
+            "%s: Daemon %s killed by AddressSanitizer" % (router.name, daemon),
+            "\n" + error[1] + "\n",
+        )
+    return report
@@ -0,0 +1,213 @@
+#
+# durations.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Test duration history and longest-first scheduling.
+
+The duration of every test (setup, call and teardown, so `setup_module()`
+and `teardown_module()` are included) is saved at the end of the session
+in a sqlite database shared by all test runs of the host (DURATIONS_DB, or
+the TOPOTESTS_DURATIONS_DB environment variable; set it empty to disable
+it). With pytest-xdist only the controller saves them.
+
+With `pytest --longest-first` (or TOPOTESTS_LONGEST_FIRST) the test modules
+are collected longest first, by the average of their last RUNS runs, and
+the tests of a module keep their order. pytest-xdist `--dist loadfile`
+hands the modules to the workers in collection order as they become free,
+so the longest modules start first instead of possibly last (longest
+processing time first scheduling). Modules without history go first: they
+may be long.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from lib.topolog import logger
+
+DURATIONS_DB = "/tmp/topotests/durations.db"
+
+# Number of runs of a module averaged for its estimate
+RUNS = 5
+
+_lock = threading.Lock()
+_results = {}
+_run = "{}-{}".format(int(time.time()), os.getpid())
+
+
+def database():
+    "Returns the database path, or `None` when disabled."
+    path = os.environ.get("TOPOTESTS_DURATIONS_DB", DURATIONS_DB)
+    return path or None
+
+
+def module_of(nodeid):
+    "Returns the module (file) of the test `nodeid`."
+    return nodeid.split("::", 1)[0]
+
+
+def connect(path):
+    "Opens (and creates if needed) the database `path`."
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS durations ("
+        " run TEXT, module TEXT, test TEXT, duration REAL, outcome TEXT,"
+        " time REAL)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS durations_module ON durations (module, time)"
+    )
+    return connection
+
+
+def record(nodeid, when, duration, outcome):
+    "Adds the `duration` of the `when` phase (setup, call...) of `nodeid`."
+    with _lock:
+        entry = _results.get(nodeid)
+        if entry is None:
+            entry = _results[nodeid] = {"duration": 0.0, "outcome": "passed"}
+        entry["duration"] += duration
+        if outcome != "passed" and entry["outcome"] == "passed":
+            entry["outcome"] = "{} ({})".format(outcome, when)
+
+
+def save(path=None):
+    "Saves the durations recorded by this session."
+    path = path or database()
+    with _lock:
+        results = dict(_results)
+        _results.clear()
+    if path is None or not results:
+        return
+    now = time.time()
+    try:
+        connection = connect(path)
+        with connection:
+            connection.executemany(
+                "INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        _run,
+                        module_of(nodeid),
+                        nodeid,
+                        entry["duration"],
+                        entry["outcome"],
+                        now,
+                    )
+                    for nodeid, entry in results.items()
+                ],
+            )
+        connection.close()
+    except (sqlite3.Error, OSError) as error:
+        logger.warning("durations: failed to save: {}".format(error))
+
+
+def module_estimates(path=None, runs=RUNS):
+    """
+    Returns the estimated duration of every module in the database: the
+    average of its last `runs` runs (the sum of its tests durations).
+    """
+    path = path or database()
+    if path is None or not os.path.isfile(path):
+        return {}
+    try:
+        connection = connect(path)
+        rows = connection.execute(
+            "SELECT module, run, SUM(duration), MAX(time) FROM durations"
+            " GROUP BY module, run ORDER BY module, MAX(time) DESC"
+        ).fetchall()
+        connection.close()
+    except (sqlite3.Error, OSError) as error:
+        logger.warning("durations: failed to read: {}".format(error))
+        return {}
+
+    totals = {}
+    for module, _, duration, _ in rows:
+        module_runs = totals.setdefault(module, [])
+        if len(module_runs) < runs:
+            module_runs.append(duration)
+    return dict(
+        (module, sum(values) / len(values)) for module, values in totals.items()
+    )
+
+
+def order_modules(modules, estimates):
+    """
+    Returns `modules` longest first according to `estimates`, the modules
+    without estimate first (in their original order).
+    """
+    unknown = [module for module in modules if module not in estimates]
+    known = [module for module in modules if module in estimates]
+    known.sort(key=lambda module: -estimates[module])
+    return unknown + known
+
+
+def order_items(items, estimates):
+    "Sorts the pytest `items` by module, longest module first."
+    modules = []
+    by_module = {}
+    for item in items:
+        module = module_of(item.nodeid)
+        if module not in by_module:
+            modules.append(module)
+            by_module[module] = []
+        by_module[module].append(item)
+    items[:] = [
+        item
+        for module in order_modules(modules, estimates)
+        for item in by_module[module]
+    ]
+    return items
+
+
+def makespan(durations, workers):
+    """
+    Returns the time the `durations` take on `workers` when every job goes
+    to the first free worker in the given order.
+    """
+    loads = [0.0] * max(workers, 1)
+    for duration in durations:
+        index = loads.index(min(loads))
+        loads[index] += duration
+    return max(loads)
+
+
+def log_estimate(modules, estimates, workers):
+    "Logs the expected run time of `modules` (in order) on `workers`."
+    durations = [estimates[module] for module in modules if module in estimates]
+    if not durations:
+        return
+    lower = max(max(durations), sum(durations) / max(workers, 1))
+    logger.info(
+        "longest first: {} modules ({} without history), estimated {:.0f}s "
+        "on {} workers (lower bound {:.0f}s)".format(
+            len(modules),
+            len(modules) - len(durations),
+            makespan(durations, workers),
+            workers,
+            lower,
+        )
+    )
@@ -0,0 +1,166 @@
+#
+# logreader.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Incremental daemon log reader.
+
+Daemon logs (`<daemon>.log`, `.err` and `.out`) are read directly from the
+router log directory. Each consumer (e.g. the memory leak check) has its own
+byte offset, so repeated checks only read what was written since the last
+one, and grep()/tail() never load a whole log in memory.
+
+Usage example:
+
+    log = LogFile('/tmp/topotests/test/r1/bgpd.log')
+    # Lines written since the last call with the same consumer
+    for line in log.lines('mycheck'):
+        ...
+    errors = log.grep(r'ERROR|CRITICAL')
+    last = log.tail(20)
+"""
+
+import os
+import re
+import sys
+
+CHUNK_SIZE = 1 << 16
+
+
+def _text(data):
+    if sys.version_info[0] < 3:
+        return data
+    return data.decode("utf-8", "replace")
+
+
+class LogFile(object):
+    "Log file with per consumer read offsets."
+
+    def __init__(self, path):
+        self.path = path
+        # consumer: (inode, offset)
+        self.offsets = {}
+
+    def reset(self, consumer=None):
+        """
+        Forgets the offset of `consumer` (or of all consumers), e.g. when the
+        file is truncated by a daemon restart.
+        """
+        if consumer is None:
+            self.offsets.clear()
+        else:
+            self.offsets.pop(consumer, None)
+
+    def _open(self, consumer):
+        """
+        Opens the file at the `consumer` offset. Returns `(file, inode)` or
+        `(None, None)` when the file doesn't exist.
+        """
+        try:
+            logfile = open(self.path, "rb")
+        except IOError:
+            return None, None
+        stat = os.fstat(logfile.fileno())
+        inode, offset = self.offsets.get(consumer, (None, 0))
+        # Start again if the file was replaced or truncated.
+        if consumer is None or inode != stat.st_ino or offset > stat.st_size:
+            offset = 0
+        logfile.seek(offset)
+        return logfile, stat.st_ino
+
+    def read(self, consumer=None):
+        """
+        Returns the data written since the last read by `consumer` (the whole
+        file when `consumer` is None) and moves the consumer offset to the
+        end of the file.
+        """
+        logfile, inode = self._open(consumer)
+        if logfile is None:
+            return ""
+        with logfile:
+            data = logfile.read()
+            if consumer is not None:
+                self.offsets[consumer] = (inode, logfile.tell())
+        return _text(data)
+
+    def lines(self, consumer=None):
+        """
+        Generator of the complete lines written since the last read by
+        `consumer` (all lines when `consumer` is None). The file is read in
+        chunks and the consumer offset moves with each line, a partial last
+        line is left for the next call.
+        """
+        logfile, inode = self._open(consumer)
+        if logfile is None:
+            return
+        with logfile:
+            offset = logfile.tell()
+            pending = b""
+            while True:
+                data = logfile.read(CHUNK_SIZE)
+                if not data:
+                    break
+                data = pending + data
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                for line in data[:end].split(b"\n")[:-1]:
+                    offset += len(line) + 1
+                    if consumer is not None:
+                        self.offsets[consumer] = (inode, offset)
+                    yield _text(line)
+
+    def grep(self, pattern, consumer=None, max_count=None):
+        """
+        Returns the lines matching the `pattern` regular expression, reading
+        the file line by line (only new lines for `consumer`).
+        """
+        regexp = re.compile(pattern)
+        result = []
+        for line in self.lines(consumer):
+            if regexp.search(line):
+                result.append(line)
+                if max_count is not None and len(result) >= max_count:
+                    break
+        return result
+
+    def tail(self, count=20):
+        "Returns the last `count` lines, reading the file backwards."
+        try:
+            logfile = open(self.path, "rb")
+        except IOError:
+            return ""
+        with logfile:
+            logfile.seek(0, os.SEEK_END)
+            position = logfile.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= count:
+                size = min(CHUNK_SIZE, position)
+                position -= size
+                logfile.seek(position)
+                data = logfile.read(size) + data
+        return _text(b"\n".join(data.rstrip(b"\n").split(b"\n")[-count:]))
+
+    def size(self):
+        "Returns the current file size (0 if it doesn't exist)."
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#
+# logring.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+In-memory ring buffer for daemon debug output.
+
+Started by Router.startRouterDaemons() when `log_ring_size` (or the
+TOPOTESTS_LOG_RING environment variable) is set: the daemon stdout is read
+from standard input and the last `--size` bytes are kept in memory. Only
+the last `--tail` bytes are written to the output file (at most once per
+second), until:
+
+* SIGUSR1: the whole ring is written to the output file, and from then on
+  the output is appended to it (used when a test fails or a daemon
+  crashes);
+* SIGTERM: the last tail is written and the process exits.
+
+Usage: logring.py --size 64M [--tail 64K] OUTPUT < daemon output
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import argparse
+from collections import deque
+
+TAIL_INTERVAL = 1
+
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(size):
+    "Converts a size like `65536`, `64K` or `16M` to bytes (None stays None)."
+    if size is None or size == "":
+        return None
+    size = str(size).strip().upper()
+    if size[-1] in SIZE_UNITS:
+        return int(size[:-1]) * SIZE_UNITS[size[-1]]
+    return int(size)
+
+
+class LogRing(object):
+    "Bounded buffer keeping the last `size` bytes written."
+
+    def __init__(self, size):
+        self.size = size
+        self.chunks = deque()
+        self.length = 0
+        self.dropped = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.length += len(data)
+        while self.length > self.size:
+            excess = self.length - self.size
+            chunk = self.chunks.popleft()
+            if len(chunk) > excess:
+                self.chunks.appendleft(chunk[excess:])
+            else:
+                excess = len(chunk)
+            self.length -= excess
+            self.dropped += excess
+
+    def tail(self, size):
+        "Returns the last `size` bytes."
+        result = []
+        length = 0
+        for chunk in reversed(self.chunks):
+            result.append(chunk)
+            length += len(chunk)
+            if length >= size:
+                break
+        return b"".join(reversed(result))[-size:]
+
+    def dump(self):
+        "Returns the whole ring."
+        return b"".join(self.chunks)
+
+
+def write_file(path, data):
+    "Replaces `path` contents atomically."
+    tmppath = path + ".tmp"
+    with open(tmppath, "wb") as output:
+        output.write(data)
+    os.rename(tmppath, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--size", default="64M", help="ring size")
+    parser.add_argument("--tail", default="64K", help="size kept on disk")
+    parser.add_argument("output", help="output file")
+    args = parser.parse_args()
+
+    ring = LogRing(parse_size(args.size))
+    tail = parse_size(args.tail)
+    events = {"flush": False, "stop": False}
+
+    def _flush(*_):
+        events["flush"] = True
+
+    def _stop(*_):
+        events["stop"] = True
+
+    signal.signal(signal.SIGUSR1, _flush)
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    infd = sys.stdin.fileno()
+    output = None
+    dirty = False
+    last_write = 0
+    while True:
+        if events["flush"] and output is None:
+            header = b""
+            if ring.dropped:
+                header = "[logring: first {} bytes dropped]\n".format(ring.dropped)
+                header = header.encode("utf-8")
+            write_file(args.output, header + ring.dump())
+            output = open(args.output, "ab", 0)
+            dirty = False
+        if events["stop"]:
+            break
+        if dirty and time.time() - last_write >= TAIL_INTERVAL:
+            write_file(args.output, ring.tail(tail))
+            dirty = False
+            last_write = time.time()
+
+        if infd is None:
+            # Daemon is gone, wait for the flush or stop signals.
+            time.sleep(TAIL_INTERVAL)
+            continue
+        try:
+            ready, _, _ = select.select([infd], [], [], TAIL_INTERVAL)
+            if not ready:
+                continue
+            data = os.read(infd, 1 << 16)
+        except (OSError, select.error) as error:
+            if error.args[0] == errno.EINTR:
+                continue
+            raise
+        if not data:
+            infd = None
+            continue
+        if output is not None:
+            output.write(data)
+        else:
+            ring.write(data)
+            dirty = True
+
+    if output is None and dirty:
+        write_file(args.output, ring.tail(tail))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#
+# manifest.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Topology manifest: the network namespaces, processes, links and bridges
+created by a Topogen, so they can be removed without `mn -c`.
+
+Every Topogen writes its manifest to MANIFEST_DIR, one JSON object per line:
+links and bridges before they are created, node namespaces as soon as their
+node process started (the namespace has no identifier before). On a clean
+teardown the items left over are removed and the manifest is deleted. When
+the test run dies instead, the manifest stays behind and the next Topogen
+(in any pytest process) removes the items of every manifest whose owner
+process is gone (see `recover_stale()`).
+
+Entries:
+
+* `{"kind": "netns", "name": node, "pid": pid, "netns": "net:[inode]"}`: a
+  node network namespace. Cleanup kills every process in it (the node shell,
+  the daemons), which also removes the namespace and its interfaces.
+* `{"kind": "link", "name": ifname}`: an interface in the host namespace.
+* `{"kind": "bridge", "name": bridge}`: an Open vSwitch bridge, named after
+  the pytest-xdist worker like the switch (e.g. `gw0-s1`).
+"""
+
+import os
+import json
+import glob
+import signal
+import itertools
+import subprocess
+
+from lib.topolog import logger
+
+MANIFEST_DIR = "/tmp/topotests/manifests"
+
+_counter = itertools.count()
+
+
+def netns_id(pid):
+    "Returns the network namespace of `pid` (e.g. `net:[4026531992]`) or None."
+    try:
+        return os.readlink("/proc/{}/ns/net".format(pid))
+    except OSError:
+        return None
+
+
+def process_start(pid):
+    "Returns the start time of `pid` (in clock ticks since boot) or None."
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat:
+            # The command name may contain spaces: skip past it
+            return int(stat.read().rsplit(")", 1)[1].split()[19])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+
+def netns_pids(nsid):
+    "Returns the pids of all processes in the network namespace `nsid`."
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit() and netns_id(entry) == nsid:
+            pids.append(int(entry))
+    return pids
+
+
+class Manifest(object):
+    """
+    Items created by one topology. The file is named after the owner process
+    so it can be recovered when that process dies.
+    """
+
+    def __init__(self, path=None, directory=MANIFEST_DIR):
+        self.entries = []
+        if path is not None:
+            self.path = path
+            with open(path) as manifest:
+                for line in manifest:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        # Last line of a crashed run may be incomplete
+                        pass
+            return
+
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+        self.path = os.path.join(
+            directory, "{}.{}.json".format(os.getpid(), next(_counter))
+        )
+        self._write(
+            {"kind": "owner", "pid": os.getpid(), "start": process_start("self")}
+        )
+
+    def _write(self, entry):
+        self.entries.append(entry)
+        with open(self.path, "a") as manifest:
+            manifest.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    def _owner(self):
+        for entry in self.entries:
+            if entry.get("kind") == "owner":
+                return entry
+        return {}
+
+    def owner_alive(self):
+        "Returns `True` if the process that created the manifest still runs."
+        owner = self._owner()
+        start = process_start(owner.get("pid"))
+        return start is not None and start == owner.get("start")
+
+    def namespaces(self):
+        "Returns the recorded network namespaces."
+        return set(e["netns"] for e in self.entries if e.get("kind") == "netns")
+
+    def add_node(self, node):
+        """
+        Records a mininet node (anything with `name` and `pid`) running in its
+        own network namespace. Nodes in the host namespace (e.g. Open vSwitch
+        switches) are not recorded: record their bridge with add_bridge().
+        """
+        nsid = netns_id(node.pid)
+        if nsid is not None and nsid != netns_id("self"):
+            self._write(
+                {"kind": "netns", "name": node.name, "pid": node.pid, "netns": nsid}
+            )
+
+    def add_bridge(self, name):
+        "Records an Open vSwitch bridge created in the host namespace."
+        self._write({"kind": "bridge", "name": name})
+
+    def add_link(self, name):
+        "Records an interface created in the host namespace."
+        self._write({"kind": "link", "name": name})
+
+    def cleanup(self, exclude=()):
+        """
+        Removes every recorded item that still exists, except the namespaces
+        in `exclude`. Returns the number of items that had to be removed.
+        """
+        removed = 0
+        ownns = netns_id("self")
+        # A namespace identifier may be reused once the namespace is gone:
+        # only processes started after the manifest owner are killed.
+        since = self._owner().get("start") or 0
+        for entry in self.entries:
+            kind = entry.get("kind")
+            if kind == "netns":
+                # Never touch our own namespace, whatever the manifest says
+                if entry["netns"] == ownns or entry["netns"] in exclude:
+                    continue
+                pids = [
+                    pid
+                    for pid in netns_pids(entry["netns"])
+                    if (process_start(pid) or 0) >= since
+                ]
+                for pid in pids:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                if pids:
+                    removed += 1
+            elif kind == "link":
+                if os.path.exists("/sys/class/net/{}".format(entry["name"])):
+                    subprocess.call(["ip", "link", "del", entry["name"]])
+                    removed += 1
+            elif kind == "bridge":
+                if os.path.exists("/sys/class/net/{}".format(entry["name"])):
+                    subprocess.call(
+                        ["ovs-vsctl", "--if-exists", "del-br", entry["name"]]
+                    )
+                    removed += 1
+        return removed
+
+    def close(self, exclude=()):
+        "Removes what is left of the topology and deletes the manifest."
+        removed = self.cleanup(exclude)
+        if removed:
+            logger.info(
+                "manifest: removed {} leftover items of {}".format(removed, self.path)
+            )
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def recover_stale(directory=MANIFEST_DIR):
+    """
+    Cleans up the manifests left behind by test runs that didn't tear down
+    their topology (e.g. killed or crashed). Returns the number of manifests
+    recovered.
+    """
+    stale = []
+    inuse = set()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            manifest = Manifest(path)
+        except (IOError, OSError):
+            continue
+        if manifest.owner_alive():
+            inuse |= manifest.namespaces()
+        else:
+            stale.append((path, manifest))
+
+    recovered = 0
+    for path, manifest in stale:
+        # Claim it, another process may be recovering it too
+        claimed = "{}.{}".format(path, os.getpid())
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        manifest.path = claimed
+        logger.info("manifest: recovering stale topology {}".format(path))
+        manifest.close(exclude=inuse)
+        recovered += 1
+    return recovered
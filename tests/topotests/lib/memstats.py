@@ -0,0 +1,281 @@
+#
+# memstats.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+`show memory` statistics.
+
+parse_show_memory() turns the output of `show memory` (one or all daemons)
+into the system allocator statistics and the allocations of every memory
+type (MTYPE) of every memory group. diff() subtracts two of them and
+format_diff() ranks the memory types that grew, optionally per unit of work
+(e.g. bytes per route).
+
+MemorySampler takes labeled snapshots of the routers of a topology, so a
+test can compare its phases:
+
+    sampler = MemorySampler(tgen, ["r1"])
+    sampler.snapshot("before")
+    # install 10000 routes
+    sampler.snapshot("after")
+    logger.info(sampler.format_diff("before", "after", units=10000))
+"""
+
+import re
+import threading
+
+from lib.topolog import logger
+
+DAEMON_RE = re.compile(r"^Memory statistics for (\S+):")
+GROUP_RE = re.compile(r"^--- qmem (.+?) ---\s*$")
+ALLOCATOR_RE = re.compile(r"^\s+(\S[^:]*?):\s+(\S.*?)\s*$")
+MTYPE_RE = re.compile(r"^(\S.*?)\s*:\s+(\d.*?)\s*$")
+SIZE_RE = re.compile(r"^(\d+) (bytes?|KiB|MiB)$")
+
+SIZE_UNITS = {"byte": 1, "bytes": 1, "KiB": 1 << 10, "MiB": 1 << 20}
+
+
+def parse_size(value):
+    """
+    Returns the number of bytes of a size printed by `show memory` (e.g.
+    `12 MiB`), `None` when unknown (`> 2GB`).
+    """
+    match = SIZE_RE.match(value.strip())
+    if not match:
+        return None
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def _mtype(fields, has_total):
+    # Fields after the colon: count, size (missing when zero), total,
+    # maximum count and maximum bytes (the totals only exist when FRR was
+    # built with malloc_usable_size()).
+    entry = {"count": int(fields[0]), "size": None, "total": None}
+    if has_total:
+        if len(fields) == 5:
+            entry["size"] = fields[1]
+        entry["total"] = int(fields[-3])
+        entry["max_count"] = int(fields[-2])
+        entry["max_total"] = int(fields[-1])
+    else:
+        if len(fields) == 3:
+            entry["size"] = fields[1]
+        entry["max_count"] = int(fields[-1])
+    if entry["size"] is not None and entry["size"].isdigit():
+        entry["size"] = int(entry["size"])
+    if entry["total"] is None and isinstance(entry["size"], int):
+        # Estimate from the fixed size
+        entry["total"] = entry["count"] * entry["size"]
+    return entry
+
+
+def parse_show_memory(output, daemon=None):
+    """
+    Parses the output of `show memory` and returns a dictionary keyed by
+    daemon, the daemon comes from the vtysh `Memory statistics for` headers
+    or, when missing, is `daemon`. Every daemon has:
+
+    * `allocator`: the system allocator statistics (sizes in bytes), e.g.
+      `{"Total heap allocated": 12582912, ...}`;
+    * `groups`: the memory types by memory group, e.g.
+      `{"bgpd": {"BGP route": {"count": 10, "size": 88, "total": 960,
+      "max_count": 12, "max_total": 1152}}}`. `size` is `variable` for
+      variable sized types and `total` the allocated bytes (estimated from
+      the size when FRR can't tell).
+    """
+    result = {}
+    current = None
+    group = None
+    has_total = True
+
+    def _daemon(name):
+        return result.setdefault(name, {"allocator": {}, "groups": {}})
+
+    for line in output.splitlines():
+        match = DAEMON_RE.match(line)
+        if match:
+            daemon = match.group(1)
+            current = _daemon(daemon)
+            group = None
+            continue
+
+        if line.startswith("System allocator statistics"):
+            current = _daemon(daemon)
+            group = None
+            continue
+
+        match = GROUP_RE.match(line)
+        if match:
+            current = _daemon(daemon)
+            group = current["groups"].setdefault(match.group(1), {})
+            continue
+
+        if current is None:
+            continue
+
+        if group is None:
+            match = ALLOCATOR_RE.match(line)
+            if not match:
+                continue
+            value = match.group(2)
+            if value.isdigit():
+                current["allocator"][match.group(1)] = int(value)
+            else:
+                current["allocator"][match.group(1)] = parse_size(value)
+            continue
+
+        if line.startswith("Type"):
+            has_total = "Total" in line
+            continue
+        match = MTYPE_RE.match(line)
+        if not match:
+            continue
+        fields = match.group(2).split()
+        try:
+            group[match.group(1)] = _mtype(fields, has_total)
+        except (ValueError, IndexError):
+            continue
+    return result
+
+
+def diff(before, after):
+    """
+    Returns the memory types of every daemon whose allocations changed
+    between the parse_show_memory() results `before` and `after`:
+    `{daemon: {(group, mtype): {"count": delta, "bytes": delta}}}`, plus
+    the system allocator statistics differences (`allocator`).
+    """
+    result = {}
+    for daemon, stats in after.items():
+        old = before.get(daemon, {"allocator": {}, "groups": {}})
+        mtypes = {}
+        for group, types in stats["groups"].items():
+            old_types = old["groups"].get(group, {})
+            for name, entry in types.items():
+                old_entry = old_types.get(name, {"count": 0, "total": 0})
+                count = entry["count"] - old_entry["count"]
+                size = None
+                if entry["total"] is not None and old_entry["total"] is not None:
+                    size = entry["total"] - old_entry["total"]
+                if count == 0 and not size:
+                    continue
+                mtypes[(group, name)] = {"count": count, "bytes": size}
+        allocator = {}
+        for name, value in stats["allocator"].items():
+            old_value = old["allocator"].get(name)
+            if value is not None and old_value is not None:
+                allocator[name] = value - old_value
+        result[daemon] = {"mtypes": mtypes, "allocator": allocator}
+    return result
+
+
+def top_growth(delta, top=10):
+    """
+    Returns the `top` memory types that grew most in the diff() result
+    `delta` of one daemon as `(group, mtype, bytes, count)` tuples.
+    """
+    growth = []
+    for (group, name), entry in delta["mtypes"].items():
+        size = entry["bytes"] if entry["bytes"] is not None else 0
+        growth.append((group, name, size, entry["count"]))
+    growth.sort(key=lambda item: (-item[2], -item[3]))
+    return [item for item in growth if item[2] > 0 or item[3] > 0][:top]
+
+
+def format_diff(delta, units=None, unit_name="unit", top=10):
+    """
+    Returns the diff() result `delta` as text: the heap growth and the `top`
+    memory types that grew most of every daemon. With `units` (the number
+    of routes, peers... added in between) the growth per unit is also shown.
+    """
+    lines = []
+    for daemon in sorted(delta):
+        heap = delta[daemon]["allocator"].get("Total heap allocated")
+        line = "{}:".format(daemon)
+        if heap is not None:
+            line += " heap {:+d} bytes".format(heap)
+            if units:
+                line += " ({:.1f} bytes/{})".format(float(heap) / units, unit_name)
+        lines.append(line)
+        for group, name, size, count in top_growth(delta[daemon], top):
+            line = "  {:>12} bytes {:>8} allocations  {}: {}".format(
+                "{:+d}".format(size), "{:+d}".format(count), group, name
+            )
+            if units:
+                line += " ({:.1f} bytes/{})".format(float(size) / units, unit_name)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+class MemorySampler(object):
+    """
+    Labeled `show memory` snapshots of the `routers` (names, all routers
+    when `None`) of `tgen`, to compare test phases.
+    """
+
+    def __init__(self, tgen, routers=None):
+        self.tgen = tgen
+        self.routers = routers
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def add(self, label, router, output):
+        "Adds the `show memory` `output` of `router` to the snapshot `label`."
+        stats = parse_show_memory(output)
+        with self.lock:
+            self.snapshots.setdefault(label, {})[router] = stats
+        return stats
+
+    def snapshot(self, label):
+        "Collects `show memory` from the routers (in parallel) as `label`."
+        # pylint: disable=C0415
+        from lib import topotest
+
+        routers = self.tgen.routers()
+        names = sorted(self.routers or routers)
+
+        def _collect(name):
+            output = routers[name].vtysh_cmd("show memory")
+            self.add(label, name, output)
+
+        topotest.run_parallel(_collect, [(name,) for name in names])
+        return self.snapshots[label]
+
+    def diff(self, start, end):
+        "Returns the diff() of every router between two snapshots."
+        before = self.snapshots.get(start, {})
+        return dict(
+            (router, diff(before.get(router, {}), stats))
+            for router, stats in self.snapshots.get(end, {}).items()
+        )
+
+    def format_diff(self, start, end, units=None, unit_name="route", top=10):
+        "Returns the differences between two snapshots as text."
+        lines = []
+        for router, delta in sorted(self.diff(start, end).items()):
+            lines.append("{} memory {} -> {}:".format(router, start, end))
+            text = format_diff(delta, units, unit_name, top)
+            lines.extend("  " + line for line in text.splitlines())
+        return "\n".join(lines)
+
+    def log_diff(self, start, end, units=None, unit_name="route", top=10):
+        "Logs the differences between two snapshots."
+        logger.info(self.format_diff(start, end, units, unit_name, top))
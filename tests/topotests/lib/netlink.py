@@ -0,0 +1,763 @@
+#
+# netlink.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Minimal rtnetlink client for topology tests.
+
+Talks rtnetlink directly to the kernel of a node network namespace, so
+routes, rules and links can be dumped without running (and parsing the
+text output of) `ip` in the node shell. Messages are decoded while they
+are received, so big tables are never held in memory as text.
+"""
+
+import os
+import time
+import errno
+import select
+import socket
+import struct
+import ctypes
+import ctypes.util
+
+NETLINK_ROUTE = 0
+CLONE_NEWNET = 0x40000000
+
+# Netlink message types and flags
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_DUMP = 0x300
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWRULE = 32
+RTM_DELRULE = 33
+RTM_GETRULE = 34
+
+# Message headers
+NLMSGHDR = struct.Struct("=IHHII")
+RTATTR = struct.Struct("=HH")
+IFINFOMSG = struct.Struct("=BxHiII")
+RTMSG = struct.Struct("=BBBBBBBBI")
+FIBRULEHDR = struct.Struct("=BBBBBBBBI")
+RTNEXTHOP = struct.Struct("=HBBi")
+
+# Attributes
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+IFLA_VRF_TABLE = 1
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_MULTIPATH = 9
+RTA_TABLE = 15
+RTA_PREF = 20
+FRA_DST = 1
+FRA_SRC = 2
+FRA_IIFNAME = 3
+FRA_PRIORITY = 6
+FRA_FWMARK = 10
+FRA_TABLE = 15
+FRA_FWMASK = 16
+FRA_OIFNAME = 17
+FRA_PROTOCOL = 21
+
+RTM_F_CLONED = 0x200
+NLM_F_REPLACE = 0x100
+
+# Multicast groups
+RTNLGRP_LINK = 1
+RTNLGRP_IPV4_ROUTE = 7
+RTNLGRP_IPV4_RULE = 8
+RTNLGRP_IPV6_ROUTE = 11
+RTNLGRP_IPV6_RULE = 19
+
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+
+SO_RCVBUFFORCE = 33
+
+RT_TABLE_MAIN = 254
+RT_TABLE_LOCAL = 255
+
+RT_TABLES = {"all": 0, "default": 253, "main": RT_TABLE_MAIN, "local": RT_TABLE_LOCAL}
+
+# Names used by iproute2 (see /etc/iproute2/rt_*)
+RT_PROTOS = {
+    0: "unspec",
+    1: "redirect",
+    2: "kernel",
+    3: "boot",
+    4: "static",
+    8: "gated",
+    9: "ra",
+    10: "mrt",
+    11: "zebra",
+    12: "bird",
+    13: "dnrouted",
+    14: "xorp",
+    15: "ntk",
+    16: "dhcp",
+    42: "babel",
+}
+RT_SCOPES = {0: "global", 200: "site", 253: "link", 254: "host", 255: "nowhere"}
+RT_TYPES = {
+    1: "unicast",
+    2: "local",
+    3: "broadcast",
+    4: "anycast",
+    5: "multicast",
+    6: "blackhole",
+    7: "unreachable",
+    8: "prohibit",
+    9: "throw",
+    10: "nat",
+}
+RT_PREFS = {0: "medium", 1: "high", 3: "low"}
+
+_libc = None
+
+
+def _setns(fd):
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def netns_socket(pid=None, groups=0):
+    """
+    Opens a rtnetlink socket in the network namespace of process `pid`
+    (e.g. a mininet node shell). The socket stays in that namespace after
+    the calling thread switches back to its own.
+    """
+    if pid is None:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.bind((0, groups))
+        return sock
+
+    # setns() only switches the calling thread.
+    selfns = "/proc/thread-self/ns/net"
+    if not os.path.exists(selfns):
+        selfns = "/proc/self/ns/net"
+    selffd = os.open(selfns, os.O_RDONLY)
+    nodefd = os.open("/proc/{}/ns/net".format(pid), os.O_RDONLY)
+    try:
+        _setns(nodefd)
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            sock.bind((0, groups))
+        finally:
+            _setns(selffd)
+    finally:
+        os.close(nodefd)
+        os.close(selffd)
+    return sock
+
+
+def parse_attrs(data, offset=0, end=None):
+    "Decodes a rtattr list to a dictionary of attribute type to raw value."
+    attrs = {}
+    if end is None:
+        end = len(data)
+    while offset + RTATTR.size <= end:
+        alen, atype = RTATTR.unpack_from(data, offset)
+        if alen < RTATTR.size:
+            break
+        attrs[atype & 0x3FFF] = data[offset + RTATTR.size : offset + alen]
+        offset += (alen + 3) & ~3
+    return attrs
+
+
+def attr_u32(attrs, atype, default=None):
+    value = attrs.get(atype)
+    if value is None:
+        return default
+    return struct.unpack("=I", value[:4])[0]
+
+
+def attr_str(attrs, atype, default=None):
+    value = attrs.get(atype)
+    if value is None:
+        return default
+    value = value.split(b"\0", 1)[0]
+    if isinstance(value, str):
+        return value
+    return value.decode("utf-8")
+
+
+def attr_addr(family, value):
+    return socket.inet_ntop(family, value)
+
+
+class RtnlSocket(object):
+    """
+    rtnetlink socket bound to a node network namespace.
+
+    `groups` is the multicast group bitmask to subscribe to (see
+    RtnlMonitor), dumps don't need any.
+    """
+
+    def __init__(self, pid=None, groups=0, rcvbuf=None):
+        self.sock = netns_socket(pid, groups)
+        if rcvbuf:
+            try:
+                # Allowed to root above net.core.rmem_max
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, rcvbuf)
+            except socket.error:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.seq = 0
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def messages(self, seq=None, bufsize=1 << 17):
+        """
+        Generator of the received `(type, flags, payload)` messages. When
+        `seq` is given stops at the end of that dump (NLMSG_DONE).
+        """
+        while True:
+            data = self.sock.recv(bufsize)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                mlen, mtype, mflags, mseq, _ = NLMSGHDR.unpack_from(data, offset)
+                if mlen < NLMSGHDR.size:
+                    break
+                payload = data[offset + NLMSGHDR.size : offset + mlen]
+                offset += (mlen + 3) & ~3
+                if seq is not None and mseq != seq:
+                    continue
+                if mtype == NLMSG_DONE:
+                    return
+                if mtype == NLMSG_ERROR:
+                    err = -struct.unpack_from("=i", payload)[0]
+                    if err == 0:
+                        return
+                    raise OSError(err, os.strerror(err))
+                yield mtype, mflags, payload
+
+    def request(self, msgtype, header):
+        "Sends a `msgtype` dump request, returns its sequence number."
+        self.seq += 1
+        request = (
+            NLMSGHDR.pack(
+                NLMSGHDR.size + len(header),
+                msgtype,
+                NLM_F_REQUEST | NLM_F_DUMP,
+                self.seq,
+                0,
+            )
+            + header
+        )
+        self.sock.send(request)
+        return self.seq
+
+    def dump(self, msgtype, header):
+        "Requests a `msgtype` dump and yields the answer messages."
+        return self.messages(self.request(msgtype, header))
+
+
+def parse_link(payload):
+    "Returns `(ifindex, ifname, flags)` of a RTM_NEWLINK payload."
+    _, _, index, flags, _ = IFINFOMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, IFINFOMSG.size)
+    return index, attr_str(attrs, IFLA_IFNAME), flags
+
+
+def parse_link_vrf_table(payload):
+    "Returns the table of a RTM_NEWLINK payload of a VRF device, else `None`."
+    attrs = parse_attrs(payload, IFINFOMSG.size)
+    linkinfo = attrs.get(IFLA_LINKINFO)
+    if linkinfo is None:
+        return None
+    info = parse_attrs(linkinfo)
+    if attr_str(info, IFLA_INFO_KIND) != "vrf" or IFLA_INFO_DATA not in info:
+        return None
+    return attr_u32(parse_attrs(info[IFLA_INFO_DATA]), IFLA_VRF_TABLE)
+
+
+def parse_route(payload):
+    """
+    Decodes a RTM_NEWROUTE payload. Returns a dictionary with the `rtmsg`
+    fields, the raw destination (`dst`, packed address or None) and the
+    decoded attributes.
+    """
+    (
+        family,
+        dst_len,
+        _,
+        _,
+        table,
+        protocol,
+        scope,
+        rtype,
+        flags,
+    ) = RTMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, RTMSG.size)
+    route = {
+        "family": family,
+        "dst_len": dst_len,
+        "dst": attrs.get(RTA_DST),
+        "table": attr_u32(attrs, RTA_TABLE, table),
+        "protocol": protocol,
+        "scope": scope,
+        "type": rtype,
+        "flags": flags,
+        "oif": attr_u32(attrs, RTA_OIF),
+        "gateway": attrs.get(RTA_GATEWAY),
+        "priority": attr_u32(attrs, RTA_PRIORITY),
+        "prefsrc": attrs.get(RTA_PREFSRC),
+        "pref": ord(attrs[RTA_PREF][:1]) if RTA_PREF in attrs else None,
+        "multipath": None,
+    }
+    mpath = attrs.get(RTA_MULTIPATH)
+    if mpath is not None:
+        nexthops = []
+        offset = 0
+        while offset + RTNEXTHOP.size <= len(mpath):
+            nhlen, _, hops, ifindex = RTNEXTHOP.unpack_from(mpath, offset)
+            if nhlen < RTNEXTHOP.size:
+                break
+            nhattrs = parse_attrs(mpath, offset + RTNEXTHOP.size, offset + nhlen)
+            nexthops.append(
+                {
+                    "oif": ifindex,
+                    "gateway": nhattrs.get(RTA_GATEWAY),
+                    "weight": hops + 1,
+                }
+            )
+            offset += (nhlen + 3) & ~3
+        route["multipath"] = nexthops
+    return route
+
+
+def parse_rule(payload):
+    "Decodes a RTM_NEWRULE payload (same format as parse_route())."
+    (
+        family,
+        dst_len,
+        src_len,
+        _,
+        table,
+        _,
+        _,
+        action,
+        flags,
+    ) = FIBRULEHDR.unpack_from(payload)
+    attrs = parse_attrs(payload, FIBRULEHDR.size)
+    protocol = attrs.get(FRA_PROTOCOL)
+    return {
+        "family": family,
+        "dst_len": dst_len,
+        "src_len": src_len,
+        "dst": attrs.get(FRA_DST),
+        "src": attrs.get(FRA_SRC),
+        "table": attr_u32(attrs, FRA_TABLE, table),
+        "action": action,
+        "flags": flags,
+        "priority": attr_u32(attrs, FRA_PRIORITY, 0),
+        "iifname": attr_str(attrs, FRA_IIFNAME),
+        "oifname": attr_str(attrs, FRA_OIFNAME),
+        "fwmark": attr_u32(attrs, FRA_FWMARK),
+        "fwmask": attr_u32(attrs, FRA_FWMASK),
+        "protocol": ord(protocol[:1]) if protocol is not None else None,
+    }
+
+
+def table_number(table):
+    "Converts a table name (`main`, `local`, `all`...) or number to a number."
+    if table is None:
+        return RT_TABLE_MAIN
+    if table in RT_TABLES:
+        return RT_TABLES[table]
+    return int(table)
+
+
+def prefix_pack(prefix):
+    """
+    Converts a prefix string (`10.0.0.0/24`, `2001:db8::1`) to a
+    `(family, packed address, prefix length)` tuple.
+    """
+    if "/" in prefix:
+        address, plen = prefix.split("/")
+        plen = int(plen)
+    else:
+        address, plen = prefix, None
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    packed = socket.inet_pton(family, address)
+    if plen is None:
+        plen = len(packed) * 8
+    return family, packed, plen
+
+
+def route_key(prefix):
+    """
+    Returns the `(family, packed address, prefix length)` of `prefix` as
+    found in the routes (no destination address for default routes).
+    """
+    family, address, plen = prefix_pack(prefix)
+    if plen == 0:
+        address = None
+    return family, address, plen
+
+
+def links(pid=None, sock=None):
+    "Returns the interface index to name dictionary of the namespace."
+    own = sock is None
+    if own:
+        sock = RtnlSocket(pid)
+    result = {}
+    try:
+        for _, _, payload in sock.dump(
+            RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        ):
+            index, name, _ = parse_link(payload)
+            result[index] = name
+    finally:
+        if own:
+            sock.close()
+    return result
+
+
+def vrf_table(vrf, pid=None, sock=None):
+    "Returns the table of the VRF device `vrf`, `None` if there is no such VRF."
+    own = sock is None
+    if own:
+        sock = RtnlSocket(pid)
+    table = None
+    try:
+        for _, _, payload in sock.dump(
+            RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        ):
+            _, name, _ = parse_link(payload)
+            if name == vrf:
+                table = parse_link_vrf_table(payload)
+    finally:
+        if own:
+            sock.close()
+    return table
+
+
+def routes(pid, family, table=RT_TABLE_MAIN, protocol=None, prefix=None, sock=None):
+    """
+    Generator of the (parse_route() decoded) routes of the namespace.
+
+    Parameters:
+    * `table`: table number (0 for all tables);
+    * `protocol`: only routes with this protocol number;
+    * `prefix`: only the route with this exact destination (see prefix_pack()).
+
+    Cloned (cache) routes are skipped as `ip route` does.
+    """
+    own = sock is None
+    if own:
+        sock = RtnlSocket(pid)
+    if prefix is not None:
+        _, pdst, plen = prefix_pack(prefix)
+    try:
+        for _, _, payload in sock.dump(
+            RTM_GETROUTE, RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)
+        ):
+            route = parse_route(payload)
+            if route["flags"] & RTM_F_CLONED:
+                continue
+            if table and route["table"] != table:
+                continue
+            if protocol is not None and route["protocol"] != protocol:
+                continue
+            if prefix is not None:
+                dst = route["dst"] or b"\0" * len(pdst)
+                if route["dst_len"] != plen or dst != pdst:
+                    continue
+            yield route
+    finally:
+        if own:
+            sock.close()
+
+
+def rules(pid, family, sock=None):
+    "Generator of the (parse_rule() decoded) policy routing rules."
+    own = sock is None
+    if own:
+        sock = RtnlSocket(pid)
+    try:
+        for _, _, payload in sock.dump(
+            RTM_GETRULE, FIBRULEHDR.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)
+        ):
+            yield parse_rule(payload)
+    finally:
+        if own:
+            sock.close()
+
+
+class RtnlMonitor(object):
+    """
+    Keeps track of the kernel routes, links and rules of a namespace from
+    the rtnetlink multicast notifications, so tests can wait for a kernel
+    state without dumping the tables again and again.
+
+    The state is loaded with a dump when the monitor is created (and again
+    if notifications are lost) and then updated incrementally:
+    * `links`: interface index to `(name, flags)`;
+    * `rules`: set of `(family, priority, table, src, dst, iif)` tuples;
+    * route counters per `(family, table, protocol)` (see route_count()).
+
+    Only the counters are kept for the routes, a route replaced by one of
+    another protocol is still counted for the first one. The routes of the
+    watched `prefixes` (prefix strings, or all of them with `all_prefixes`)
+    are also kept, which is exact and needed by route_present() but costs
+    memory at route scale.
+
+    Usage example:
+
+        with RtnlMonitor(pid) as monitor:
+            # ... install the routes ...
+            assert monitor.wait(
+                lambda mon: mon.route_count(protocol=194) == 1000000, 300
+            )
+    """
+
+    def __init__(
+        self,
+        pid=None,
+        routes=True,
+        links=True,
+        rules=True,
+        rcvbuf=1 << 26,
+        prefixes=None,
+        all_prefixes=False,
+    ):
+        groups = 0
+        self.dumps = []
+        if links:
+            groups |= 1 << (RTNLGRP_LINK - 1)
+            self.dumps.append(
+                (RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+            )
+        if routes:
+            groups |= 1 << (RTNLGRP_IPV4_ROUTE - 1) | 1 << (RTNLGRP_IPV6_ROUTE - 1)
+            for family in (socket.AF_INET, socket.AF_INET6):
+                self.dumps.append(
+                    (RTM_GETROUTE, RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0))
+                )
+        if rules:
+            groups |= 1 << (RTNLGRP_IPV4_RULE - 1) | 1 << (RTNLGRP_IPV6_RULE - 1)
+            for family in (socket.AF_INET, socket.AF_INET6):
+                self.dumps.append(
+                    (RTM_GETRULE, FIBRULEHDR.pack(family, 0, 0, 0, 0, 0, 0, 0, 0))
+                )
+
+        self.sock = RtnlSocket(pid, groups, rcvbuf)
+        # Dump answers are sent to our port, notifications come from others
+        self.portid = self.sock.sock.getsockname()[0]
+        self.watched = set(route_key(prefix) for prefix in prefixes or [])
+        self.all_prefixes = all_prefixes
+        self.routes = {}
+        self.counts = {}
+        self.links = {}
+        self.rules = set()
+        self.resyncs = 0
+        self.lost = False
+        self.sync()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def sync(self):
+        """
+        (Re)loads the whole state with dumps, from the start again while
+        notifications are lost in the meantime.
+        """
+        self.lost = True
+        while self.lost:
+            self.lost = False
+            self.routes.clear()
+            self.counts.clear()
+            self.links.clear()
+            self.rules.clear()
+            for msgtype, header in self.dumps:
+                seq = self.sock.request(msgtype, header)
+                while not self.process(None, seq) and not self.lost:
+                    pass
+                if self.lost:
+                    break
+
+    def process(self, timeout=0, seq=None):
+        """
+        Receives and applies the pending notifications, waiting up to
+        `timeout` seconds (None waits forever) for the first ones. Returns
+        True when the end of the dump `seq` was received.
+
+        When notifications were lost `lost` is set and the state must be
+        reloaded with sync() (wait() does it).
+        """
+        rlist, _, _ = select.select([self.sock], [], [], timeout)
+        done = False
+        while rlist and not done:
+            try:
+                data = self.sock.sock.recv(1 << 17, socket.MSG_DONTWAIT)
+            except socket.error as error:
+                if error.errno == errno.ENOBUFS:
+                    self.resyncs += 1
+                    self.lost = True
+                    return False
+                if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return False
+                raise
+
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                mlen, mtype, mflags, mseq, mpid = NLMSGHDR.unpack_from(data, offset)
+                if mlen < NLMSGHDR.size:
+                    break
+                payload = data[offset + NLMSGHDR.size : offset + mlen]
+                offset += (mlen + 3) & ~3
+                if mpid == self.portid and mseq != seq:
+                    # Rest of a dump abandoned when notifications were lost
+                    continue
+                if mtype in (NLMSG_DONE, NLMSG_ERROR):
+                    if seq is not None and mseq == seq:
+                        done = True
+                    continue
+                self._apply(mtype, mflags, payload)
+        return done
+
+    def _apply(self, mtype, mflags, payload):
+        if mtype in (RTM_NEWROUTE, RTM_DELROUTE):
+            route = parse_route(payload)
+            if route["flags"] & RTM_F_CLONED:
+                return
+            family, table = route["family"], route["table"]
+            prefix = (family, route["dst"], route["dst_len"])
+            counter = (family, table, route["protocol"])
+            if self.all_prefixes or prefix in self.watched:
+                # Exact: the replaced route protocol is known
+                key = (family, table) + prefix[1:]
+                old = self.routes.pop(key, None)
+                if old is not None:
+                    self._count((family, table, old), -1)
+                if mtype == RTM_NEWROUTE:
+                    self.routes[key] = route["protocol"]
+                    self._count(counter, 1)
+            elif mtype == RTM_DELROUTE:
+                self._count(counter, -1)
+            elif not mflags & NLM_F_REPLACE:
+                self._count(counter, 1)
+        elif mtype in (RTM_NEWLINK, RTM_DELLINK):
+            index, name, flags = parse_link(payload)
+            if mtype == RTM_NEWLINK:
+                self.links[index] = (name, flags)
+            else:
+                self.links.pop(index, None)
+        elif mtype in (RTM_NEWRULE, RTM_DELRULE):
+            rule = parse_rule(payload)
+            key = (
+                rule["family"],
+                rule["priority"],
+                rule["table"],
+                rule["src"],
+                rule["dst"],
+                rule["iifname"],
+            )
+            if mtype == RTM_NEWRULE:
+                self.rules.add(key)
+            else:
+                self.rules.discard(key)
+
+    def _count(self, counter, delta):
+        count = self.counts.get(counter, 0) + delta
+        if count > 0:
+            self.counts[counter] = count
+        else:
+            self.counts.pop(counter, None)
+
+    def route_count(self, family=None, table=RT_TABLE_MAIN, protocol=None):
+        """
+        Returns the number of routes, optionally filtered by `family`,
+        `table` (0 for all tables) and `protocol` number.
+        """
+        return sum(
+            count
+            for (cfamily, ctable, cprotocol), count in self.counts.items()
+            if (family is None or cfamily == family)
+            and (not table or ctable == table)
+            and (protocol is None or cprotocol == protocol)
+        )
+
+    def route_present(self, prefix, table=RT_TABLE_MAIN):
+        """
+        Returns True when route `prefix` (see prefix_pack()) exists. The
+        prefix must be watched (see `prefixes`).
+        """
+        family, address, plen = route_key(prefix)
+        if not self.all_prefixes and (family, address, plen) not in self.watched:
+            raise ValueError("{}: prefix not watched by the monitor".format(prefix))
+        return (family, table, address, plen) in self.routes
+
+    def link_up(self, ifname):
+        "Returns True when interface `ifname` is administratively and oper up."
+        for name, flags in self.links.values():
+            if name == ifname:
+                return flags & (IFF_UP | IFF_LOWER_UP) == (IFF_UP | IFF_LOWER_UP)
+        return False
+
+    def wait(self, predicate, timeout=60):
+        """
+        Waits until `predicate(monitor)` is true, processing notifications as
+        they arrive. Returns False if the condition wasn't met before
+        `timeout` seconds.
+        """
+        deadline = time.time() + timeout
+        while not predicate(self):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self.process(remaining)
+            if self.lost:
+                self.sync()
+        return True
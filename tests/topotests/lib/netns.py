@@ -0,0 +1,231 @@
+#
+# netns.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Network namespace topology backend.
+
+Replaces `Mininet(topo=...)` in Topogen when `backend = netns` is configured
+in pytest.ini (or with the TOPOTESTS_BACKEND environment variable):
+
+* routers and hosts are still mininet nodes (a shell in its own namespaces),
+  so TopoRouter/topotest.Router work unchanged;
+* switches are Linux bridges, each one in its own network namespace, instead
+  of Open vSwitch bridges in the host namespace;
+* all veth pairs are created directly in their namespaces with a single
+  `ip -batch`, then every namespace brings its interfaces up (and attaches
+  the bridge ports) with one `ip -batch` of its own.
+
+Nothing is created in the host network namespace: the links and bridges go
+away with their namespaces when the nodes are terminated.
+"""
+
+import os
+import subprocess
+
+from mininet.node import Node, Host
+from mininet.link import Intf
+
+from lib.topolog import logger
+
+# No STP and no multicast snooping: ports forward right away, multicast is
+# flooded like with the standalone OVS bridges.
+BRIDGE_OPTIONS = "stp_state 0 mcast_snooping 0"
+
+
+def _keep_intf(*_args, **_kwargs):
+    "Interfaces are created in their namespace, they must not be moved."
+    return True
+
+
+def ip_batch(commands, pid=None):
+    """
+    Runs the `ip` `commands` (a list of strings) with `ip -batch`, in the
+    network namespace of `pid` when set. Returns the started process, use
+    ip_batch_wait() to wait for it.
+    """
+    command = ["ip", "-batch", "-"]
+    if pid is not None:
+        command = ["nsenter", "-t", str(pid), "-n"] + command
+    with open(os.devnull, "w") as devnull:
+        proc = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=devnull, stderr=subprocess.PIPE
+        )
+    proc.stdin.write("".join(line + "\n" for line in commands).encode("utf-8"))
+    proc.stdin.close()
+    return proc
+
+
+def ip_batch_wait(proc, what):
+    "Waits for an ip_batch() process and raises on failure."
+    error = proc.stderr.read()
+    if proc.wait() != 0:
+        raise Exception("{}: ip -batch failed: {}".format(what, error))
+
+
+class BridgeSwitch(Node):
+    """
+    A switch implemented with a Linux bridge (named after the switch) in its
+    own network namespace. Replaces LegacySwitch (standalone OVS bridge).
+    """
+
+    def __init__(self, name, **params):
+        params.pop("cls", None)
+        params.pop("isSwitch", None)
+        Node.__init__(self, name, inNamespace=True, **params)
+
+    def bridge_commands(self):
+        "Returns the `ip` commands to run in the switch namespace."
+        commands = ["link set lo up", "link set {} up".format(self.name)]
+        for intf in self.intfNames():
+            commands.append("link set {} master {} up".format(intf, self.name))
+        return commands
+
+
+class Network(object):
+    """
+    Topology network built from a mininet Topo. Implements the parts of the
+    Mininet object API used by Topogen and the tests: `net[name]`,
+    `nameToNode`, `hosts`, `switches`, `start()` and `stop()`.
+    """
+
+    def __init__(self, topo, manifest=None):
+        self.topo = topo
+        self.manifest = manifest
+        self.hosts = []
+        self.switches = []
+        self.nameToNode = {}
+        self.intfPairs = []
+        self.build()
+
+    def __getitem__(self, name):
+        return self.nameToNode[name]
+
+    def __contains__(self, name):
+        return name in self.nameToNode
+
+    def __iter__(self):
+        return iter(self.nameToNode)
+
+    def keys(self):
+        return self.nameToNode.keys()
+
+    def values(self):
+        return self.nameToNode.values()
+
+    def items(self):
+        return self.nameToNode.items()
+
+    def get(self, *names):
+        "Returns the nodes named `names` (like Mininet.get())."
+        nodes = [self.nameToNode[name] for name in names]
+        return nodes[0] if len(nodes) == 1 else nodes
+
+    def addNode(self, name, cls, **params):
+        node = cls(name, **params)
+        self.nameToNode[name] = node
+        # Links and bridges are created in the node namespaces: recording
+        # the namespaces is enough.
+        if self.manifest is not None:
+            self.manifest.add_node(node)
+        return node
+
+    def build(self):
+        "Creates the nodes, links and bridges of the topology."
+        topo = self.topo
+
+        for name in topo.hosts(sort=True):
+            params = dict(topo.nodeInfo(name))
+            cls = params.pop("cls", Host)
+            self.hosts.append(self.addNode(name, cls, **params))
+        for name in topo.switches(sort=True):
+            self.switches.append(
+                self.addNode(name, BridgeSwitch, **topo.nodeInfo(name))
+            )
+
+        # All links are created in one batch from the host namespace, each
+        # veth end directly in its node namespace.
+        commands = []
+        for _, _, info in topo.links(sort=True, withInfo=True):
+            node1 = self.nameToNode[info["node1"]]
+            node2 = self.nameToNode[info["node2"]]
+            port1, port2 = info.get("port1"), info.get("port2")
+            intf1 = info.get("intfName1") or "{}-eth{}".format(node1.name, port1)
+            intf2 = info.get("intfName2") or "{}-eth{}".format(node2.name, port2)
+            commands.append(
+                "link add {} netns {} type veth peer name {} netns {}".format(
+                    intf1, node1.pid, intf2, node2.pid
+                )
+            )
+            # The interfaces exist already: register them with their node
+            # without moving them or bringing them up one by one.
+            self.intfPairs.append(
+                (
+                    Intf(intf1, node=node1, port=port1, moveIntfFn=_keep_intf, up=None),
+                    Intf(intf2, node=node2, port=port2, moveIntfFn=_keep_intf, up=None),
+                )
+            )
+        for switch in self.switches:
+            commands.append(
+                "link add {} netns {} type bridge {}".format(
+                    switch.name, switch.pid, BRIDGE_OPTIONS
+                )
+            )
+        logger.info(
+            "netns: creating {} links and {} bridges".format(
+                len(self.intfPairs), len(self.switches)
+            )
+        )
+        ip_batch_wait(ip_batch(commands), "links")
+
+        # Bring the interfaces up in all namespaces at the same time.
+        procs = []
+        for node in self.hosts:
+            commands = ["link set lo up"]
+            commands += ["link set {} up".format(i) for i in node.intfNames()]
+            procs.append((node, ip_batch(commands, node.pid)))
+        for switch in self.switches:
+            procs.append((switch, ip_batch(switch.bridge_commands(), switch.pid)))
+        for node, proc in procs:
+            ip_batch_wait(proc, node.name)
+
+        # Node configuration (e.g. router sysctls, host addresses), as done by
+        # Mininet.configHosts().
+        for host in self.hosts:
+            if host.defaultIntf():
+                host.configDefault()
+            else:
+                host.configDefault(ip=None, mac=None)
+
+    def start(self):
+        "Nothing to start: the network is ready once built."
+        pass
+
+    def stop(self):
+        """
+        Terminates all nodes. The links and bridges are removed with their
+        namespaces.
+        """
+        for host in self.hosts:
+            host.terminate()
+        for switch in self.switches:
+            switch.terminate()
+        self.intfPairs = []
@@ -0,0 +1,148 @@
+#
+# probecache.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Cache for environment probes (kernel modules, daemon versions, environment
+diagnostics).
+
+Results are kept in memory and in a small JSON file shared by all test runs
+of the host (CACHE_FILE, or the TOPOTESTS_PROBE_CACHE environment variable;
+set it empty to disable the file). Every result is keyed by the kernel
+release and boot id, plus the stamps (see `file_stamp()`) of the files it
+depends on: probes run again after a reboot or when the binaries change.
+Remove the file to force new probes.
+"""
+
+import os
+import json
+import hashlib
+import platform
+import threading
+
+CACHE_FILE = "/tmp/topotests/probe_cache.json"
+
+_memory = {}
+_lock = threading.Lock()
+_host = []
+
+
+def cache_file():
+    "Returns the cache file path, or `None` when disabled."
+    path = os.environ.get("TOPOTESTS_PROBE_CACHE", CACHE_FILE)
+    return path or None
+
+
+def host_key():
+    "Returns the kernel release and boot id."
+    if not _host:
+        try:
+            with open("/proc/sys/kernel/random/boot_id") as bootid:
+                boot = bootid.read().strip()
+        except IOError:
+            boot = ""
+        _host.extend([platform.release(), boot])
+    return list(_host)
+
+
+def file_stamp(path):
+    "Returns what identifies a version of `path`: modification time and size."
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, None]
+    return [path, stat.st_mtime, stat.st_size]
+
+
+def which(name):
+    "Returns the path of the `name` executable in PATH, or `None`."
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def _load(path):
+    try:
+        with open(path) as cache:
+            return json.load(cache)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _store(path, key, entry):
+    # Merge with what other processes wrote meanwhile, last writer wins.
+    content = _load(path)
+    content[key] = entry
+    tmppath = "{}.{}".format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(tmppath, "w") as cache:
+            json.dump(content, cache, sort_keys=True, indent=1)
+        os.rename(tmppath, path)
+    except (IOError, OSError):
+        pass
+
+
+def cached(name, stamps, compute, keep=None):
+    """
+    Returns the result of `compute()` (a JSON serializable value) for the
+    probe `name` depending on `stamps` (a list of JSON serializable values,
+    usually `file_stamp()` results). `keep(result)` tells if the result may
+    be cached (always when unset).
+    """
+    digest = hashlib.sha1(
+        json.dumps([host_key(), stamps], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    key = "{} {}".format(name, digest)
+
+    with _lock:
+        if key in _memory:
+            return _memory[key]
+
+    path = cache_file()
+    if path is not None:
+        entry = _load(path).get(key)
+        if entry is not None:
+            with _lock:
+                _memory[key] = entry["value"]
+            return entry["value"]
+
+    value = compute()
+    if keep is not None and not keep(value):
+        return value
+    with _lock:
+        _memory[key] = value
+        if path is not None:
+            _store(path, key, {"value": value})
+    return value
+
+
+def clear():
+    "Forgets the cached results, in memory and on disk."
+    with _lock:
+        _memory.clear()
+        path = cache_file()
+        if path is not None and os.path.isfile(path):
+            os.remove(path)
@@ -0,0 +1,326 @@
+#
+# procsampler.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Daemon resource usage time series.
+
+Enabled with `pytest --proc-sample=<seconds>` (or the TOPOTESTS_PROC_SAMPLE
+environment variable): every topology gets a background thread reading
+`/proc/<pid>/stat`, `status` and `fd` of the daemons of all routers at the
+given interval. The daemon pids come from their pidfiles, read through the
+router mount namespace (see `Router.readDaemonPidfiles()`): the router shells
+are not thread safe, so the sampler never uses them and skips the routers
+whose pidfiles can't be read that way.
+
+The samples are appended to `<log directory>/<module>/proc_samples.csv`
+along with annotations: the test functions and common_config `step()`s.
+When the topology stops, `proc_report.json` is written next to it with, for
+every daemon, the peak and growth of the resident memory and the CPU
+seconds used, and for every annotated interval the memory growth and CPU
+seconds of each daemon.
+"""
+
+import os
+import time
+import threading
+
+from lib.topolog import logger
+from lib import reports
+
+# Seconds between pidfile reads (daemons restart)
+PID_REFRESH = 5
+
+CSV_HEADER = "kind,time,router,daemon,pid,rss_kb,hwm_kb,cpu_s,threads,fds,label\n"
+
+_interval = [1.0]
+_samplers = []
+_lock = threading.Lock()
+
+try:
+    _CLK_TCK = float(os.sysconf("SC_CLK_TCK"))
+except (ValueError, OSError, AttributeError):
+    _CLK_TCK = 100.0
+
+
+# enabled(): returns `True` when the daemons resource usage is being sampled.
+enabled, _enable = reports.toggle()
+
+
+def enable(interval=1.0, value=True):
+    "Enables (or disables) the sampling every `interval` seconds."
+    _enable(value)
+    _interval[0] = interval
+
+
+def read_process(pid, proc="/proc"):
+    """
+    Returns the resource usage of process `pid`: resident memory and its
+    peak (`rss_kb`, `hwm_kb`), CPU seconds (user plus system, `cpu_s`),
+    number of threads and open file descriptors. Returns `None` when the
+    process is gone.
+    """
+    base = os.path.join(proc, str(pid))
+    try:
+        with open(os.path.join(base, "stat")) as stat:
+            data = stat.read()
+        values = {"rss_kb": 0, "hwm_kb": 0}
+        with open(os.path.join(base, "status")) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    values["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    values["hwm_kb"] = int(line.split()[1])
+        fds = len(os.listdir(os.path.join(base, "fd")))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+    # The command name may contain spaces and parenthesis
+    fields = data[data.rfind(")") + 2 :].split()
+    try:
+        values["cpu_s"] = round((int(fields[11]) + int(fields[12])) / _CLK_TCK, 2)
+        values["threads"] = int(fields[17])
+    except (ValueError, IndexError):
+        return None
+    values["fds"] = fds
+    return values
+
+
+def interval_report(boundaries):
+    """
+    Returns the memory growth and CPU seconds of every daemon between
+    consecutive annotations. `boundaries` is a list of `(time, label,
+    samples)` with `samples` keyed by `(router, daemon)`.
+    """
+    intervals = []
+    for index, (start, label, before) in enumerate(boundaries[:-1]):
+        end, _, after = boundaries[index + 1]
+        daemons = {}
+        for key, values in after.items():
+            old = before.get(key)
+            if old is None or old["pid"] != values["pid"]:
+                continue
+            daemons["{}/{}".format(*key)] = {
+                "rss_growth_kb": values["rss_kb"] - old["rss_kb"],
+                "cpu_s": round(values["cpu_s"] - old["cpu_s"], 2),
+            }
+        intervals.append(
+            {"label": label, "time": round(end - start, 3), "daemons": daemons}
+        )
+    return intervals
+
+
+class ProcSampler(threading.Thread):
+    """
+    Samples the daemons of the routers of `tgen` every `interval` seconds
+    and writes the time series to `path` (CSV).
+    """
+
+    def __init__(self, tgen, path, interval=1.0):
+        super(ProcSampler, self).__init__(name="procsampler")
+        self.daemon = True
+        self.tgen = tgen
+        self.path = path
+        self.interval = interval
+        self.output = None
+        self.pids = {}
+        self.pids_time = 0
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        # Per daemon: first, last and peak samples
+        self.daemons = {}
+        self.boundaries = []
+        self.latest = {}
+
+    def _refresh_pids(self):
+        pids = {}
+        for name in sorted(self.tgen.routers()):
+            node = self.tgen.net.nameToNode.get(name)
+            if node is None or not hasattr(node, "readDaemonPidfiles"):
+                continue
+            try:
+                daemons = node.readDaemonPidfiles()
+            # A router being stopped must not stop the sampling
+            # pylint: disable=W0703
+            except Exception:
+                continue
+            if daemons is None:
+                continue
+            for daemon, pid in daemons.items():
+                pids[(name, daemon)] = pid
+        self.pids = pids
+        self.pids_time = time.time()
+
+    def _write(self, line):
+        if self.output is None:
+            return
+        try:
+            self.output.write(line)
+        except (IOError, OSError, ValueError):
+            self.output = None
+
+    def sample(self, label=None):
+        """
+        Samples all the daemons now. With `label` an annotation is also
+        recorded, starting a new interval of the report.
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.pids_time >= PID_REFRESH:
+                self._refresh_pids()
+
+            gone = False
+            for key, pid in sorted(self.pids.items()):
+                values = read_process(pid)
+                if values is None:
+                    gone = True
+                    continue
+                values["pid"] = pid
+                self.latest[key] = values
+                entry = self.daemons.get(key)
+                if entry is None or entry["pid"] != pid:
+                    entry = self.daemons[key] = {
+                        "pid": pid,
+                        "first": values,
+                        "peak_rss_kb": entry["peak_rss_kb"] if entry else 0,
+                        "max_fds": entry["max_fds"] if entry else 0,
+                        "restarts": entry["restarts"] + 1 if entry else 0,
+                        "previous_cpu_s": entry["cpu_s"] if entry else 0.0,
+                    }
+                entry["last"] = values
+                entry["peak_rss_kb"] = max(
+                    entry["peak_rss_kb"], values["rss_kb"], values["hwm_kb"]
+                )
+                entry["max_fds"] = max(entry["max_fds"], values["fds"])
+                entry["cpu_s"] = entry["previous_cpu_s"] + values["cpu_s"]
+                self._write(
+                    "S,{:.2f},{},{},{},{},{},{},{},{},\n".format(
+                        now,
+                        key[0],
+                        key[1],
+                        pid,
+                        values["rss_kb"],
+                        values["hwm_kb"],
+                        values["cpu_s"],
+                        values["threads"],
+                        values["fds"],
+                    )
+                )
+            if gone:
+                self.pids_time = 0
+
+            if label is not None:
+                self._write(
+                    'A,{:.2f},,,,,,,,,"{}"\n'.format(now, label.replace('"', "'"))
+                )
+                self.boundaries.append((now, label, dict(self.latest)))
+
+    def start(self):
+        "Opens the samples file and starts the sampling thread."
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.output = open(self.path, "w")
+            self.output.write(CSV_HEADER)
+        except (IOError, OSError) as error:
+            logger.warning(
+                "proc sampler: failed to open {}: {}".format(self.path, error)
+            )
+        super(ProcSampler, self).start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        "Stops the sampling, takes the last sample and closes the file."
+        self.stopped.set()
+        self.join()
+        self.sample("<stop>")
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def report(self):
+        "Returns the peak and growth of memory and CPU seconds of every daemon."
+        with self.lock:
+            daemons = {}
+            for key, entry in sorted(self.daemons.items()):
+                daemons["{}/{}".format(*key)] = {
+                    "peak_rss_kb": entry["peak_rss_kb"],
+                    "rss_growth_kb": entry["last"]["rss_kb"] - entry["first"]["rss_kb"],
+                    "last_rss_kb": entry["last"]["rss_kb"],
+                    "cpu_s": round(entry["cpu_s"], 2),
+                    "max_fds": entry["max_fds"],
+                    "restarts": entry["restarts"],
+                }
+            return {
+                "interval": self.interval,
+                "daemons": daemons,
+                "intervals": interval_report(self.boundaries),
+            }
+
+    def write_report(self, directory):
+        "Writes report() to `directory`/proc_report.json and logs the summary."
+        report = self.report()
+        for name, entry in sorted(report["daemons"].items()):
+            logger.info(
+                "proc sampler: {}: peak RSS {} kB, growth {} kB, CPU {:.2f}s".format(
+                    name, entry["peak_rss_kb"], entry["rss_growth_kb"], entry["cpu_s"]
+                )
+            )
+        return reports.write_json_report(directory, "proc_report", report)
+
+
+def start(tgen, directory):
+    "Starts sampling the daemons of `tgen`, writing the files to `directory`."
+    if not enabled():
+        return None
+    sampler = ProcSampler(
+        tgen, os.path.join(directory, "proc_samples.csv"), _interval[0]
+    )
+    sampler.start()
+    with _lock:
+        _samplers.append(sampler)
+    return sampler
+
+
+def stop(sampler):
+    "Stops `sampler` and writes its report next to its samples."
+    if sampler is None:
+        return
+    with _lock:
+        if sampler in _samplers:
+            _samplers.remove(sampler)
+    sampler.stop()
+    sampler.write_report(os.path.dirname(sampler.path))
+
+
+def annotate(label):
+    "Marks the start of `label` (a test or step) in the running samplers."
+    if not enabled():
+        return
+    with _lock:
+        samplers = list(_samplers)
+    for sampler in samplers:
+        sampler.sample(label)
@@ -0,0 +1,75 @@
+#
+# reports.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Helpers shared by the optional instrumentation modules (telemetry, vtysh
+profile, sleep report, thread CPU, process sampler, benchmark): their on/off
+switch and their report files.
+
+Only depends on lib.topolog, so any module can use it. write_json_report()
+is also available as `topotest.write_json_report()`.
+"""
+
+import os
+import json
+
+from lib.topolog import logger
+
+
+def toggle():
+    """
+    Returns the `(enabled, enable)` functions of an instrumentation module
+    that is off until enabled: `enabled()` returns its state and
+    `enable(value=True)` turns it on (or off).
+    """
+    state = [False]
+
+    def enabled():
+        return state[0]
+
+    def enable(value=True):
+        state[0] = value
+
+    return enabled, enable
+
+
+def write_json_report(directory, name, data, text=None):
+    """
+    Writes `data` to `directory`/`name`.json and, when set, `text` to
+    `directory`/`name`.txt. Creates `directory` when needed. A report must
+    not fail the tests: errors are only logged. Returns the JSON file path
+    or `None` on error.
+    """
+    path = os.path.join(directory, "{}.json".format(name))
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, "w") as output:
+            json.dump(data, output, indent=1, sort_keys=True)
+        if text is not None:
+            with open(os.path.join(directory, "{}.txt".format(name)), "w") as output:
+                output.write(text)
+    except (IOError, OSError) as error:
+        logger.warning("failed to write report {}: {}".format(path, error))
+        return None
+    logger.info("report written to {}".format(path))
+    return path
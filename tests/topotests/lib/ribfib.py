@@ -0,0 +1,493 @@
+#
+# ribfib.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+RIB versus FIB consistency checks.
+
+Compares the routes zebra reports as installed with the routes present in
+the kernel, at route-scale sizes. Both sides are streamed (zebra JSON one
+prefix at a time, the kernel with rtnetlink) into RouteTable objects: a
+sorted byte array of fixed-width records
+
+    packed prefix (big endian) | prefix length | nexthops digest
+
+so a million routes take a few tens of MB and are compared with a single
+linear merge. Routes of the same prefix (the kernel keeps one per metric)
+are collapsed to the one with the lowest rank (metric).
+
+Usage example:
+
+    result = ribfib_check(tgen.gears['r1'], protocol='sharp')
+    assert result.ok, str(result)
+"""
+
+import json
+import heapq
+import hashlib
+import re
+import socket
+import struct
+import subprocess
+
+from lib import netlink
+from lib.topotest import node_pid
+
+DIGEST_LEN = 8
+RANK = struct.Struct(">I")
+
+# Routes zebra learns from the kernel instead of installing them.
+SYSTEM_PROTOCOLS = ("kernel", "connected", "local")
+
+# Kernel protocol numbers zebra installs the routes of each route type with,
+# like zebra2proto() in zebra/rt_netlink.c (RTPROT_ZEBRA is 11).
+ZEBRA_PROTOCOLS = {
+    "babel": 42,
+    "bgp": 186,
+    "isis": 187,
+    "ospf": 188,
+    "ospf6": 188,
+    "rip": 189,
+    "ripng": 190,
+    "nhrp": 191,
+    "eigrp": 192,
+    "ldp": 193,
+    "sharp": 194,
+    "pbr": 195,
+    "static": 196,
+    "openfabric": 197,
+    "srte": 198,
+    "table": 11,
+    "nhg": 11,
+}
+
+# Top level member of a json-c pretty printed object: `  "key":value`
+JSON_TOP_MEMBER = re.compile(r'^  "(?P<key>[^"]+)":\s*(?P<value>.*)$')
+
+
+def nexthops_digest(nexthops):
+    """
+    Returns a short digest of a nexthop set. `nexthops` is an iterable of
+    `(gateway, interface)` string tuples (empty strings when not present).
+    """
+    text = "\n".join(sorted("{} {}".format(gw, ifname) for gw, ifname in nexthops))
+    return hashlib.sha1(text.encode("utf-8")).digest()[:DIGEST_LEN]
+
+
+class RouteTable(object):
+    """
+    Compact sorted route table.
+
+    Routes are added in any order with add(), then finish() sorts them:
+    records are sorted in chunks of `chunk` records and the chunks are merged
+    in the final byte array, so only one chunk of Python objects exists at a
+    time. Only the lowest `rank` route of a prefix is kept (`duplicates`
+    counts the others).
+    """
+
+    def __init__(self, family, chunk=65536):
+        self.family = family
+        self.addrlen = 4 if family == socket.AF_INET else 16
+        self.keylen = self.addrlen + 1
+        self.width = self.keylen + DIGEST_LEN
+        self.chunk = chunk
+        self.data = bytearray()
+        self.duplicates = 0
+        self._pending = []
+        self._chunks = []
+        # Big tables share a few nexthop sets
+        self._digests = {}
+
+    def add(self, address, plen, nexthops, rank=0):
+        "Adds a route (packed address, prefix length, nexthop set and rank)."
+        nexthops = tuple(nexthops)
+        digest = self._digests.get(nexthops)
+        if digest is None:
+            digest = self._digests[nexthops] = nexthops_digest(nexthops)
+        # The rank sorts the routes of a prefix until finish()
+        self._pending.append(
+            bytes(address) + struct.pack("B", plen) + RANK.pack(rank) + digest
+        )
+        if len(self._pending) >= self.chunk:
+            self._flush()
+
+    def add_prefix(self, prefix, nexthops, rank=0):
+        "Adds a route by prefix string (see netlink.prefix_pack())."
+        _, address, plen = netlink.prefix_pack(prefix)
+        self.add(address, plen, nexthops, rank)
+
+    def _flush(self):
+        if self._pending:
+            self._pending.sort()
+            self._chunks.append(b"".join(self._pending))
+            self._pending = []
+
+    def _records(self, chunk):
+        width = self.width + RANK.size
+        for offset in range(0, len(chunk), width):
+            yield chunk[offset : offset + width]
+
+    def finish(self):
+        "Sorts the added routes, must be called before any lookup."
+        self._flush()
+        chunks, self._chunks = self._chunks, []
+        self._digests = {}
+        last = None
+        for record in heapq.merge(*[self._records(chunk) for chunk in chunks]):
+            key = record[: self.keylen]
+            if key == last:
+                self.duplicates += 1
+                continue
+            last = key
+            self.data += key + record[self.keylen + RANK.size :]
+        return self
+
+    def __len__(self):
+        return len(self.data) // self.width
+
+    def key(self, index):
+        "Returns the packed prefix/length of the `index` record."
+        offset = index * self.width
+        return bytes(self.data[offset : offset + self.keylen])
+
+    def digest(self, index):
+        "Returns the nexthops digest of the `index` record."
+        offset = index * self.width + self.keylen
+        return bytes(self.data[offset : offset + DIGEST_LEN])
+
+    def prefix(self, key):
+        "Formats a packed key as a prefix string."
+        address = netlink.attr_addr(self.family, key[: self.addrlen])
+        return "{}/{}".format(address, struct.unpack("B", key[self.addrlen :])[0])
+
+
+def table_diff(rib, fib):
+    """
+    Linear merge of two finished RouteTables. Generates `(kind, key)`
+    tuples where `kind` is `missing` (route only in `rib`), `extra` (route
+    only in `fib`) or `mismatch` (route in both with different nexthops).
+    """
+    i, j = 0, 0
+    rlen, flen = len(rib), len(fib)
+    while i < rlen and j < flen:
+        rkey, fkey = rib.key(i), fib.key(j)
+        if rkey == fkey:
+            if rib.digest(i) != fib.digest(j):
+                yield "mismatch", rkey
+            i += 1
+            j += 1
+        elif rkey < fkey:
+            yield "missing", rkey
+            i += 1
+        else:
+            yield "extra", fkey
+            j += 1
+    for index in range(i, rlen):
+        yield "missing", rib.key(index)
+    for index in range(j, flen):
+        yield "extra", fib.key(index)
+
+
+def json_top_members(lines):
+    """
+    Generator of the `(key, value)` members of a top level JSON object
+    pretty printed by json-c (as vtysh does), decoding one member at a
+    time instead of the whole document.
+    """
+    key, buf = None, []
+    for line in lines:
+        if not isinstance(line, str):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if key is None:
+            match = JSON_TOP_MEMBER.match(line)
+            if not match:
+                continue
+            value = match.group("value").rstrip(",")
+            if value.endswith("[") or value.endswith("{"):
+                key, buf = match.group("key"), [value]
+            else:
+                yield match.group("key"), json.loads(value)
+            continue
+
+        if line.startswith("  ]") or line.startswith("  }"):
+            buf.append(line.strip().rstrip(","))
+            yield key, json.loads("".join(buf))
+            key, buf = None, []
+        else:
+            buf.append(line)
+
+
+def zebra_nexthops(route):
+    "Returns the installed nexthop set of a zebra JSON route."
+    nexthops = []
+    for nexthop in route.get("nexthops", []):
+        if not nexthop.get("fib"):
+            continue
+        if nexthop.get("unreachable"):
+            if nexthop.get("reject"):
+                nexthops.append(("unreachable", ""))
+            elif nexthop.get("admin-prohibited"):
+                nexthops.append(("prohibit", ""))
+            else:
+                nexthops.append(("blackhole", ""))
+            continue
+        nexthops.append((nexthop.get("ip", ""), nexthop.get("interfaceName", "")))
+    return nexthops
+
+
+def kernel_nexthops(route, ifnames):
+    "Returns the nexthop set of a netlink.parse_route() route."
+    if route["type"] != 1:
+        return [(netlink.RT_TYPES.get(route["type"], str(route["type"])), "")]
+
+    def _nexthop(gateway, oif):
+        if gateway is not None:
+            gateway = netlink.attr_addr(route["family"], gateway)
+        return (gateway or "", ifnames.get(oif, "") if oif is not None else "")
+
+    if route["multipath"] is not None:
+        return [_nexthop(nh["gateway"], nh["oif"]) for nh in route["multipath"]]
+    return [_nexthop(route["gateway"], route["oif"])]
+
+
+def _zebra_cmd(family, vrf, protocol, prefix=None):
+    cmd = "show {} route".format("ip" if family == socket.AF_INET else "ipv6")
+    if vrf is not None:
+        cmd += " vrf {}".format(vrf)
+    if prefix is not None:
+        cmd += " {}".format(prefix)
+    elif protocol is not None:
+        cmd += " {}".format(protocol)
+    return cmd + " json"
+
+
+def _mininet_node(node):
+    if hasattr(node, "tgen"):
+        return node.tgen.net[node.name]
+    return node
+
+
+def rib_table(node, family=socket.AF_INET, vrf=None, protocol=None, chunk=65536):
+    """
+    Builds the RouteTable of the routes zebra reports as installed in the
+    FIB (`show ip[v6] route json`). The command output is read from a pipe
+    and decoded one prefix at a time.
+
+    Routes learned from the kernel (kernel, connected and local) are skipped
+    unless `protocol` selects them.
+    """
+    table = RouteTable(family, chunk)
+    proc = _mininet_node(node).popen(
+        ["vtysh", "-c", _zebra_cmd(family, vrf, protocol)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    try:
+        for prefix, routes in json_top_members(iter(proc.stdout.readline, b"")):
+            for route in routes:
+                if not route.get("installed"):
+                    continue
+                if protocol is None and route.get("protocol") in SYSTEM_PROTOCOLS:
+                    continue
+                table.add_prefix(prefix, zebra_nexthops(route))
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    return table.finish()
+
+
+def _zebra_installed(protocol):
+    # Other route types are installed with RTPROT_ZEBRA as well.
+    return protocol in ZEBRA_PROTOCOLS.values()
+
+
+def protocol_number(protocol):
+    """
+    Returns the kernel protocol number of the zebra route type `protocol`
+    (e.g. `sharp`) or number. The route types zebra doesn't install
+    (kernel, connected, local) or doesn't know are rejected (ValueError).
+    """
+    if protocol in SYSTEM_PROTOCOLS:
+        raise ValueError(
+            "{} routes are not installed by zebra: nothing to compare".format(protocol)
+        )
+    if str(protocol).isdigit():
+        return int(protocol)
+    if protocol not in ZEBRA_PROTOCOLS:
+        raise ValueError("unknown route protocol: {}".format(protocol))
+    return ZEBRA_PROTOCOLS[protocol]
+
+
+def fib_table(
+    node, family=socket.AF_INET, table=None, protocol=None, chunk=65536, sock=None
+):
+    """
+    Builds the RouteTable of the kernel routes installed by zebra (or with
+    protocol `protocol`) in `table` (main by default), dumped with
+    rtnetlink.
+    """
+    pid = node_pid(node)
+    result = RouteTable(family, chunk)
+    if protocol is not None:
+        protocol = protocol_number(protocol)
+
+    own = sock is None
+    if own:
+        sock = netlink.RtnlSocket(pid)
+    try:
+        ifnames = netlink.links(sock=sock)
+        for route in netlink.routes(
+            pid, family, netlink.table_number(table), protocol, sock=sock
+        ):
+            if protocol is None and not _zebra_installed(route["protocol"]):
+                continue
+            address = route["dst"] or b"\0" * result.addrlen
+            result.add(
+                address,
+                route["dst_len"],
+                kernel_nexthops(route, ifnames),
+                route["priority"] or 0,
+            )
+    finally:
+        if own:
+            sock.close()
+    return result.finish()
+
+
+class RibFibResult(object):
+    """
+    RIB versus FIB comparison result, evaluates to True on success.
+
+    `missing`, `extra` and `mismatch` list the first routes of each problem,
+    `counts` has the total number of routes per problem.
+    """
+
+    def __init__(self, rib_count, fib_count):
+        self.rib_count = rib_count
+        self.fib_count = fib_count
+        self.counts = {"missing": 0, "extra": 0, "mismatch": 0}
+        self.missing = []
+        self.extra = []
+        self.mismatch = []
+
+    @property
+    def ok(self):
+        return not any(self.counts.values())
+
+    def __nonzero__(self):
+        return self.ok
+
+    __bool__ = __nonzero__
+
+    def __str__(self):
+        lines = [
+            "RIB routes: {}, FIB routes: {}, missing in FIB: {}, extra in FIB: {}, "
+            "nexthop mismatches: {}".format(
+                self.rib_count,
+                self.fib_count,
+                self.counts["missing"],
+                self.counts["extra"],
+                self.counts["mismatch"],
+            )
+        ]
+        for prefix in self.missing:
+            lines.append("  missing {}".format(prefix))
+        for prefix in self.extra:
+            lines.append("  extra {}".format(prefix))
+        for prefix, rib_nexthops, fib_nexthops in self.mismatch:
+            lines.append(
+                "  mismatch {}: zebra {} kernel {}".format(
+                    prefix, rib_nexthops, fib_nexthops
+                )
+            )
+        return "\n".join(lines)
+
+
+def ribfib_check(
+    node,
+    family=socket.AF_INET,
+    vrf=None,
+    table=None,
+    protocol=None,
+    limit=20,
+):
+    """
+    Checks that every route zebra reports as installed is in the kernel
+    with the same nexthops, and that the kernel has no other route installed
+    by zebra.
+
+    Parameters:
+    * `family`: socket.AF_INET or socket.AF_INET6;
+    * `vrf`/`table`: zebra VRF and the matching kernel table (by default the
+      table of the VRF device);
+    * `protocol`: only compare routes of this protocol (e.g. `sharp`);
+    * `limit`: maximum number of routes listed per problem (all of them are
+      counted).
+
+    Returns a RibFibResult.
+    """
+    if protocol is not None:
+        protocol_number(protocol)
+    if table is None and vrf not in (None, "default"):
+        table = netlink.vrf_table(vrf, node_pid(node))
+        if table is None:
+            raise ValueError("{}: no VRF device (table) found".format(vrf))
+
+    rib = rib_table(node, family, vrf, protocol)
+    fib = fib_table(node, family, table, protocol)
+    result = RibFibResult(len(rib), len(fib))
+    mismatch = []
+    for kind, key in table_diff(rib, fib):
+        result.counts[kind] += 1
+        if result.counts[kind] > limit:
+            continue
+        if kind == "mismatch":
+            mismatch.append(rib.prefix(key))
+        else:
+            getattr(result, kind).append(rib.prefix(key))
+    del rib, fib
+
+    # Fetch the details of the (few) reported nexthop mismatches
+    rnode = _mininet_node(node)
+    pid = node_pid(node)
+    for prefix in mismatch:
+        output = rnode.cmd(
+            'vtysh -c "{}"'.format(_zebra_cmd(family, vrf, None, prefix))
+        )
+        try:
+            routes = json.loads(output).get(prefix, [])
+        except ValueError:
+            routes = []
+        rib_nexthops = [
+            zebra_nexthops(route) for route in routes if route.get("installed")
+        ]
+        with netlink.RtnlSocket(pid) as sock:
+            ifnames = netlink.links(sock=sock)
+            fib_nexthops = [
+                kernel_nexthops(route, ifnames)
+                for route in netlink.routes(
+                    pid, family, netlink.table_number(table), prefix=prefix, sock=sock
+                )
+            ]
+        result.mismatch.append((prefix, rib_nexthops, fib_nexthops))
+
+    return result
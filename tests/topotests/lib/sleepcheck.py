@@ -0,0 +1,281 @@
+#
+# sleepcheck.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Wasted sleep detector.
+
+Enabled with `pytest --sleep-report` (or the TOPOTESTS_SLEEP_REPORT
+environment variable): `time.sleep()` (and so `topotest.sleep()`) is
+replaced by a wrapper recording every sleep by call site.
+
+A sleep is followed, most of the time, by a check of what it waited for.
+When the next run_and_expect() or `retry` wait of the same thread succeeds
+on its first check, the condition may already have been true before the
+sleep: the sleep time is counted as possibly wasted.
+
+With `--sleep-sample` (or TOPOTESTS_SLEEP_SAMPLE) the check that followed
+the previous sleep of the same call site is run once more right before
+sleeping (sleeps in loops wait for the same condition every time). When it
+already holds, the sleep is confirmed as wasted. The sleep itself always
+happens, so the test behaves the same, but the checks run more often.
+
+Sleeps inside the polling helpers (run_and_expect() and friends, `retry`)
+are only counted: they always follow a failed check. The `retry`
+initial_wait is the exception: it is recorded as a call site named after
+the decorated function (e.g. `common_config.py:<line>:verify_rib (initial
+wait)`), linked to the check that follows it.
+
+At the end of the session `sleep_report.json` and `sleep_report.txt` (the
+call sites ranked by wasted seconds) are written to the log directory.
+"""
+
+import os
+import sys
+import time
+import threading
+
+from lib import reports
+
+# Polling helpers: their sleeps follow a failed check
+POLL_FUNCTIONS = [
+    "run_and_expect",
+    "run_and_expect_type",
+    "run_and_expect_multi",
+    "_wait_condition",
+    "func_retry",
+]
+
+_time_sleep = time.sleep
+_sample = [False]
+_lock = threading.Lock()
+_local = threading.local()
+_sites = {}
+_checks = {}
+
+
+# enabled(): returns `True` when the sleeps are being recorded.
+enabled, _enable = reports.toggle()
+
+
+def enable(value=True, sample=False):
+    """
+    Starts (or stops) recording the sleeps, `sample` enables the early
+    sampling of the conditions.
+    """
+    _enable(value)
+    _sample[0] = value and sample
+    time.sleep = sleep if value else _time_sleep
+
+
+def reset():
+    "Forgets all the collected data."
+    with _lock:
+        _sites.clear()
+        _checks.clear()
+
+
+def new_module():
+    "Forgets the checks to sample, they belong to the previous topology."
+    with _lock:
+        _checks.clear()
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    # Skip the topotest.sleep() wrapper
+    if (
+        frame.f_code.co_name == "sleep"
+        and os.path.basename(frame.f_code.co_filename) == "topotest.py"
+        and frame.f_back is not None
+    ):
+        frame = frame.f_back
+    return "{}:{}:{}".format(
+        os.path.basename(frame.f_code.co_filename), frame.f_lineno, frame.f_code.co_name
+    )
+
+
+def new_site():
+    return {
+        "calls": 0,
+        "time": 0.0,
+        "poll": False,
+        # Sleeps followed by a wait (run_and_expect, retry)
+        "followed": 0,
+        # ... that succeeded on the first check
+        "satisfied": 0,
+        "satisfied_time": 0.0,
+        # Conditions checked before sleeping
+        "sampled": 0,
+        "sampled_time": 0.0,
+        "wasted": 0,
+        "wasted_time": 0.0,
+    }
+
+
+def _sample_condition(site):
+    "Runs the check of the last wait that followed `site`."
+    with _lock:
+        check = _checks.get(site)
+    if check is None:
+        return None
+    try:
+        return check()
+    # The condition must not break the test, whatever happens
+    # pylint: disable=W0703
+    except Exception:
+        return None
+
+
+def sleep(seconds):
+    "time.sleep() replacement recording the call site."
+    if not enabled():
+        return _time_sleep(seconds)
+
+    site = _call_site()
+    return _sleep(site, seconds, site.rsplit(":", 1)[1] in POLL_FUNCTIONS)
+
+
+def initial_sleep(seconds, func):
+    """
+    Sleep of a polling helper before the first check of `func` (the `retry`
+    initial_wait). It doesn't follow a failed check: it is recorded as a
+    call site of its own, named after `func`, like any other sleep.
+    """
+    if not enabled():
+        return _time_sleep(seconds)
+
+    code = func.__code__
+    site = "{}:{}:{} (initial wait)".format(
+        os.path.basename(code.co_filename), code.co_firstlineno, func.__name__
+    )
+    return _sleep(site, seconds, False)
+
+
+def _sleep(site, seconds, poll):
+    sampled = None
+    if _sample[0] and not poll:
+        sampled = _sample_condition(site)
+
+    with _lock:
+        entry = _sites.get(site)
+        if entry is None:
+            entry = _sites[site] = new_site()
+        entry["calls"] += 1
+        entry["time"] += seconds
+        entry["poll"] = poll
+        if sampled is not None:
+            entry["sampled"] += 1
+            entry["sampled_time"] += seconds
+            if sampled:
+                entry["wasted"] += 1
+                entry["wasted_time"] += seconds
+
+    if not poll:
+        _local.pending = (site, seconds, sampled is not None)
+    return _time_sleep(seconds)
+
+
+def wait_started(check=None):
+    """
+    Called when a wait starts: `check()` returns `True` when the awaited
+    condition holds. Without `check` (the wait can't tell) the previous
+    sleep is only forgotten. Returns a token for wait_done().
+    """
+    if not enabled():
+        return None
+    pending = getattr(_local, "pending", None)
+    _local.pending = None
+    if pending is None or check is None:
+        return None
+    with _lock:
+        _checks[pending[0]] = check
+    return pending
+
+
+def wait_done(token, success, checks):
+    "Called when the wait started with wait_started() ends."
+    if token is None:
+        return
+    site, seconds, sampled = token
+    with _lock:
+        entry = _sites[site]
+        entry["followed"] += 1
+        if success and checks == 1:
+            entry["satisfied"] += 1
+            if not sampled:
+                entry["satisfied_time"] += seconds
+
+
+def report():
+    """
+    Returns the call sites ranked by wasted seconds: the sleeps confirmed
+    as wasted by sampling plus the ones followed by an immediately
+    successful check (not sampled).
+    """
+    with _lock:
+        sites = []
+        for site, entry in _sites.items():
+            if entry["poll"]:
+                continue
+            wasted = entry["wasted_time"] + entry["satisfied_time"]
+            sites.append(dict(entry, site=site, estimate=round(wasted, 3)))
+        polls = dict(
+            (site, {"calls": e["calls"], "time": e["time"]})
+            for site, e in _sites.items()
+            if e["poll"]
+        )
+    sites.sort(key=lambda entry: (-entry["estimate"], -entry["time"]))
+    return {"sites": sites, "poll": polls}
+
+
+def format_report(data, top=100):
+    "Returns the `top` call sites of report() `data` as text."
+    lines = [
+        "{:>10} {:>6} {:>10} {:>10} {:>9}  {}".format(
+            "wasted(s)", "calls", "slept(s)", "sampled", "1st-ok", "call site"
+        )
+    ]
+    for entry in data["sites"][:top]:
+        lines.append(
+            "{:>10.1f} {:>6} {:>10.1f} {:>4}/{:<5} {:>4}/{:<4}  {}".format(
+                entry["estimate"],
+                entry["calls"],
+                entry["time"],
+                entry["wasted"],
+                entry["sampled"],
+                entry["satisfied"],
+                entry["followed"],
+                entry["site"],
+            )
+        )
+    poll = sum(entry["time"] for entry in data["poll"].values())
+    lines.append("")
+    lines.append("Slept in polling helpers: {:.1f}s".format(poll))
+    return "\n".join(lines) + "\n"
+
+
+def write_report(directory):
+    "Writes the report to `directory` (JSON and text versions)."
+    data = report()
+    return reports.write_json_report(
+        directory, "sleep_report", data, format_report(data)
+    )
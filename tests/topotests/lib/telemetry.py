@@ -0,0 +1,181 @@
+#
+# telemetry.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Per test performance telemetry.
+
+Enabled with `pytest --telemetry` (or the TOPOTESTS_TELEMETRY environment
+variable), conftest.py tells which test and phase (setup, call, teardown) is
+running and the library reports:
+
+* vtysh calls: TopoRouter.vtysh_cmd() and vtysh_multicmd() durations and
+  output sizes;
+* sleeps: topotest.sleep();
+* waits: run_and_expect() (and its variants) and the common_config `retry`
+  decorator, with the time spent running the checks versus sleeping between
+  them and the time until success.
+
+When the last test of a module finishes, the module report is written to
+`<log directory>/<module>/telemetry.json`.
+"""
+
+import time
+import threading
+
+from lib import reports
+from lib import vtyshprofile
+from lib import sleepcheck
+
+_lock = threading.Lock()
+_state = {"module": None, "test": None, "phase": None, "start": None}
+_tests = {}
+
+
+# enabled(): returns `True` when the telemetry is being collected.
+# enable(value=True): enables (or disables) the telemetry collection.
+enabled, enable = reports.toggle()
+
+
+def new_stats():
+    "Returns empty statistics for a test phase."
+    return {
+        "vtysh": {"calls": 0, "time": 0.0, "max_time": 0.0, "bytes": 0, "max_bytes": 0},
+        "sleep": {"calls": 0, "time": 0.0},
+        "waits": [],
+    }
+
+
+def merge_stats(total, stats):
+    "Adds `stats` to `total`."
+    for key in ["calls", "time", "bytes"]:
+        total["vtysh"][key] += stats["vtysh"][key]
+    for key in ["max_time", "max_bytes"]:
+        total["vtysh"][key] = max(total["vtysh"][key], stats["vtysh"][key])
+    for key in ["calls", "time"]:
+        total["sleep"][key] += stats["sleep"][key]
+    total["waits"].extend(stats["waits"])
+
+
+def begin(module, test, phase):
+    "Starts collecting for the `phase` of `test` in `module`."
+    with _lock:
+        if _state["module"] != module:
+            sleepcheck.new_module()
+            _tests.clear()
+            _state["module"] = module
+            _state["start"] = time.time()
+        _state["test"] = test
+        _state["phase"] = phase
+
+
+def _current():
+    # Must be called with the lock held
+    test = _tests.setdefault(_state["test"] or "<module>", {})
+    return test.setdefault(_state["phase"] or "call", new_stats())
+
+
+def record_vtysh(router, command, seconds, size):
+    """
+    Records a vtysh call taking `seconds` and returning `size` bytes (also
+    for the vtysh profile, see lib/vtyshprofile.py).
+    """
+    vtyshprofile.record(router, command, seconds, size)
+    if not enabled():
+        return
+    with _lock:
+        stats = _current()["vtysh"]
+        stats["calls"] += 1
+        stats["time"] += seconds
+        stats["max_time"] = max(stats["max_time"], seconds)
+        stats["bytes"] += size
+        stats["max_bytes"] = max(stats["max_bytes"], size)
+
+
+def record_sleep(seconds):
+    "Records an unconditional sleep (topotest.sleep())."
+    if not enabled():
+        return
+    with _lock:
+        stats = _current()["sleep"]
+        stats["calls"] += 1
+        stats["time"] += seconds
+
+
+def record_wait(kind, name, success, seconds, checks, check_time):
+    """
+    Records a wait for a condition: `kind` is the helper (e.g.
+    `run_and_expect`), `name` the condition function, `seconds` the total
+    time waited, `checks` the number of times the condition was tested and
+    `check_time` the time spent testing it (the rest was spent sleeping).
+    """
+    if not enabled():
+        return
+    with _lock:
+        _current()["waits"].append(
+            {
+                "kind": kind,
+                "name": name,
+                "success": success,
+                "time": round(seconds, 3),
+                "checks": checks,
+                "check_time": round(check_time, 3),
+                "sleep_time": round(max(seconds - check_time, 0), 3),
+            }
+        )
+
+
+def summary(stats):
+    "Returns the wait totals of `stats`: time checking, sleeping and to success."
+    waits = stats["waits"]
+    return {
+        "waits": len(waits),
+        "wait_time": round(sum(w["time"] for w in waits), 3),
+        "wait_check_time": round(sum(w["check_time"] for w in waits), 3),
+        "wait_sleep_time": round(sum(w["sleep_time"] for w in waits), 3),
+        "wait_failures": len([w for w in waits if not w["success"]]),
+    }
+
+
+def module_report():
+    "Returns the report of the current module."
+    with _lock:
+        total = new_stats()
+        tests = {}
+        for test, phases in _tests.items():
+            tests[test] = {}
+            for phase, stats in phases.items():
+                merge_stats(total, stats)
+                tests[test][phase] = dict(stats, summary=summary(stats))
+        start = _state["start"]
+        return {
+            "module": _state["module"],
+            "time": round(time.time() - start, 3) if start else 0,
+            "tests": tests,
+            "total": dict(
+                vtysh=total["vtysh"], sleep=total["sleep"], summary=summary(total)
+            ),
+        }
+
+
+def write_report(directory):
+    "Writes the current module report to `directory`/telemetry.json."
+    return reports.write_json_report(directory, "telemetry", module_report())
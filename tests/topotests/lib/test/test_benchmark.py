@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+#
+# test_benchmark.py
+# Tests for the benchmark baselines.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the benchmark baselines.
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import benchmark
+
+
+def test_baseline():
+    "Test the baseline is the median of the last results."
+    history = [{"value": value} for value in [100, 1, 2, 3, 4]]
+    assert benchmark.baseline(history, 3, 3) == 3
+    assert benchmark.baseline(history, 4, 3) == 2.5
+    assert benchmark.baseline(history, 10, 6) is None
+
+    # Regressions are not part of the baseline
+    history.append({"value": 50, "regression": True})
+    assert benchmark.baseline(history, 3, 3) == 3
+
+
+def test_is_regression():
+    "Test the tolerance in both directions."
+    assert not benchmark.is_regression(10.9, 10, 0.1)
+    assert benchmark.is_regression(11.1, 10, 0.1)
+    assert not benchmark.is_regression(9.1, 10, 0.1, higher_is_better=True)
+    assert benchmark.is_regression(8.9, 10, 0.1, higher_is_better=True)
+    assert not benchmark.is_regression(1000, None, 0.1)
+
+
+def test_finish():
+    "Test the results are stored and compared to the previous runs."
+    directory = tempfile.mkdtemp()
+    os.environ["TOPOTESTS_BENCHMARK_STORE"] = os.path.join(directory, "store")
+    try:
+        for value in [10, 11, 9]:
+            benchmark.begin("test_x", min_samples=3)
+            benchmark.metric("convergence", value, "s")
+            assert benchmark.finish() == []
+
+        # Failed tests are not stored
+        benchmark.begin("test_x", min_samples=3)
+        benchmark.metric("convergence", 100, "s")
+        assert benchmark.finish(success=False) == []
+        assert len(benchmark.load_results()) == 3
+
+        benchmark.begin("test_x", min_samples=3, tolerance=0.5)
+        benchmark.metric("convergence", 14, "s")
+        benchmark.metric("routes", 1, "routes/s", higher_is_better=True)
+        assert benchmark.finish() == []
+
+        benchmark.begin("test_x", min_samples=3)
+        benchmark.metric("convergence", 12, "s")
+        regressions = benchmark.finish()
+        assert [entry["metric"] for entry in regressions] == ["convergence"]
+        assert regressions[0]["baseline"] == 10.5
+        assert "convergence = 12 s (baseline 10.5 s" in (
+            benchmark.format_regressions(regressions)
+        )
+        assert benchmark.load_results()[-1]["regression"]
+
+        # Outside of a benchmark test
+        benchmark.metric("ignored", 1)
+        assert benchmark.finish() == []
+        assert benchmark.write_report(directory) is not None
+    finally:
+        del os.environ["TOPOTESTS_BENCHMARK_STORE"]
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+#
+# test_crashinfo.py
+# Tests for the crash information collection.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the crash information collection.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.crashinfo import CrashReport, asan_error, leak_report
+
+
+def test_leak_report():
+    "Test memory leak report formatting"
+
+    assert leak_report(["some error", "another line"]) == ""
+
+    lines = [
+        "core_handler: showing active allocations in memory group libfrr",
+        "memstats:  Buffer                        :      1 * 24",
+        "memstats:  Prefix                        :      2 * 48",
+    ]
+    assert leak_report(lines) == (
+        "\n"
+        "  ## showing active allocations in memory group libfrr\n"
+        "    Buffer                        :      1 * 24\n"
+        "    Prefix                        :      2 * 48\n"
+    )
+    assert leak_report(lines, "####", True) == (
+        "\n"
+        "#### showing active allocations in memory group libfrr\n"
+        "\n"
+        "    Buffer                        :      1 * 24\n"
+        "    Prefix                        :      2 * 48\n"
+    )
+
+
+def test_asan_error():
+    "Test AddressSanitizer error extraction"
+
+    assert asan_error(["nothing", "to see"]) is None
+
+    lines = [
+        "bgpd started",
+        "==1234==ERROR: AddressSanitizer: heap-use-after-free on address 0x1",
+        "READ of size 8 at 0x1 thread T0",
+        "    #0 0x2 in bgp_free",
+        "==1234==ABORTING",
+        "trailing line",
+    ]
+    kind, text = asan_error(lines)
+    assert kind == "heap-use-after-free"
+    assert text == "\n".join(
+        [
+            "ERROR: AddressSanitizer: heap-use-after-free on address 0x1",
+            "READ of size 8 at 0x1 thread T0",
+            "    #0 0x2 in bgp_free",
+            "",
+        ]
+    )
+
+
+def test_crash_report():
+    "Test crash report aggregation"
+
+    report = CrashReport()
+    assert len(report) == 0
+    report.add("r1", "bgpd", "core", "r1: bgpd crashed\n", "backtrace")
+    other = CrashReport()
+    other.add("r2", "zebra", "leak", "r2: zebra has memory leaks:\n", "leaks")
+    report.extend(other)
+
+    assert len(report) == 2
+    assert report.summary() == (
+        "\nr1: bgpd crashed\nbacktrace\nr2: zebra has memory leaks:\n"
+    )
+    assert str(report) == (
+        "\nr1: bgpd crashed\nbacktrace\nr2: zebra has memory leaks:\nleaks"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
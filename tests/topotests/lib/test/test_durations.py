@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#
+# test_durations.py
+# Tests for the test duration history.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the test duration history.
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import durations
+
+
+class FakeItem(object):
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+
+
+def test_estimates():
+    "Test the module estimates are the average of the last runs."
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "durations.db")
+    try:
+        for duration in [10.0, 20.0, 30.0]:
+            durations.record("a/test_a.py::test_one", "setup", duration, "passed")
+            durations.record("a/test_a.py::test_one", "call", 1.0, "failed")
+            durations.record("b/test_b.py::test_one", "call", 5.0, "passed")
+            durations.save(path)
+            # New run
+            durations._run += "+"
+
+        estimates = durations.module_estimates(path)
+        assert estimates == {"a/test_a.py": 21.0, "b/test_b.py": 5.0}
+        assert durations.module_estimates(path, runs=1) == {
+            "a/test_a.py": 31.0,
+            "b/test_b.py": 5.0,
+        }
+        assert durations.module_estimates(os.path.join(directory, "none")) == {}
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_order_items():
+    "Test the modules are ordered longest first, unknown modules first."
+    items = [
+        FakeItem("a/test_a.py::test_one"),
+        FakeItem("a/test_a.py::test_two"),
+        FakeItem("b/test_b.py::test_one"),
+        FakeItem("c/test_c.py::test_one"),
+        FakeItem("d/test_d.py::test_one"),
+    ]
+    estimates = {"a/test_a.py": 10, "b/test_b.py": 100, "d/test_d.py": 50}
+    durations.order_items(items, estimates)
+    assert [item.nodeid for item in items] == [
+        "c/test_c.py::test_one",
+        "b/test_b.py::test_one",
+        "d/test_d.py::test_one",
+        "a/test_a.py::test_one",
+        "a/test_a.py::test_two",
+    ]
+
+
+def test_makespan():
+    "Test longest first gets closer to the optimal run time."
+    jobs = [2, 2, 2, 2, 2, 2, 6]
+    assert durations.makespan(jobs, 2) == 12
+    assert durations.makespan(sorted(jobs, reverse=True), 2) == 10
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
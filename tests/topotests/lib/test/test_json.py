@@ -35,7 +35,8 @@ CWD = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(CWD, "../../"))
 
 # pylint: disable=C0413
-from lib.topotest import json_cmp
+from lib.topotest import json_cmp, json_volatile_strip
+from lib.topotest import json_narrow_cmds, json_narrow_merge
 
 
 def test_json_intersect_true():
@@ -497,5 +498,84 @@ def test_json_list_nested_with_objects():
 
     assert json_cmp(dcomplete, dsub1) is None
 
+
+def test_json_volatile_strip():
+    "Test that volatile fields are ignored when comparing outputs"
+
+    out1 = """{
+  "ipv4Unicast":{
+    "peers":{
+      "10.0.0.2":{
+        "state":"Established",
+        "peerUptime":"00:00:05",
+        "peerUptimeMsec":5000,
+        "msgRcvd":10,
+        "pfxRcd":3
+      }
+    }
+  }
+}"""
+    # Only timers and counters changed
+    out2 = (
+        out1.replace('"00:00:05"', '"00:00:08"')
+        .replace("5000", "8000")
+        .replace('"msgRcvd":10', '"msgRcvd":11')
+    )
+    # Routing state changed
+    out3 = out1.replace('"pfxRcd":3', '"pfxRcd":4')
+
+    assert json_volatile_strip(out1) == json_volatile_strip(out2)
+    assert json_volatile_strip(out1) != json_volatile_strip(out3)
+    assert '"state":"Established"' in json_volatile_strip(out1)
+
+
+def test_json_narrow():
+    "Test narrowing show commands to the expected prefixes/VRFs"
+
+    dexpect = {
+        "10.0.0.0/24": [{"protocol": "connected"}],
+        "192.168.1.1/32": None,
+    }
+    plan = json_narrow_cmds("show ip route json", dexpect)
+    assert [p[0] for p in plan] == [
+        "show ip route 10.0.0.0/24 json",
+        "show ip route 192.168.1.1/32 json",
+    ]
+    merged = json_narrow_merge(
+        [
+            ((), "10.0.0.0/24", {"10.0.0.0/24": [{"protocol": "connected"}]}),
+            ((), "192.168.1.1/32", {}),
+        ]
+    )
+    assert merged == {"10.0.0.0/24": [{"protocol": "connected"}]}
+    assert json_cmp(merged, dexpect) is None
+
+    # Non prefix keys can't be narrowed
+    assert json_narrow_cmds("show ip route json", {"foo": 1}) is None
+    assert json_narrow_cmds("show ip ospf neighbor json", dexpect) is None
+
+    plan = json_narrow_cmds(
+        "show ipv6 route vrf all json",
+        {"default": {"2001:db8::/64": []}, "blue": {"ipv6Unicast": {}}},
+    )
+    assert plan == [
+        ("show ipv6 route vrf blue json", ("blue",), None),
+        ("show ipv6 route 2001:db8::/64 json", ("default",), "2001:db8::/64"),
+    ]
+    merged = json_narrow_merge(
+        [
+            (("blue",), None, {"2001:db8:1::/64": []}),
+            (("default",), "2001:db8::/64", {"2001:db8::/64": [{}]}),
+        ]
+    )
+    assert merged == {
+        "blue": {"2001:db8:1::/64": []},
+        "default": {"2001:db8::/64": [{}]},
+    }
+
+    plan = json_narrow_cmds("show bgp vrf all ipv4 unicast json", {"red": {}})
+    assert plan == [("show bgp vrf red ipv4 unicast json", ("red",), None)]
+
+
 if __name__ == "__main__":
     sys.exit(pytest.main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#
+# test_logreader.py
+# Tests for the incremental log reader.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the incremental log reader.
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.logreader import LogFile
+
+
+def test_log_consumers():
+    "Test that each consumer only reads new data"
+
+    logdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(logdir, "bgpd.err")
+        log = LogFile(path)
+        assert log.read("c1") == ""
+
+        with open(path, "w") as logfile:
+            logfile.write("line 1\nline 2\npartial")
+        assert log.read("c1") == "line 1\nline 2\npartial"
+        assert list(log.lines("c2")) == ["line 1", "line 2"]
+
+        with open(path, "a") as logfile:
+            logfile.write(" line 3\nline 4 ERROR\n")
+        assert log.read("c1") == " line 3\nline 4 ERROR\n"
+        assert list(log.lines("c2")) == ["partial line 3", "line 4 ERROR"]
+        assert log.read("c1") == ""
+        assert log.grep("ERROR") == ["line 4 ERROR"]
+        assert log.grep("ERROR", "c2") == []
+
+        # Truncated by a daemon restart
+        with open(path, "w") as logfile:
+            logfile.write("new\n")
+        assert log.read("c1") == "new\n"
+        log.reset()
+        assert log.read("c2") == "new\n"
+    finally:
+        shutil.rmtree(logdir)
+
+
+def test_log_tail():
+    "Test reading the end of a log"
+
+    logdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(logdir, "zebra.log")
+        with open(path, "w") as logfile:
+            for i in range(20000):
+                logfile.write("line {}\n".format(i))
+
+        log = LogFile(path)
+        assert log.tail(3) == "line 19997\nline 19998\nline 19999"
+        assert log.tail(1) == "line 19999"
+        assert len(log.grep("^line 1", max_count=5)) == 5
+    finally:
+        shutil.rmtree(logdir)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+#
+# test_logring.py
+# Tests for the daemon output ring buffer.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the daemon output ring buffer.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.logring import LogRing, parse_size
+
+
+def test_parse_size():
+    "Test size parsing"
+
+    assert parse_size(None) is None
+    assert parse_size("") is None
+    assert parse_size("100") == 100
+    assert parse_size("64k") == 65536
+    assert parse_size("16M") == 16 * 1024 * 1024
+
+
+def test_log_ring():
+    "Test that the ring keeps only the last bytes"
+
+    ring = LogRing(10)
+    ring.write(b"0123")
+    ring.write(b"456789abcdef")
+    assert ring.dump() == b"6789abcdef"
+    assert ring.dropped == 6
+    assert ring.tail(3) == b"def"
+    ring.write(b"g")
+    assert ring.dump() == b"789abcdefg"
+    assert ring.tail(100) == b"789abcdefg"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
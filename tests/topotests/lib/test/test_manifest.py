@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#
+# test_manifest.py
+# Tests for the topology manifest.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the topology manifest.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.manifest import Manifest, netns_id, recover_stale
+from lib.probecache import which
+from lib.topogen import ManifestMininet
+from lib.topotest import LegacySwitch
+
+
+class FakeNode(object):
+    "A process in its own network namespace, like a mininet node."
+
+    def __init__(self, name):
+        self.name = name
+        self.proc = subprocess.Popen(["unshare", "-n", "sleep", "60"])
+        self.pid = self.proc.pid
+        # Wait for the namespace to be created
+        for _ in range(100):
+            if netns_id(self.pid) != netns_id("self"):
+                break
+            time.sleep(0.05)
+
+    def intfNames(self):
+        return ["lo"]
+
+    def exited(self):
+        for _ in range(100):
+            if self.proc.poll() is not None:
+                return True
+            time.sleep(0.05)
+        return False
+
+
+def test_manifest_cleanup():
+    "Test the removal of the recorded namespaces"
+
+    directory = tempfile.mkdtemp()
+    try:
+        node = FakeNode("r1")
+        manifest = Manifest(directory=directory)
+        manifest.add_node(node)
+        assert os.path.isfile(manifest.path)
+        assert manifest.namespaces() == set([netns_id(node.pid)])
+
+        # Nothing is removed while the owner is running
+        assert recover_stale(directory) == 0
+        assert node.proc.poll() is None
+
+        manifest.close()
+        assert node.exited()
+        assert not os.path.exists(manifest.path)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_manifest_recover():
+    "Test the recovery of the manifest of a dead test run"
+
+    directory = tempfile.mkdtemp()
+    try:
+        node = FakeNode("r1")
+        manifest = Manifest(directory=directory)
+        manifest.add_node(node)
+
+        # Pretend the owner is gone (the start time doesn't match)
+        with open(manifest.path) as mfile:
+            entries = [json.loads(line) for line in mfile]
+        entries[0]["start"] = -1
+        with open(manifest.path, "w") as mfile:
+            for entry in entries:
+                mfile.write(json.dumps(entry) + "\n")
+
+        assert recover_stale(directory) == 1
+        assert node.exited()
+        assert os.listdir(directory) == []
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_manifest_links():
+    "Test the removal of links recorded before their creation"
+
+    directory = tempfile.mkdtemp()
+    try:
+        manifest = Manifest(directory=directory)
+        manifest.add_link("mfst-created")
+        manifest.add_link("mfst-never")
+        manifest.add_bridge("mfst-br-never")
+        with open(manifest.path) as mfile:
+            kinds = [json.loads(line)["kind"] for line in mfile]
+        assert kinds == ["owner", "link", "link", "bridge"]
+
+        subprocess.check_call(
+            ["ip", "link", "add", "mfst-created", "type", "veth"]
+            + ["peer", "name", "mfst-peer"]
+        )
+        # Only the items that were created are removed
+        assert manifest.cleanup() == 1
+        assert not os.path.exists("/sys/class/net/mfst-created")
+    finally:
+        shutil.rmtree(directory)
+
+
+class ShelllessSwitch(LegacySwitch):
+    "A LegacySwitch without its shell, nothing is created."
+
+    def startShell(self, *args, **kwargs):
+        pass
+
+    def mountPrivateDirs(self):
+        pass
+
+
+def test_manifest_worker_bridge():
+    "Test the bridge of a pytest-xdist worker is recorded with its real name"
+
+    # Mininet requires root and checks Open vSwitch is installed
+    if os.geteuid() != 0 or which("ovs-vsctl") is None:
+        pytest.skip("requires root and Open vSwitch")
+
+    directory = tempfile.mkdtemp()
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    os.environ["PYTEST_XDIST_WORKER"] = "gw7"
+    try:
+        manifest = Manifest(directory=directory)
+        net = ManifestMininet(manifest, build=False)
+        switch = net.addSwitch("s1", cls=ShelllessSwitch)
+        assert switch.name == "gw7-s1"
+        with open(manifest.path) as mfile:
+            entries = [json.loads(line) for line in mfile]
+        assert entries[-1]["kind"] == "bridge"
+        assert entries[-1]["name"] == "gw7-s1"
+    finally:
+        if worker is None:
+            del os.environ["PYTEST_XDIST_WORKER"]
+        else:
+            os.environ["PYTEST_XDIST_WORKER"] = worker
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
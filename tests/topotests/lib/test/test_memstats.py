@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+#
+# test_memstats.py
+# Tests for the show memory parser.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the show memory parser.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.memstats import parse_show_memory, parse_size, diff, top_growth, format_diff
+
+OUTPUT = """Memory statistics for zebra:
+System allocator statistics:
+  Total heap allocated:  12 MiB
+  Holding block headers: 0 bytes
+  Used small blocks:     0 bytes
+  Used ordinary blocks:  200 KiB
+  Free small blocks:     1 byte
+  Free ordinary blocks:  > 2GB
+  Ordinary blocks:       5
+  Small blocks:          0
+  Holding blocks:        0
+(see system documentation for 'mallinfo' for meaning)
+--- qmem libfrr ---
+Type                          : Current#   Size       Total     Max#  MaxBytes
+Buffer                        :        3        24        72        4        96
+Host config                   :        4 variable       112        4       112
+Work queue                    :        2                 64        2        64
+--- qmem zebra ---
+Type                          : Current#   Size       Total     Max#  MaxBytes
+Route Entry                   :      100        80      8000      120      9600
+
+Memory statistics for bgpd:
+System allocator statistics:
+  Total heap allocated:  4 MiB
+--- qmem bgpd ---
+Type                          : Current#   Size     Max#
+BGP route                     :       10        88       12
+BGP attribute                 :        7 variable       9
+BGP path info                 :        1                 1
+"""
+
+
+def test_parse_size():
+    "Test the sizes printed by show memory."
+    assert parse_size("0 bytes") == 0
+    assert parse_size("1 byte") == 1
+    assert parse_size("200 KiB") == 200 * 1024
+    assert parse_size("12 MiB") == 12 * 1024 * 1024
+    assert parse_size("> 2GB") is None
+
+
+def test_parse_show_memory():
+    "Test all daemons, groups and memory types are parsed."
+    stats = parse_show_memory(OUTPUT)
+    assert sorted(stats) == ["bgpd", "zebra"]
+
+    zebra = stats["zebra"]
+    assert zebra["allocator"]["Total heap allocated"] == 12 << 20
+    assert zebra["allocator"]["Free ordinary blocks"] is None
+    assert zebra["allocator"]["Ordinary blocks"] == 5
+    assert sorted(zebra["groups"]) == ["libfrr", "zebra"]
+    assert zebra["groups"]["libfrr"]["Buffer"] == {
+        "count": 3,
+        "size": 24,
+        "total": 72,
+        "max_count": 4,
+        "max_total": 96,
+    }
+    assert zebra["groups"]["libfrr"]["Host config"]["size"] == "variable"
+    assert zebra["groups"]["libfrr"]["Work queue"]["size"] is None
+    assert zebra["groups"]["libfrr"]["Work queue"]["total"] == 64
+    assert zebra["groups"]["zebra"]["Route Entry"]["count"] == 100
+
+    # Without the totals (no malloc_usable_size())
+    bgpd = stats["bgpd"]["groups"]["bgpd"]
+    assert bgpd["BGP route"] == {
+        "count": 10,
+        "size": 88,
+        "total": 880,
+        "max_count": 12,
+    }
+    assert bgpd["BGP attribute"]["total"] is None
+    assert bgpd["BGP path info"]["max_count"] == 1
+
+    # Single daemon output (vtysh -d)
+    single = parse_show_memory(OUTPUT.split("\n", 1)[1], daemon="ospfd")
+    assert "ospfd" in single
+
+
+def test_diff():
+    "Test the memory types that grew are found."
+    before = parse_show_memory(OUTPUT)
+    after = parse_show_memory(
+        OUTPUT.replace("12 MiB", "13 MiB")
+        .replace("100        80      8000", "150        80     12000")
+        .replace("10        88       12", "20        88       20")
+    )
+    delta = diff(before, after)
+    assert delta["zebra"]["allocator"]["Total heap allocated"] == 1 << 20
+    assert delta["zebra"]["mtypes"] == {
+        ("zebra", "Route Entry"): {"count": 50, "bytes": 4000}
+    }
+    assert delta["bgpd"]["mtypes"] == {
+        ("bgpd", "BGP route"): {"count": 10, "bytes": 880}
+    }
+    assert top_growth(delta["zebra"]) == [("zebra", "Route Entry", 4000, 50)]
+
+    text = format_diff(delta, units=50, unit_name="route")
+    assert "80.0 bytes/route" in text
+    assert "zebra: Route Entry" in text
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
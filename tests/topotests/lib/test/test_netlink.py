@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+#
+# test_netlink.py
+# Tests for the rtnetlink message decoding functions.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the rtnetlink message decoding functions.
+"""
+
+import os
+import sys
+import socket
+import struct
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import netlink
+
+
+def rtattr(atype, value):
+    "Builds a padded rtattr."
+    data = struct.pack("=HH", 4 + len(value), atype) + value
+    return data + b"\0" * (-len(data) % 4)
+
+
+def test_parse_link_vrf_table():
+    "Test decoding the table of a VRF device"
+
+    header = netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 5, 0, 0)
+    info_data = rtattr(netlink.IFLA_VRF_TABLE, struct.pack("=I", 1001))
+    payload = (
+        header
+        + rtattr(netlink.IFLA_IFNAME, b"vrf1\0")
+        + rtattr(
+            netlink.IFLA_LINKINFO,
+            rtattr(netlink.IFLA_INFO_KIND, b"vrf\0")
+            + rtattr(netlink.IFLA_INFO_DATA, info_data),
+        )
+    )
+    assert netlink.parse_link(payload)[:2] == (5, "vrf1")
+    assert netlink.parse_link_vrf_table(payload) == 1001
+
+    bridge = header + rtattr(
+        netlink.IFLA_LINKINFO, rtattr(netlink.IFLA_INFO_KIND, b"bridge\0")
+    )
+    assert netlink.parse_link_vrf_table(bridge) is None
+    assert netlink.parse_link_vrf_table(header) is None
+
+
+def test_parse_route():
+    "Test decoding a RTM_NEWROUTE message"
+
+    payload = (
+        netlink.RTMSG.pack(socket.AF_INET, 24, 0, 0, 254, 188, 0, 1, 0)
+        + rtattr(netlink.RTA_TABLE, struct.pack("=I", 254))
+        + rtattr(netlink.RTA_DST, socket.inet_pton(socket.AF_INET, "10.0.1.0"))
+        + rtattr(netlink.RTA_PRIORITY, struct.pack("=I", 20))
+        + rtattr(netlink.RTA_GATEWAY, socket.inet_pton(socket.AF_INET, "10.0.0.2"))
+        + rtattr(netlink.RTA_OIF, struct.pack("=I", 3))
+    )
+    route = netlink.parse_route(payload)
+    assert route["dst_len"] == 24
+    assert netlink.attr_addr(socket.AF_INET, route["dst"]) == "10.0.1.0"
+    assert netlink.attr_addr(socket.AF_INET, route["gateway"]) == "10.0.0.2"
+    assert route["table"] == 254
+    assert route["protocol"] == 188
+    assert route["priority"] == 20
+    assert route["oif"] == 3
+    assert route["multipath"] is None
+
+
+def test_parse_route_multipath():
+    "Test decoding a multipath route"
+
+    nexthops = b""
+    for ifindex, gateway in [(2, "10.0.0.2"), (3, "10.0.1.2")]:
+        attrs = rtattr(netlink.RTA_GATEWAY, socket.inet_pton(socket.AF_INET, gateway))
+        nexthops += netlink.RTNEXTHOP.pack(8 + len(attrs), 0, 0, ifindex) + attrs
+
+    payload = netlink.RTMSG.pack(socket.AF_INET, 0, 0, 0, 254, 186, 0, 1, 0) + rtattr(
+        netlink.RTA_MULTIPATH, nexthops
+    )
+    route = netlink.parse_route(payload)
+    assert route["dst"] is None
+    assert [nh["oif"] for nh in route["multipath"]] == [2, 3]
+    assert [
+        netlink.attr_addr(socket.AF_INET, nh["gateway"]) for nh in route["multipath"]
+    ] == ["10.0.0.2", "10.0.1.2"]
+    assert route["multipath"][0]["weight"] == 1
+
+
+def test_parse_rule():
+    "Test decoding a RTM_NEWRULE message"
+
+    payload = (
+        netlink.FIBRULEHDR.pack(socket.AF_INET, 24, 16, 0, 0, 0, 0, 1, 0)
+        + rtattr(netlink.FRA_PRIORITY, struct.pack("=I", 304))
+        + rtattr(netlink.FRA_SRC, socket.inet_pton(socket.AF_INET, "1.2.0.0"))
+        + rtattr(netlink.FRA_DST, socket.inet_pton(socket.AF_INET, "3.4.5.0"))
+        + rtattr(netlink.FRA_IIFNAME, b"r1-eth2\0")
+        + rtattr(netlink.FRA_TABLE, struct.pack("=I", 10000))
+        + rtattr(netlink.FRA_PROTOCOL, b"\x0b")
+    )
+    rule = netlink.parse_rule(payload)
+    assert rule["priority"] == 304
+    assert rule["src_len"] == 16
+    assert netlink.attr_addr(socket.AF_INET, rule["src"]) == "1.2.0.0"
+    assert rule["iifname"] == "r1-eth2"
+    assert rule["table"] == 10000
+    assert rule["protocol"] == 11
+    assert rule["fwmark"] is None
+
+
+def test_prefix_pack():
+    "Test prefix string conversion"
+
+    assert netlink.prefix_pack("10.0.1.0/24") == (
+        socket.AF_INET,
+        socket.inet_pton(socket.AF_INET, "10.0.1.0"),
+        24,
+    )
+    assert netlink.prefix_pack("2001:db8::1")[2] == 128
+    assert netlink.table_number(None) == 254
+    assert netlink.table_number("all") == 0
+    assert netlink.table_number("10000") == 10000
+
+
+def _monitor(prefixes=None, all_prefixes=False):
+    monitor = netlink.RtnlMonitor.__new__(netlink.RtnlMonitor)
+    monitor.routes, monitor.counts, monitor.links, monitor.rules = {}, {}, {}, set()
+    monitor.watched = set(netlink.route_key(prefix) for prefix in prefixes or [])
+    monitor.all_prefixes = all_prefixes
+    return monitor
+
+
+def _route(prefix, protocol):
+    _, address, plen = netlink.prefix_pack(prefix)
+    payload = netlink.RTMSG.pack(socket.AF_INET, plen, 0, 0, 254, protocol, 0, 1, 0)
+    # The kernel sends no destination for default routes
+    if plen:
+        payload += rtattr(netlink.RTA_DST, address)
+    return payload
+
+
+def test_monitor_apply():
+    "Test the incremental route counters of the monitor"
+
+    monitor = _monitor()
+    for i in range(10):
+        monitor._apply(netlink.RTM_NEWROUTE, 0, _route("10.0.{}.0/24".format(i), 194))
+    assert monitor.route_count(protocol=194) == 10
+    # Only the counters are kept
+    assert monitor.routes == {}
+    with pytest.raises(ValueError):
+        monitor.route_present("10.0.1.0/24")
+
+    # Replaced, then removed
+    monitor._apply(
+        netlink.RTM_NEWROUTE, netlink.NLM_F_REPLACE, _route("10.0.1.0/24", 194)
+    )
+    assert monitor.route_count(socket.AF_INET) == 10
+    monitor._apply(netlink.RTM_DELROUTE, 0, _route("10.0.1.0/24", 194))
+    assert monitor.route_count() == 9
+    assert monitor.route_count(table=100) == 0
+
+
+def test_monitor_apply_watched():
+    "Test the routes of the watched prefixes are tracked"
+
+    monitor = _monitor(prefixes=["10.0.1.0/24"])
+    for i in range(10):
+        monitor._apply(netlink.RTM_NEWROUTE, 0, _route("10.0.{}.0/24".format(i), 194))
+    assert list(monitor.routes.values()) == [194]
+    assert monitor.route_present("10.0.1.0/24")
+
+    # Replaced by another protocol, then removed
+    monitor._apply(
+        netlink.RTM_NEWROUTE, netlink.NLM_F_REPLACE, _route("10.0.1.0/24", 11)
+    )
+    assert monitor.route_count(protocol=194) == 9
+    assert monitor.route_count(socket.AF_INET) == 10
+    monitor._apply(netlink.RTM_DELROUTE, 0, _route("10.0.1.0/24", 11))
+    assert monitor.route_count() == 9
+    assert not monitor.route_present("10.0.1.0/24")
+
+    monitor = _monitor(all_prefixes=True)
+    monitor._apply(netlink.RTM_NEWROUTE, 0, _route("0.0.0.0/0", 186))
+    assert monitor.route_present("0.0.0.0/0")
+    assert not monitor.route_present("10.0.1.0/24")
+
+
+def test_monitor_resync():
+    "Test lost notifications reload the state from the top level"
+
+    with netlink.RtnlMonitor(links=True, routes=False, rules=False) as monitor:
+        assert monitor.links
+        monitor.lost = True
+        monitor.links.clear()
+        assert monitor.wait(lambda mon: mon.links, 1)
+        assert not monitor.lost
+        assert monitor.links
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
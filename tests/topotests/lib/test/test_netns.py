@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#
+# test_netns.py
+# Tests for the netns topology backend.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the netns topology backend.
+"""
+
+import os
+import sys
+import subprocess
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.netns import Network, ip_batch, ip_batch_wait
+from lib.probecache import which
+
+
+def test_ip_batch():
+    "Test running ip commands in one batch"
+
+    ip_batch_wait(ip_batch(["link show lo", "addr show dev lo"]), "lo")
+
+    with pytest.raises(Exception) as error:
+        ip_batch_wait(ip_batch(["link show lo", "link show nonexistent0"]), "x")
+    assert "x: ip -batch failed" in str(error.value)
+
+
+def test_network_build():
+    "Test building and tearing down a topology with the netns backend"
+
+    # Nodes are mininet shells in their own namespaces
+    if os.geteuid() != 0 or which("mnexec") is None:
+        pytest.skip("requires root and mininet")
+
+    from mininet.topo import Topo
+
+    topo = Topo()
+    topo.addHost("h1")
+    topo.addHost("h2")
+    topo.addSwitch("s1")
+    topo.addLink("h1", "s1")
+    topo.addLink("h2", "s1")
+    topo.addLink("h1", "h2", intfName1="h1-h2", intfName2="h2-h1")
+
+    net = Network(topo)
+    try:
+        assert sorted(net.keys()) == ["h1", "h2", "s1"]
+        assert net["s1"] in net.switches
+        assert sorted(net["h1"].intfNames()) == ["h1-eth0", "h1-h2"]
+
+        # Links are up and the switch ports are attached to the bridge
+        output = net["h1"].cmd("ip -o link show h1-h2")
+        assert "state UP" in output
+        output = net["s1"].cmd("ip -o link show master s1")
+        assert "s1-eth1" in output and "s1-eth2" in output
+
+        # Nothing was created in the host namespace
+        output = subprocess.check_output(["ip", "-o", "link", "show"])
+        assert "h1-h2" not in output.decode("utf-8")
+    finally:
+        net.stop()
+
+    for node in net.values():
+        node.shell.wait()
+        assert not os.path.exists("/proc/{}".format(node.pid))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
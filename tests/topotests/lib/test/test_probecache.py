@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+#
+# test_probecache.py
+# Tests for the environment probe cache.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the environment probe cache.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import probecache
+from lib import topotest
+from lib.topotest import daemon_version
+
+
+def _with_cache(test):
+    "Runs `test(directory)` with a cache file in a temporary directory."
+    directory = tempfile.mkdtemp()
+    saved = os.environ.get("TOPOTESTS_PROBE_CACHE")
+    os.environ["TOPOTESTS_PROBE_CACHE"] = os.path.join(directory, "cache.json")
+    probecache.clear()
+    try:
+        test(directory)
+    finally:
+        probecache.clear()
+        if saved is None:
+            del os.environ["TOPOTESTS_PROBE_CACHE"]
+        else:
+            os.environ["TOPOTESTS_PROBE_CACHE"] = saved
+        shutil.rmtree(directory)
+
+
+def test_cached():
+    "Test caching results in memory and on disk"
+
+    def _test(directory):
+        calls = []
+
+        def _probe():
+            calls.append(1)
+            return {"value": len(calls)}
+
+        assert probecache.cached("probe", [1], _probe) == {"value": 1}
+        assert probecache.cached("probe", [1], _probe) == {"value": 1}
+        assert len(calls) == 1
+
+        # Another process: only the file is left
+        probecache._memory.clear()
+        assert probecache.cached("probe", [1], _probe) == {"value": 1}
+        assert len(calls) == 1
+
+        # Different stamps
+        assert probecache.cached("probe", [2], _probe) == {"value": 2}
+        assert len(calls) == 2
+
+        # Results not kept are computed every time
+        assert probecache.cached("other", [], _probe, keep=lambda r: False) == {
+            "value": 3
+        }
+        assert probecache.cached("other", [], _probe, keep=lambda r: False) == {
+            "value": 4
+        }
+
+    _with_cache(_test)
+
+
+def test_daemon_version():
+    "Test the daemon version is probed again when the binary changes"
+
+    def _test(directory):
+        daemon = os.path.join(directory, "bgpd")
+
+        def _write(version):
+            with open(daemon, "w") as script:
+                script.write("#!/bin/sh\necho 'bgpd version {}'\n".format(version))
+            os.chmod(daemon, 0o755)
+
+        _write("7.3")
+        assert daemon_version(daemon) == "7.3"
+        _write("7.4-dev")
+        os.utime(daemon, (time.time() + 10, time.time() + 10))
+        assert daemon_version(daemon) == "7.4-dev"
+
+        assert daemon_version(os.path.join(directory, "nonexistent")) is None
+
+    _with_cache(_test)
+
+
+def test_module_present():
+    "Test the module probe is done again when the modules change"
+
+    def _test(directory):
+        state = {"loaded": False, "present": False, "probes": 0}
+
+        def _present(module, load):
+            state["probes"] += 1
+            return state["present"]
+
+        modules_dep = os.path.join(directory, "modules.dep")
+        with open(modules_dep, "w") as dep:
+            dep.write("")
+        saved = (
+            topotest.MODULES_DEP,
+            topotest.module_loaded_linux,
+            topotest.module_present_linux,
+        )
+        topotest.MODULES_DEP = modules_dep
+        topotest.module_loaded_linux = lambda module: state["loaded"]
+        topotest.module_present_linux = _present
+        try:
+            assert topotest.module_present("mpls-router") is False
+            assert topotest.module_present("mpls-router") is False
+            assert state["probes"] == 1
+
+            # The module was installed
+            state["present"] = True
+            with open(modules_dep, "w") as dep:
+                dep.write("mpls_router.ko:\n")
+            assert topotest.module_present("mpls-router") is True
+            assert state["probes"] == 2
+
+            # Loaded: not probed
+            state["loaded"] = True
+            assert topotest.module_present("mpls-router") is True
+            assert state["probes"] == 2
+
+            # Removed (rmmod): loaded again
+            state["loaded"] = False
+            assert topotest.module_present("mpls-router") is True
+            assert state["probes"] == 3
+
+            # Without loading it, the result is kept
+            assert topotest.module_present("mpls-router", load=False) is True
+            assert topotest.module_present("mpls-router", load=False) is True
+            assert state["probes"] == 4
+        finally:
+            (
+                topotest.MODULES_DEP,
+                topotest.module_loaded_linux,
+                topotest.module_present_linux,
+            ) = saved
+
+    _with_cache(_test)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
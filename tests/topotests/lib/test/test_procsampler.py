@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+#
+# test_procsampler.py
+# Tests for the daemon resource usage sampler.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the daemon resource usage sampler.
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.procsampler import ProcSampler, read_process, interval_report
+
+
+class FakeNode(object):
+    def __init__(self, pids):
+        self.pids = pids
+
+    def readDaemonPidfiles(self):
+        return self.pids
+
+    def getDaemonPids(self):
+        raise AssertionError("the sampler must not use the router shell")
+
+
+class FakeNet(object):
+    def __init__(self, nodes):
+        self.nameToNode = nodes
+
+
+class FakeTopogen(object):
+    def __init__(self, nodes):
+        self.net = FakeNet(nodes)
+
+    def routers(self):
+        return dict(self.net.nameToNode)
+
+
+def test_read_process():
+    "Test the resource usage of this process is read."
+    values = read_process(os.getpid())
+    assert values["rss_kb"] > 0
+    assert values["hwm_kb"] >= values["rss_kb"]
+    assert values["cpu_s"] >= 0
+    assert values["threads"] >= 1
+    assert values["fds"] >= 3
+
+    # Process gone
+    assert read_process(0) is None
+
+
+def test_interval_report():
+    "Test the growth between annotations, restarted daemons are skipped."
+    boundaries = [
+        (10.0, "a", {("r1", "bgpd"): {"pid": 1, "rss_kb": 100, "cpu_s": 1.0}}),
+        (
+            12.0,
+            "b",
+            {
+                ("r1", "bgpd"): {"pid": 1, "rss_kb": 150, "cpu_s": 1.5},
+                ("r1", "zebra"): {"pid": 2, "rss_kb": 10, "cpu_s": 0.1},
+            },
+        ),
+        (15.0, "c", {("r1", "bgpd"): {"pid": 3, "rss_kb": 90, "cpu_s": 0.1}}),
+    ]
+    intervals = interval_report(boundaries)
+    assert intervals == [
+        {
+            "label": "a",
+            "time": 2.0,
+            "daemons": {"r1/bgpd": {"rss_growth_kb": 50, "cpu_s": 0.5}},
+        },
+        {"label": "b", "time": 3.0, "daemons": {}},
+    ]
+
+
+def test_sampler():
+    "Test the samples and annotations are written and reported."
+    directory = tempfile.mkdtemp()
+    try:
+        # r2 pidfiles can't be read without its shell: it is skipped
+        tgen = FakeTopogen(
+            {"r1": FakeNode({"zebra": os.getpid(), "bgpd": 0}), "r2": FakeNode(None)}
+        )
+        sampler = ProcSampler(tgen, os.path.join(directory, "samples.csv"), 0.01)
+        sampler.start()
+        sampler.sample("test_one")
+        sampler.stop()
+
+        with open(sampler.path) as samples:
+            lines = samples.read().splitlines()
+        assert lines[0].startswith("kind,time,router,daemon")
+        assert lines[1].startswith("S,")
+        assert ",r1,zebra,{},".format(os.getpid()) in lines[1]
+        assert "A," in lines[-1] and lines[-1].endswith(',"<stop>"')
+        assert len([line for line in lines if line.endswith(',"test_one"')]) == 1
+
+        report = sampler.report()
+        # bgpd has no process
+        assert list(report["daemons"]) == ["r1/zebra"]
+        assert report["daemons"]["r1/zebra"]["peak_rss_kb"] > 0
+        assert report["daemons"]["r1/zebra"]["restarts"] == 0
+        assert [entry["label"] for entry in report["intervals"]] == ["test_one"]
+        assert "r1/zebra" in report["intervals"][0]["daemons"]
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+#
+# test_reports.py
+# Tests for the instrumentation report helpers.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the instrumentation report helpers.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.reports import toggle, write_json_report
+
+
+def test_toggle():
+    "Test the on/off switch of an instrumentation module"
+
+    enabled, enable = toggle()
+    other_enabled, _ = toggle()
+    assert enabled() is False
+    enable()
+    assert enabled() is True
+    assert other_enabled() is False
+    enable(False)
+    assert enabled() is False
+
+
+def test_write_json_report():
+    "Test writing a report and its text version"
+
+    directory = tempfile.mkdtemp()
+    try:
+        subdir = os.path.join(directory, "module")
+        path = write_json_report(subdir, "report", {"a": [1]}, "a: 1\n")
+        assert path == os.path.join(subdir, "report.json")
+        with open(path) as report:
+            assert json.load(report) == {"a": [1]}
+        with open(os.path.join(subdir, "report.txt")) as report:
+            assert report.read() == "a: 1\n"
+
+        # Errors are not raised
+        blocker = os.path.join(directory, "file")
+        open(blocker, "w").close()
+        assert write_json_report(blocker, "report", {}) is None
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+#
+# test_ribfib.py
+# Tests for the RIB versus FIB comparison functions.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the RIB versus FIB comparison functions.
+"""
+
+import os
+import sys
+import socket
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.ribfib import RouteTable, table_diff, json_top_members, zebra_nexthops
+from lib.ribfib import protocol_number, _zebra_installed
+
+
+def test_route_table_sort():
+    "Test the chunked route table sorting"
+
+    table = RouteTable(socket.AF_INET, chunk=3)
+    prefixes = ["10.0.{}.0/24".format(i) for i in range(10, 0, -1)]
+    prefixes += ["10.0.0.0/16", "1.1.1.1/32"]
+    for prefix in prefixes:
+        table.add_prefix(prefix, [("192.168.0.1", "r1-eth0")])
+    table.finish()
+
+    assert len(table) == len(prefixes)
+    result = [table.prefix(table.key(i)) for i in range(len(table))]
+    assert result[:3] == ["1.1.1.1/32", "10.0.0.0/16", "10.0.1.0/24"]
+    assert result[-1] == "10.0.10.0/24"
+
+
+def test_table_diff():
+    "Test the missing/extra/mismatch detection"
+
+    rib = RouteTable(socket.AF_INET6)
+    fib = RouteTable(socket.AF_INET6)
+    rib.add_prefix("2001:db8:1::/64", [("fe80::1", "r1-eth0"), ("fe80::2", "r1-eth1")])
+    fib.add_prefix("2001:db8:1::/64", [("fe80::2", "r1-eth1"), ("fe80::1", "r1-eth0")])
+    rib.add_prefix("2001:db8:2::/64", [("fe80::1", "r1-eth0")])
+    fib.add_prefix("2001:db8:2::/64", [("fe80::3", "r1-eth0")])
+    rib.add_prefix("2001:db8:3::/64", [("", "r1-eth2")])
+    fib.add_prefix("2001:db8:4::/64", [("blackhole", "")])
+    rib.finish()
+    fib.finish()
+
+    result = [(kind, rib.prefix(key)) for kind, key in table_diff(rib, fib)]
+    assert result == [
+        ("mismatch", "2001:db8:2::/64"),
+        ("missing", "2001:db8:3::/64"),
+        ("extra", "2001:db8:4::/64"),
+    ]
+
+
+def test_route_table_duplicates():
+    "Test the routes of a prefix are collapsed to the lowest rank one"
+
+    rib = RouteTable(socket.AF_INET)
+    fib = RouteTable(socket.AF_INET, chunk=2)
+    rib.add_prefix("10.0.1.0/24", [("10.0.0.2", "r1-eth0")])
+    fib.add_prefix("10.0.1.0/24", [("10.0.0.3", "r1-eth1")], rank=1024)
+    fib.add_prefix("10.0.2.0/24", [("10.0.0.2", "r1-eth0")])
+    fib.add_prefix("10.0.1.0/24", [("10.0.0.2", "r1-eth0")], rank=20)
+    rib.finish()
+    fib.finish()
+
+    assert len(fib) == 2
+    assert fib.duplicates == 1
+    result = [(kind, rib.prefix(key)) for kind, key in table_diff(rib, fib)]
+    assert result == [("extra", "10.0.2.0/24")]
+
+
+def test_protocol_number():
+    "Test the route protocol names"
+
+    assert protocol_number("sharp") == 194
+    assert protocol_number("ospf6") == 188
+    assert protocol_number("babel") == 42
+    assert protocol_number("openfabric") == 197
+    assert protocol_number("srte") == 198
+    assert protocol_number("nhg") == 11
+    assert protocol_number("11") == 11
+    for protocol in ["connected", "kernel", "foo"]:
+        with pytest.raises(ValueError):
+            protocol_number(protocol)
+
+
+def test_zebra_installed():
+    "Test the kernel protocols of the routes installed by zebra"
+
+    for protocol in [11, 42, 186, 194, 196, 197, 198]:
+        assert _zebra_installed(protocol)
+    # Kernel, boot, static (by ip route) and dhcp routes
+    for protocol in [2, 3, 4, 16]:
+        assert not _zebra_installed(protocol)
+
+
+def test_json_top_members():
+    "Test decoding a vtysh JSON output one prefix at a time"
+
+    output = """{
+  "10.0.1.0/24":[
+    {
+      "prefix":"10.0.1.0/24",
+      "protocol":"sharp",
+      "installed":true,
+      "nexthops":[
+        {
+          "fib":true,
+          "ip":"10.0.0.2",
+          "interfaceName":"r1-eth0"
+        },
+        {
+          "ip":"10.0.0.3",
+          "interfaceName":"r1-eth0"
+        }
+      ]
+    }
+  ],
+  "10.0.2.0/24":[
+    {
+      "prefix":"10.0.2.0/24",
+      "nexthops":[
+        {
+          "fib":true,
+          "unreachable":true,
+          "blackhole":true
+        }
+      ]
+    }
+  ]
+}
+"""
+    members = list(json_top_members(output.splitlines(True)))
+    assert [key for key, _ in members] == ["10.0.1.0/24", "10.0.2.0/24"]
+    assert zebra_nexthops(members[0][1][0]) == [("10.0.0.2", "r1-eth0")]
+    assert zebra_nexthops(members[1][1][0]) == [("blackhole", "")]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
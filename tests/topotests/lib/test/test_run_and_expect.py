@@ -35,7 +35,7 @@ CWD = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(CWD, "../../"))
 
 # pylint: disable=C0413
-from lib.topotest import run_and_expect_type
+from lib.topotest import run_and_expect_type, run_and_expect_multi
 
 
 def test_run_and_expect_type():
@@ -75,5 +75,60 @@ def test_run_and_expect_type():
     assert value is True
 
 
+def test_run_and_expect_multi():
+    "Test basic `run_and_expect_multi` functionality."
+
+    calls = {"slow": 0}
+
+    def return_none():
+        "Test function that returns `None`."
+        return None
+
+    def return_none_later():
+        "Test function that returns `None` on the third call."
+        calls["slow"] += 1
+        if calls["slow"] < 3:
+            return "not yet"
+        return None
+
+    # Test success of all conditions.
+    success, report = run_and_expect_multi(
+        {"fast": return_none, "slow": return_none_later}, None, timeout=5, wait=0
+    )
+    assert success is True
+    assert report["fast"]["success"] is True
+    assert report["slow"]["success"] is True
+    assert report["fast"]["time"] <= report["slow"]["time"]
+    # Satisfied conditions are not polled again.
+    assert calls["slow"] == 3
+
+    # Test partial failure.
+    success, report = run_and_expect_multi(
+        [("fast", return_none), ("never", lambda: "never")],
+        None,
+        timeout=0.1,
+        wait=0.01,
+    )
+    assert success is False
+    assert report["fast"]["success"] is True
+    assert report["never"]["success"] is False
+    assert report["never"]["time"] is None
+    assert report["never"]["result"] == "never"
+
+    # Test a zero interval still backs off.
+    calls["never"] = 0
+
+    def return_never():
+        "Test function that never returns `None`."
+        calls["never"] += 1
+        return "never"
+
+    success, report = run_and_expect_multi(
+        {"never": return_never}, None, timeout=0.5, wait=0
+    )
+    assert success is False
+    assert calls["never"] <= 5
+
+
 if __name__ == "__main__":
     sys.exit(pytest.main())
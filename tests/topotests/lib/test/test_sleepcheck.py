@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+#
+# test_sleepcheck.py
+# Tests for the wasted sleep detector.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the wasted sleep detector.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import sleepcheck
+from lib.topotest import run_and_expect
+from lib import topotest
+from lib.common_config import retry
+
+
+def _wait_loop(state, times):
+    "A test sleeping before checking a condition that is already true."
+    for _ in range(times):
+        topotest.sleep(0.01)
+        success, _ = run_and_expect(lambda: state["ok"], True, count=3, wait=0.01)
+        assert success
+
+
+def _slow_condition():
+    "A test sleeping for a condition that needs more than one check."
+    calls = []
+    time.sleep(0.01)
+    run_and_expect(lambda: calls.append(1) or len(calls) > 1, True, count=3, wait=0.01)
+
+
+@retry(attempts=2, wait=0.01, initial_wait=0.01)
+def _retried(state):
+    "A `retry` helper with an initial wait, for a condition already true."
+    if state.get("fail"):
+        return "failed"
+    return True
+
+
+def test_sleep_report():
+    "Test the sleep call sites, estimated and sampled waste"
+
+    directory = tempfile.mkdtemp()
+    sleepcheck.reset()
+    sleepcheck.enable(sample=True)
+    try:
+        assert time.sleep is sleepcheck.sleep
+        _wait_loop({"ok": True}, 3)
+        _slow_condition()
+
+        data = sleepcheck.report()
+        sites = dict(
+            (entry["site"].rsplit(":", 1)[1], entry) for entry in data["sites"]
+        )
+        loop = sites["_wait_loop"]
+        assert loop["calls"] == 3
+        assert loop["followed"] == 3
+        assert loop["satisfied"] == 3
+        # The first sleep can't be sampled: the check is not known yet
+        assert loop["sampled"] == 2
+        assert loop["wasted"] == 2
+        assert data["sites"][0]["site"] == loop["site"]
+
+        slow = sites["_slow_condition"]
+        assert slow["satisfied"] == 0 and slow["estimate"] == 0
+
+        # run_and_expect() sleep only counted as polling
+        assert [site for site in data["poll"] if "run_and_expect" in site]
+
+        path = sleepcheck.write_report(directory)
+        assert os.path.isfile(path)
+        with open(os.path.join(directory, "sleep_report.txt")) as output:
+            assert "_wait_loop" in output.read()
+    finally:
+        sleepcheck.enable(False)
+        sleepcheck.reset()
+        shutil.rmtree(directory)
+    assert time.sleep is not sleepcheck.sleep
+
+
+def test_retry_initial_wait():
+    "Test the `retry` initial_wait recorded as a call site"
+
+    sleepcheck.reset()
+    sleepcheck.enable()
+    try:
+        assert _retried({}) is True
+        data = sleepcheck.report()
+        sites = dict(
+            (entry["site"].rsplit(":", 1)[1], entry) for entry in data["sites"]
+        )
+        initial = sites["_retried (initial wait)"]
+        assert initial["calls"] == 1
+        assert initial["followed"] == 1 and initial["satisfied"] == 1
+        assert not [site for site in data["poll"] if "_retried" in site]
+
+        # A wait without expected result forgets the initial wait
+        assert _retried({"fail": True}, expected=False) == "failed"
+        assert sleepcheck._local.pending is None
+        assert sleepcheck.report()["sites"][0]["followed"] == 1
+    finally:
+        sleepcheck.enable(False)
+        sleepcheck.reset()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+#
+# test_telemetry.py
+# Tests for the performance telemetry.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the performance telemetry.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import telemetry
+from lib.topotest import run_and_expect, sleep
+
+
+def test_telemetry_report():
+    "Test the telemetry collection and report"
+
+    directory = tempfile.mkdtemp()
+    telemetry.enable()
+    try:
+        telemetry.begin("test_module", "test_one", "setup")
+        telemetry.record_vtysh("r1", "show version", 0.5, 100)
+        telemetry.record_vtysh("r2", "show version", 0.25, 300)
+
+        telemetry.begin("test_module", "test_one", "call")
+        sleep(0.01)
+        calls = []
+
+        def _converged():
+            calls.append(1)
+            return len(calls) >= 3
+
+        success, _ = run_and_expect(_converged, True, count=5, wait=0.01)
+        assert success
+        run_and_expect(lambda: False, True, count=2, wait=0.01)
+
+        report = telemetry.module_report()
+        assert report["module"] == "test_module"
+        setup = report["tests"]["test_one"]["setup"]
+        assert setup["vtysh"]["calls"] == 2
+        assert setup["vtysh"]["bytes"] == 400
+        assert setup["vtysh"]["max_time"] == 0.5
+
+        call = report["tests"]["test_one"]["call"]
+        assert call["sleep"]["calls"] == 1
+        waits = call["waits"]
+        assert [w["success"] for w in waits] == [True, False]
+        assert waits[0]["checks"] == 3
+        assert waits[0]["name"] == "_converged"
+        assert waits[0]["sleep_time"] >= 0.02
+        assert call["summary"]["wait_failures"] == 1
+
+        assert report["total"]["vtysh"]["calls"] == 2
+        assert report["total"]["summary"]["waits"] == 2
+
+        # A new module starts from scratch
+        path = telemetry.write_report(directory)
+        with open(path) as output:
+            assert json.load(output)["module"] == "test_module"
+        telemetry.begin("other_module", "test_two", "call")
+        assert telemetry.module_report()["tests"] == {}
+    finally:
+        telemetry.enable(False)
+        shutil.rmtree(directory)
+
+
+def test_telemetry_disabled():
+    "Test nothing is collected when disabled"
+
+    telemetry.begin("test_module2", "test_one", "call")
+    telemetry.record_vtysh("r1", "show version", 0.5, 100)
+    assert telemetry.module_report()["tests"] == {}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+#
+# test_threadcpu.py
+# Tests for the show thread cpu parser.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the show thread cpu parser.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.threadcpu import parse_thread_cpu, diff
+
+OUTPUT = """Thread statistics for zebra:
+
+Showing statistics for pthread main
+-----------------------------------
+                      CPU (user+system): Real (wall-clock):
+Active   Runtime(ms)   Invoked Avg uSec Max uSecs Avg uSec Max uSecs  Type  Thread
+    0         2.500        10      250      900       300     1000 R      zserv_read
+    1        10.000       100      100      500       200      800   T   rib_process
+    0         1.000         4      250      300       250      300 R      zserv_read
+
+Showing statistics for pthread Zebra API server thread
+------------------------------------------------------
+                      CPU (user+system): Real (wall-clock):
+Active   Runtime(ms)   Invoked Avg uSec Max uSecs Avg uSec Max uSecs  Type  Thread
+No data to display yet.
+
+Total thread statistics
+-------------------------
+                      CPU (user+system): Real (wall-clock):
+Active   Runtime(ms)   Invoked Avg uSec Max uSecs Avg uSec Max uSecs  Type  Thread
+    1        13.500       114      118      900       205     1000 RT    TOTAL
+
+Thread statistics for bgpd:
+
+Showing statistics for pthread BGP I/O thread
+---------------------------------------------
+                      CPU (user+system): Real (wall-clock):
+Active   Runtime(ms)   Invoked Avg uSec Max uSecs Avg uSec Max uSecs  Type  Thread
+          0.300         3      100      120       110      130 RW     bgp_process_reads
+"""
+
+
+def test_parse_thread_cpu():
+    "Test the rows are parsed by daemon, pthread and handler."
+    rows = parse_thread_cpu(OUTPUT)
+    assert sorted(rows) == [
+        ("bgpd", "BGP I/O thread", "bgp_process_reads"),
+        ("zebra", "main", "rib_process"),
+        ("zebra", "main", "zserv_read"),
+    ]
+
+    # Handlers with the same name are added up
+    read = rows[("zebra", "main", "zserv_read")]
+    assert read["runtime"] == 3.5
+    assert read["calls"] == 14
+    assert read["real"] == 4.0
+    assert read["max_cpu"] == 900
+    assert read["types"] == "R"
+
+    # Output without the `Active` column
+    bgp = rows[("bgpd", "BGP I/O thread", "bgp_process_reads")]
+    assert bgp["calls"] == 3
+    assert bgp["types"] == "RW"
+
+    assert (
+        parse_thread_cpu(OUTPUT.split("\n", 2)[2], daemon="ospfd")[
+            ("ospfd", "main", "rib_process")
+        ]["calls"]
+        == 100
+    )
+
+
+def test_diff():
+    "Test the handlers that ran between two snapshots."
+    before = parse_thread_cpu(OUTPUT)
+    after = parse_thread_cpu(
+        OUTPUT.replace(
+            "10.000       100      100", "25.000       130      100"
+        ).replace("0.300         3", "0.100         1")
+    )
+    delta = diff(before, after)
+
+    # zserv_read did not run, bgp_process_reads counters were cleared
+    assert sorted(delta) == [
+        ("bgpd", "BGP I/O thread", "bgp_process_reads"),
+        ("zebra", "main", "rib_process"),
+    ]
+    assert delta[("zebra", "main", "rib_process")]["runtime"] == 15.0
+    assert delta[("zebra", "main", "rib_process")]["calls"] == 30
+    assert delta[("bgpd", "BGP I/O thread", "bgp_process_reads")]["calls"] == 1
+
+    assert diff({}, before)[("zebra", "main", "zserv_read")]["calls"] == 14
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+#
+# test_topology_cache.py
+# Tests for the topology reuse cache.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the topology reuse cache.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.topogen import TopologyCache, topology_key
+from lib.topojson import apply_topology_shape
+
+
+class FakeTopogen(object):
+    "Topogen replacement that only records its stops."
+
+    def __init__(self, modname):
+        self.modname = modname
+        self.errorsd = {}
+        self.stopped = False
+
+    def has_errors(self):
+        return len(self.errorsd) > 0
+
+    def stop_topology(self):
+        self.stopped = True
+
+
+def test_topology_key():
+    "Test that the topology key doesn't depend on the keys order"
+
+    topo1 = {"routers": {"r1": {"links": {"r2": {}}}, "r2": {}}, "ipv4base": "10"}
+    topo2 = {"ipv4base": "10", "routers": {"r2": {}, "r1": {"links": {"r2": {}}}}}
+    assert topology_key(topo1) == topology_key(topo2)
+
+    topo2["routers"]["r3"] = {}
+    assert topology_key(topo1) != topology_key(topo2)
+
+
+def test_topology_key_shape():
+    "Test that the topology key only depends on the topology shape"
+
+    def topo(link, bgp):
+        return {
+            "ipv4base": "10.0.0.0",
+            "routers": {
+                "r1": {"links": {"r2": link}, "bgp": bgp},
+                "r2": {"links": {"r1": {"ipv4": "auto"}}},
+            },
+        }
+
+    key = topology_key(topo({"ipv4": "auto"}, {"local_as": "100"}))
+    # Router configurations don't matter
+    assert key == topology_key(topo({"ipv4": "auto"}, {"local_as": "200"}))
+    assert key == topology_key(
+        topo({"ipv4": "auto", "keepalivetimer": 1}, {"local_as": "100"})
+    )
+    # Interface addressing and VRFs do
+    assert key != topology_key(topo({"ipv4": "auto", "ipv6": "auto"}, {}))
+    assert key != topology_key(topo({"ipv4": "auto", "vrf": "RED"}, {}))
+    vrfs = topo({"ipv4": "auto"}, {})
+    vrfs["routers"]["r1"]["vrfs"] = [{"name": "RED", "id": "1"}]
+    assert key != topology_key(vrfs)
+
+
+def test_apply_topology_shape():
+    "Test copying the built interfaces to a topology with the same shape"
+
+    built = {
+        "routers": {
+            "r1": {
+                "nextIfname": 1,
+                "links": {
+                    "r2": {"ipv4": "10.0.0.1/30", "interface": "r1-r2-eth0"},
+                    "lo": {"ipv4": "1.0.1.17/32", "type": "loopback"},
+                },
+                "bgp": {"local_as": "100"},
+            }
+        }
+    }
+    topo = {
+        "routers": {
+            "r1": {
+                "links": {
+                    "r2": {"ipv4": "auto", "keepalivetimer": 1},
+                    "lo": {"ipv4": "auto", "type": "loopback"},
+                },
+                "bgp": {"local_as": "200"},
+            }
+        }
+    }
+    apply_topology_shape(built, topo)
+    assert topo["routers"]["r1"] == {
+        "nextIfname": 1,
+        "links": {
+            "r2": {
+                "ipv4": "10.0.0.1/30",
+                "interface": "r1-r2-eth0",
+                "keepalivetimer": 1,
+            },
+            "lo": {"ipv4": "1.0.1.17/32", "type": "loopback"},
+        },
+        "bgp": {"local_as": "200"},
+    }
+
+
+def test_topology_cache():
+    "Test topology reuse and release"
+
+    cache = TopologyCache()
+    assert cache.get("a") == (None, None)
+
+    tgen1 = FakeTopogen("mod1")
+    cache.put("a", tgen1, {"topo": 1})
+    assert cache.get("a") == (tgen1, {"topo": 1})
+    assert not tgen1.stopped
+
+    # A different topology stops the kept one
+    assert cache.get("b") == (None, None)
+    assert tgen1.stopped
+
+    # Topologies with errors are not reused
+    tgen2 = FakeTopogen("mod2")
+    cache.put("b", tgen2, {})
+    tgen2.errorsd["0"] = "failed"
+    assert cache.get("b") == (None, None)
+    assert tgen2.stopped
+
+    # Forgotten topologies are not stopped
+    tgen3 = FakeTopogen("mod3")
+    cache.put("c", tgen3, {})
+    assert cache.forget(tgen1) is None
+    assert cache.forget(tgen3) is tgen3
+    cache.release()
+    assert not tgen3.stopped
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -81,6 +81,12 @@ def test_invalid_versions():
         assert version_cmp(curver, badver3)
         assert version_cmp(curver, badver4)
 
+    # Unknown versions (daemon_version() failed)
+    with pytest.raises(ValueError):
+        version_cmp(None, curver)
+    with pytest.raises(ValueError):
+        version_cmp(curver, None)
+
 
 def test_regression_1():
     """
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+#
+# test_vtyshprofile.py
+# Tests for the vtysh command profiling.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the vtysh command profiling.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import telemetry, vtyshprofile
+from lib.vtyshprofile import normalize_command
+from lib.vtyshreplay import Replayer, ReplayRouter
+from lib.common_config import run_frr_cmd
+
+
+def test_normalize_command():
+    "Test the vtysh command patterns"
+
+    assert (
+        normalize_command("show bgp vrf RED ipv4 unicast 10.0.0.0/24 json")
+        == "show bgp vrf <V> ipv4 unicast <P> json"
+    )
+    assert normalize_command("show ipv6 route 2001:db8::/64") == "show ipv6 route <P>"
+    assert (
+        normalize_command("show bgp ipv6 neighbors fe80::1 json")
+        == "show bgp ipv6 neighbors <A> json"
+    )
+    assert (
+        normalize_command("show ip bgp neighbors 192.168.0.1 advertised-routes")
+        == "show ip bgp neighbors <A> advertised-routes"
+    )
+    assert (
+        normalize_command("show bgp l2vpn evpn route rd 1.1.1.1:2")
+        == "show bgp l2vpn evpn route rd <RD>"
+    )
+    assert (
+        normalize_command("show evpn mac vni 1000 mac 00:11:22:33:44:55")
+        == "show evpn mac vni <N> mac <MAC>"
+    )
+    assert normalize_command("show interface r1-eth0 json") == "show interface <I> json"
+    assert (
+        normalize_command(
+            "configure terminal\nrouter bgp 100\n no bgp ebgp-requires-policy"
+        )
+        == "configure terminal [+2]"
+    )
+
+
+def test_profile_report():
+    "Test the histograms and the reports"
+
+    directory = tempfile.mkdtemp()
+    vtyshprofile.reset()
+    vtyshprofile.enable()
+    try:
+        telemetry.record_vtysh("r1", "show ip route 10.0.1.0/24 json", 0.02, 2000)
+        telemetry.record_vtysh("r1", "show ip route 10.0.2.0/24 json", 0.2, 100)
+        telemetry.record_vtysh("r2", "show ip route 10.0.3.0/24 json", 20, 10 << 20)
+        telemetry.record_vtysh("r2", "show version", 0.001, 10)
+
+        profile = vtyshprofile.report()
+        assert sorted(profile.keys()) == ["show ip route <P> json", "show version"]
+        route = profile["show ip route <P> json"]
+        assert route["routers"]["r1"]["calls"] == 2
+        assert route["routers"]["r2"]["calls"] == 1
+        assert route["total"]["calls"] == 3
+        assert route["total"]["max_bytes"] == 10 << 20
+        # 0.02 -> <= 0.025, 0.2 -> <= 0.25, 20 -> overflow bucket
+        histogram = route["total"]["time_histogram"]
+        assert histogram[1] == 1 and histogram[4] == 1 and histogram[-1] == 1
+        assert route["total"]["callers"] == {
+            "test_vtyshprofile.py:test_profile_report": 3
+        }
+
+        text = vtyshprofile.format_report(profile)
+        assert text.splitlines()[1].endswith("show ip route <P> json")
+
+        path = vtyshprofile.write_report(directory)
+        with open(path) as output:
+            assert "show version" in json.load(output)["patterns"]
+        assert os.path.isfile(os.path.join(directory, "vtysh_profile.txt"))
+    finally:
+        vtyshprofile.enable(False)
+        vtyshprofile.reset()
+        shutil.rmtree(directory)
+
+
+def test_profile_wrappers():
+    "Test that the callers of thin vtysh wrappers are recorded"
+
+    router = ReplayRouter(
+        "r1",
+        Replayer(
+            {
+                "mod": {
+                    "r1": {
+                        "show bgp summary json": [["{}", 1]],
+                        "show bgp summary": [["no peers", 1]],
+                    }
+                }
+            }
+        ),
+    )
+    vtyshprofile.reset()
+    vtyshprofile.enable()
+    try:
+        run_frr_cmd(router, "show bgp summary json", isjson=True)
+
+        # run_frr_cmd() runs json commands twice: both are visible
+        caller = "test_vtyshprofile.py:test_profile_wrappers (run_frr_cmd)"
+        profile = vtyshprofile.report()
+        assert sorted(profile.keys()) == ["show bgp summary", "show bgp summary json"]
+        for pattern in profile.values():
+            assert pattern["total"]["callers"] == {caller: 1}
+    finally:
+        vtyshprofile.enable(False)
+        vtyshprofile.reset()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+#
+# test_vtyshreplay.py
+# Tests for the vtysh record and replay.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the vtysh record and replay.
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import shutil
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib import vtyshreplay
+from lib.vtyshreplay import ReplayTopogen, ReplayError
+from lib.common_config import run_frr_cmd
+from lib.bgp import verify_bgp_convergence, clear_bgp
+
+
+def record_session(path):
+    vtyshreplay.start_recording()
+    try:
+        for output in ["{}", "{}", '{"peers": 1}']:
+            vtyshreplay.record("r1", "show bgp summary json", None, output, "mod1")
+        vtyshreplay.record("r1", "show bgp summary", None, "1 peer", "mod1")
+        vtyshreplay.record("r2", "show memory", "zebra", "zebra memory", "mod1")
+        vtyshreplay.record("r2", "configure\nrouter bgp 1\n", None, "", "mod1")
+        # Another module with the same routers
+        vtyshreplay.record("r1", "show bgp summary json", None, "{}", "mod2")
+    finally:
+        vtyshreplay.stop_recording()
+    # Not recording anymore
+    vtyshreplay.record("r2", "show version", None, "ignored", "mod1")
+    return vtyshreplay.write_archive(path)
+
+
+def test_record_replay():
+    "Test the outputs are served in the recorded order."
+    directory = tempfile.mkdtemp()
+    try:
+        path = record_session(os.path.join(directory, "session.json.gz"))
+        # The archive has two modules
+        with pytest.raises(ValueError):
+            ReplayTopogen(path)
+        tgen = ReplayTopogen(path, "mod1")
+        assert tgen.modname == "mod1"
+        assert sorted(tgen.routers()) == ["r1", "r2"]
+        assert sorted(ReplayTopogen(path, "mod2").routers()) == ["r1"]
+
+        # Repeated outputs were stored once
+        archive = vtyshreplay.load_archive(path)
+        assert archive["mod1"]["r1"]["show bgp summary json"] == [
+            ["{}", 2],
+            ['{"peers": 1}', 1],
+        ]
+        assert archive["mod2"]["r1"]["show bgp summary json"] == [["{}", 1]]
+
+        r1 = tgen.routers()["r1"]
+        assert r1.vtysh_cmd("show bgp summary json", isjson=True) == {}
+        # The library helpers also run the command without json
+        assert run_frr_cmd(r1, "show bgp summary json", isjson=True) == {}
+        assert r1.vtysh_cmd("show bgp summary json", isjson=True) == {"peers": 1}
+        # The last output is served from now on
+        assert r1.vtysh_cmd("show bgp summary json", isjson=True) == {"peers": 1}
+
+        r2 = tgen.routers()["r2"]
+        assert r2.vtysh_cmd("show memory", daemon="zebra") == "zebra memory"
+        assert r2.vtysh_cmd("configure\nrouter bgp 1") == ""
+        with pytest.raises(ReplayError):
+            r2.vtysh_cmd("show memory")
+        with pytest.raises(ReplayError):
+            r2.vtysh_cmd("show version")
+        with pytest.raises(ReplayError):
+            r2.run("ip route show")
+
+        tgen.replayer.rewind()
+        assert r1.vtysh_cmd("show bgp summary json") == "{}"
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_start_replay():
+    "Test the replay backend of the TopoRouter commands."
+    assert vtyshreplay.replay("r1", "show version") is None
+    replayer = vtyshreplay.start_replay(
+        vtyshreplay.Replayer({"mod": {"r1": {"show version": [["FRRouting", 1]]}}})
+    )
+    try:
+        assert vtyshreplay.replaying()
+        assert vtyshreplay.replay("r1", "show version") == "FRRouting"
+        assert replayer.replay("r1", " show version ") == "FRRouting"
+    finally:
+        vtyshreplay.stop_replay()
+    assert vtyshreplay.replay("r1", "show version") is None
+    assert not vtyshreplay.replaying()
+
+
+def test_replay_helper():
+    "Test a lib/bgp.py verification helper on replayed outputs."
+    topo = {
+        "routers": {
+            "r1": {
+                "links": {"r2": {"ipv4": "10.0.0.1/24"}},
+                "bgp": {
+                    "local_as": "100",
+                    "address_family": {
+                        "ipv4": {
+                            "unicast": {"neighbor": {"r2": {"dest_link": {"r1": {}}}}}
+                        }
+                    },
+                },
+            },
+            "r2": {"links": {"r1": {"ipv4": "10.0.0.2/24"}}},
+        }
+    }
+
+    def archive(state):
+        summary = {
+            "default": {"ipv4Unicast": {"peers": {"10.0.0.2": {"state": state}}}}
+        }
+        return {
+            "test_bgp": {
+                "r1": {
+                    "show bgp vrf all summary json": [[json.dumps(summary), 1]],
+                    "show bgp vrf all summary": [["summary", 1]],
+                },
+                "r2": {},
+            }
+        }
+
+    tgen = ReplayTopogen(archive("Established"))
+    assert vtyshreplay.replaying(tgen)
+    assert verify_bgp_convergence(tgen, topo) is True
+
+    # A failure doesn't wait between the attempts nor generate a support
+    # bundle (there is no topology)
+    start = time.time()
+    result = verify_bgp_convergence(ReplayTopogen(archive("Active")), topo, attempts=3)
+    assert "BGP is not converged" in result
+    assert time.time() - start < 1
+
+
+def test_replay_clear_bgp():
+    "Test clear_bgp() only waits for the peers of the cleared family."
+
+    def summary(ipv4_connections):
+        return json.dumps(
+            {
+                "ipv4Unicast": {
+                    "peers": {
+                        "10.0.0.2": {
+                            "state": "Established",
+                            "connectionsEstablished": ipv4_connections,
+                        }
+                    }
+                },
+                # Not activated in IPv4 unicast, not reset
+                "ipv6Unicast": {
+                    "peers": {
+                        "fd00::2": {
+                            "state": "Established",
+                            "connectionsEstablished": 1,
+                        }
+                    }
+                },
+            }
+        )
+
+    tgen = ReplayTopogen(
+        {
+            "test_bgp": {
+                "r1": {
+                    "show bgp summary json": [[summary(1), 1], [summary(2), 1]],
+                    "clear ip bgp *": [["", 1]],
+                }
+            }
+        }
+    )
+    start = time.time()
+    clear_bgp(tgen, "ipv4", "r1")
+    assert time.time() - start < 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+#
+# test_worker.py
+# Tests for the pytest-xdist worker helpers.
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Tests for the pytest-xdist worker helpers.
+"""
+
+import os
+import sys
+import pytest
+
+# Save the Current Working Directory to find lib files.
+CWD = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(CWD, "../../"))
+
+# pylint: disable=C0413
+from lib.topotest import get_logdir_base, worker_node_name
+
+
+def _set_worker(worker):
+    if worker is None:
+        os.environ.pop("PYTEST_XDIST_WORKER", None)
+    else:
+        os.environ["PYTEST_XDIST_WORKER"] = worker
+
+
+def test_worker_names():
+    "Test the log directory and node names with and without xdist"
+
+    saved = os.environ.get("PYTEST_XDIST_WORKER")
+    try:
+        _set_worker(None)
+        assert get_logdir_base() == "/tmp/topotests"
+        assert worker_node_name("s1") == "s1"
+
+        _set_worker("gw2")
+        assert get_logdir_base() == "/tmp/topotests/gw2"
+        assert worker_node_name("s1") == "gw2-s1"
+    finally:
+        _set_worker(saved)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main())
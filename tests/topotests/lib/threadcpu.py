@@ -0,0 +1,320 @@
+#
+# threadcpu.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+Daemon CPU attribution to test steps.
+
+Enabled with `pytest --thread-cpu=bgpd,zebra` (or the TOPOTESTS_THREAD_CPU
+environment variable, `all` for every daemon): `show thread cpu` is
+collected from the chosen daemons of every router when a test starts, at
+every common_config `step()` and when the test ends. The counters of
+consecutive snapshots are subtracted, so every interval (test start to the
+first step, step to step, last step to test end) gets the CPU time and calls
+of each event handler spent while it ran.
+
+The top handlers by CPU time and by number of calls of every interval are
+logged and, after the last test of a module, all the intervals are written
+to `<log directory>/<module>/thread_cpu.json`.
+"""
+
+import re
+import time
+import threading
+
+from lib.topolog import logger
+from lib import reports
+
+# One line of `show thread cpu` (lib/thread.c), the `Active` column only
+# exists in recent versions.
+ROW_RE = re.compile(
+    r"^\s*(?:(\d+)\s+)?(\d+\.\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)"
+    r"\s+([RWTEXB ]*?)\s*(\S+)\s*$"
+)
+DAEMON_RE = re.compile(r"^Thread statistics for (\S+):")
+PTHREAD_RE = re.compile(r"^Showing statistics for pthread (.+?)\s*$")
+
+_options = {"daemons": None, "top": 10}
+_lock = threading.Lock()
+_state = {"module": None, "test": None, "label": None, "start": None, "snapshot": None}
+_intervals = []
+
+
+# enabled(): returns `True` when the daemon CPU is being attributed to test steps.
+enabled, _enable = reports.toggle()
+
+
+def enable(daemons=None, top=10, value=True):
+    """
+    Enables (or disables) the collection for `daemons` (a list of daemon
+    names, all of them when `None`). `top` is the number of handlers logged
+    for every interval.
+    """
+    _enable(value)
+    _options["daemons"] = daemons
+    _options["top"] = top
+
+
+def parse_thread_cpu(output, daemon=None):
+    """
+    Parses the output of `show thread cpu` and returns a dictionary keyed by
+    `(daemon, pthread, handler)` tuples. The daemon comes from the vtysh
+    `Thread statistics for` headers or, when missing, is `daemon`. The
+    `Total thread statistics` sections are ignored.
+    """
+    rows = {}
+    pthread = "main"
+    for line in output.splitlines():
+        match = DAEMON_RE.match(line)
+        if match:
+            daemon = match.group(1)
+            pthread = "main"
+            continue
+        match = PTHREAD_RE.match(line)
+        if match:
+            pthread = match.group(1)
+            continue
+        if line.startswith("Total thread statistics"):
+            pthread = None
+            continue
+        if pthread is None:
+            continue
+
+        match = ROW_RE.match(line)
+        if not match:
+            continue
+        calls = int(match.group(3))
+        key = (daemon, pthread, match.group(9))
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {
+                "runtime": 0.0,
+                "calls": 0,
+                "real": 0.0,
+                "max_cpu": 0,
+                "max_real": 0,
+                "types": "",
+            }
+        # Handlers with the same name are added up
+        row["runtime"] += float(match.group(2))
+        row["calls"] += calls
+        row["real"] += int(match.group(6)) * calls / 1000.0
+        row["max_cpu"] = max(row["max_cpu"], int(match.group(5)))
+        row["max_real"] = max(row["max_real"], int(match.group(7)))
+        row["types"] = "".join(sorted(set(row["types"] + match.group(8).strip())))
+    return rows
+
+
+def diff(before, after):
+    """
+    Returns the handlers of parse_thread_cpu() result `after` that ran since
+    `before`, with the CPU time (`runtime`, milliseconds), wall clock time
+    (`real`, milliseconds) and `calls` spent in between. Counters that went
+    backwards were cleared: the `after` values are used.
+    """
+    result = {}
+    for key, row in after.items():
+        old = before.get(key)
+        if old is None or row["calls"] < old["calls"]:
+            delta = dict(row)
+        else:
+            delta = dict(
+                row,
+                runtime=row["runtime"] - old["runtime"],
+                calls=row["calls"] - old["calls"],
+                real=row["real"] - old["real"],
+            )
+        if delta["calls"] <= 0:
+            continue
+        delta["runtime"] = round(max(delta["runtime"], 0.0), 3)
+        delta["real"] = round(max(delta["real"], 0.0), 3)
+        result[key] = delta
+    return result
+
+
+def _command():
+    daemons = _options["daemons"]
+    if not daemons:
+        return 'vtysh -c "show thread cpu" 2>/dev/null'
+    return "; ".join(
+        'vtysh -d {} -c "show thread cpu" 2>/dev/null'.format(daemon)
+        for daemon in daemons
+    )
+
+
+def snapshot(tgen=None):
+    """
+    Returns the `show thread cpu` counters of all routers: a dictionary
+    keyed by router name of parse_thread_cpu() results. The routers are
+    queried in parallel.
+    """
+    # pylint: disable=C0415
+    from lib import topotest
+    from lib.topogen import get_topogen
+
+    if tgen is None:
+        tgen = get_topogen()
+    if tgen is None or tgen.net is None:
+        return None
+
+    command = _command()
+
+    def _query(router):
+        try:
+            return parse_thread_cpu(router.run(command))
+        # A router that is gone must not fail the test
+        # pylint: disable=W0703
+        except Exception as error:
+            logger.debug("thread cpu: {}: {}".format(router.name, error))
+            return {}
+
+    routers = sorted(tgen.routers().items())
+    results = topotest.run_parallel(_query, [(router,) for _, router in routers])
+    return dict((name, rows) for (name, _), rows in zip(routers, results))
+
+
+def interval_report(label, before, after, seconds):
+    "Returns the report of the interval `label` between two snapshots."
+    handlers = []
+    for router in sorted(after):
+        for key, row in diff(before.get(router, {}), after[router]).items():
+            daemon, pthread, handler = key
+            handlers.append(
+                dict(
+                    row, router=router, daemon=daemon, pthread=pthread, handler=handler
+                )
+            )
+    handlers.sort(key=lambda entry: -entry["runtime"])
+    return {
+        "test": _state["test"],
+        "label": label,
+        "time": round(seconds, 3),
+        "runtime": round(sum(entry["runtime"] for entry in handlers), 3),
+        "calls": sum(entry["calls"] for entry in handlers),
+        "handlers": handlers,
+    }
+
+
+def format_interval(report, top=10):
+    "Returns the `top` handlers by CPU time and by calls of `report` as text."
+    lines = [
+        "thread cpu: {} {!r}: {:.1f}ms CPU, {} calls in {:.1f}s".format(
+            report["test"],
+            report["label"],
+            report["runtime"],
+            report["calls"],
+            report["time"],
+        )
+    ]
+    by_calls = sorted(report["handlers"], key=lambda entry: -entry["calls"])
+    for title, entries in [
+        ("by CPU", report["handlers"][:top]),
+        ("by calls", by_calls[:top]),
+    ]:
+        if not entries:
+            continue
+        lines.append("  {}:".format(title))
+        for entry in entries:
+            lines.append(
+                "  {:>10.1f}ms {:>8} {:>5}  {} {} {} {}".format(
+                    entry["runtime"],
+                    entry["calls"],
+                    entry["types"],
+                    entry["router"],
+                    entry["daemon"],
+                    entry["pthread"],
+                    entry["handler"],
+                )
+            )
+    return "\n".join(lines)
+
+
+def _close_interval(new_label):
+    # Closes the running interval and starts `new_label` (when not `None`).
+    with _lock:
+        before = _state["snapshot"]
+        label = _state["label"]
+        start = _state["start"]
+    if before is None:
+        return
+
+    after = snapshot()
+    if after is None:
+        with _lock:
+            _state["snapshot"] = None
+        return
+
+    now = time.time()
+    report = interval_report(label, before, after, now - start)
+    logger.info(format_interval(report, _options["top"]))
+    with _lock:
+        _intervals.append(report)
+        if new_label is None:
+            _state["snapshot"] = None
+        else:
+            _state["snapshot"] = after
+            _state["label"] = new_label
+            _state["start"] = now
+
+
+def begin_test(module, test):
+    "Takes the first snapshot of `test` in `module`."
+    if not enabled():
+        return
+    with _lock:
+        if _state["module"] != module:
+            del _intervals[:]
+            _state["module"] = module
+        _state["test"] = test
+        _state["label"] = "<start>"
+    current = snapshot()
+    with _lock:
+        _state["snapshot"] = current
+        _state["start"] = time.time()
+
+
+def step(label):
+    "Closes the running interval, the next one is named `label`."
+    if not enabled():
+        return
+    _close_interval(label)
+
+
+def end_test():
+    "Closes the last interval of the test."
+    if not enabled():
+        return
+    _close_interval(None)
+
+
+def module_report():
+    "Returns the intervals of the current module."
+    with _lock:
+        return {
+            "module": _state["module"],
+            "daemons": _options["daemons"],
+            "intervals": list(_intervals),
+        }
+
+
+def write_report(directory):
+    "Writes the current module intervals to `directory`/thread_cpu.json."
+    return reports.write_json_report(directory, "thread_cpu", module_report())
@@ -42,6 +42,8 @@ import os
 import sys
 import logging
 import json
+import time
+import hashlib
 
 if sys.version_info[0] > 2:
     import configparser
@@ -56,10 +58,18 @@ import subprocess
 import pytest
 
 from mininet.net import Mininet
+from mininet.node import Node
 from mininet.log import setLogLevel
 from mininet.cli import CLI
 
 from lib import topotest
+from lib import crashinfo
+from lib import netns
+from lib import manifest
+from lib import procsampler
+from lib import probecache
+from lib import telemetry
+from lib import vtyshreplay
 from lib.topolog import logger, logger_config
 from lib.topotest import set_sysctl
 
@@ -88,6 +98,125 @@ def set_topogen(tgen):
     global_tgen = tgen
 
 
+# JSON topology members defining its shape (the rest is router configuration)
+TOPOLOGY_SHAPE_KEYS = (
+    "ipv4base",
+    "ipv4mask",
+    "ipv6base",
+    "ipv6mask",
+    "link_ip_start",
+    "lo_prefix",
+)
+LINK_SHAPE_KEYS = ("ipv4", "ipv6", "type", "vrf")
+
+
+def topology_shape(topo):
+    """
+    Returns the shape of a JSON topology (before build_topo_from_json()):
+    the routers, their links with the interface addressing and their VRFs,
+    without the rest of the router configurations.
+    """
+    shape = dict((key, topo[key]) for key in TOPOLOGY_SHAPE_KEYS if key in topo)
+    shape["routers"] = {}
+    for name, router in topo.get("routers", {}).items():
+        links = {}
+        for peer, link in router.get("links", {}).items():
+            links[peer] = dict(
+                (key, value) for key, value in link.items() if key in LINK_SHAPE_KEYS
+            )
+        shape["routers"][name] = {"links": links, "vrfs": router.get("vrfs")}
+    return shape
+
+
+def topology_key(topo):
+    "Returns the key of a JSON topology (a hash of its normalized shape)."
+    data = json.dumps(topology_shape(topo), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class TopologyCache(object):
+    """
+    Keeps a started topology running after its test module finishes, so the
+    next module with the same JSON topology shape (see `topology_key()`)
+    only has to replace the router configurations instead of building
+    everything again.
+
+    Only one topology is kept: creating a new Topogen stops it.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.tgen = None
+        self.topo = None
+
+    def get(self, key):
+        """
+        Returns `(tgen, topo)` of the kept topology if it matches `key`,
+        otherwise stops it and returns `(None, None)`.
+        """
+        if self.tgen is None:
+            return None, None
+        if self.key != key or self.tgen.has_errors():
+            self.release()
+            return None, None
+        return self.tgen, self.topo
+
+    def put(self, key, tgen, topo):
+        "Keeps `tgen` (started with the JSON topology `topo`) for reuse."
+        self.release()
+        self.key = key
+        self.tgen = tgen
+        self.topo = topo
+
+    def forget(self, tgen=None):
+        """
+        Stops keeping the topology (only if it is `tgen` when set) without
+        stopping it. Returns the Topogen that was kept.
+        """
+        kept = self.tgen
+        if tgen is not None and kept is not tgen:
+            return None
+        self.key = self.tgen = self.topo = None
+        return kept
+
+    def release(self):
+        "Stops the kept topology (if any)."
+        tgen = self.forget()
+        if tgen is not None:
+            logger.info("releasing kept topology: {}".format(tgen.modname))
+            tgen.stop_topology()
+
+
+topology_cache = None
+
+
+def get_topology_cache():
+    """
+    Returns the TopologyCache if topology reuse is enabled (`reuse_topology`
+    in pytest.ini or the TOPOTESTS_REUSE_TOPOLOGY environment variable),
+    otherwise `None`.
+    """
+    # pylint: disable=W0603
+    global topology_cache
+    if topology_cache is None:
+        config = configparser.ConfigParser(tgen_defaults)
+        config.read(os.path.join(CWD, "../pytest.ini"))
+        enabled = os.environ.get("TOPOTESTS_REUSE_TOPOLOGY") or config.get(
+            Topogen.CONFIG_SECTION, "reuse_topology"
+        )
+        if str(enabled).lower() not in ["1", "yes", "true", "on"]:
+            topology_cache = False
+        else:
+            topology_cache = TopologyCache()
+    return topology_cache or None
+
+
+def release_topology_cache():
+    "Stops the topology kept for reuse (if any)."
+    if topology_cache:
+        topology_cache.release()
+
+
 #
 # Main class: topology builder
 #
@@ -99,9 +228,54 @@ tgen_defaults = {
     "quaggadir": "/usr/lib/quagga",
     "routertype": "frr",
     "memleak_path": None,
+    "log_ring_size": None,
+    "reuse_topology": "false",
+    "backend": "mininet",
+    "mininet_cleanup": "false",
 }
 
 
+class ManifestMininet(Mininet):
+    """
+    Mininet network recording what it creates in a manifest (see
+    lib/manifest.py): host namespace interfaces and bridges before they are
+    created, node namespaces as soon as their node is started.
+    """
+
+    def __init__(self, topo_manifest, **params):
+        self.topo_manifest = topo_manifest
+        Mininet.__init__(self, **params)
+
+    def addHost(self, name, cls=None, **params):
+        host = Mininet.addHost(self, name, cls=cls, **params)
+        self.topo_manifest.add_node(host)
+        return host
+
+    def addSwitch(self, name, cls=None, **params):
+        # Open vSwitch bridges are created when the switch is started
+        switch = Mininet.addSwitch(self, name, cls=cls, **params)
+        if switch.inNamespace:
+            self.topo_manifest.add_node(switch)
+        else:
+            # Named after the pytest-xdist worker (see LegacySwitch)
+            self.topo_manifest.add_bridge(switch.name)
+        return switch
+
+    def addLink(self, node1, node2, port1=None, port2=None, cls=None, **params):
+        ends = [(node1, port1, "intfName1"), (node2, port2, "intfName2")]
+        for node, port, intfname in ends:
+            if not isinstance(node, Node):
+                node = self[node]
+            if not node.inNamespace:
+                # Named like mininet Link does
+                self.topo_manifest.add_link(
+                    params.get(intfname) or "{}-eth{}".format(node.name, port)
+                )
+        return Mininet.addLink(
+            self, node1, node2, port1=port1, port2=port2, cls=cls, **params
+        )
+
+
 class Topogen(object):
     "A topology test builder helper."
 
@@ -123,14 +297,25 @@ class Topogen(object):
         self.errorsd = {}
         self.errors = ""
         self.peern = 1
+        self.proc_sampler = None
+        # Topology kept for reuse by a previous test module must go first
+        release_topology_cache()
         self._init_topo(cls)
         logger.info("loading topology: {}".format(self.modname))
 
-    @staticmethod
-    def _mininet_reset():
-        "Reset the mininet environment"
-        # Clean up the mininet environment
-        os.system("mn -c > /dev/null 2>&1")
+    def _mininet_reset(self):
+        """
+        Removes what previous runs left behind: the items recorded in the
+        manifests of dead test runs and, when `mininet_cleanup` is enabled,
+        everything mininet knows about (`mn -c`).
+        """
+        manifest.recover_stale()
+        cleanup = os.environ.get("TOPOTESTS_MININET_CLEANUP") or self.config.get(
+            self.CONFIG_SECTION, "mininet_cleanup"
+        )
+        if cleanup.lower() in ["true", "yes", "1"]:
+            # Not when running with xdist
+            topotest.mininet_cleanup()
 
     def _init_topo(self, cls):
         """
@@ -152,9 +337,18 @@ class Topogen(object):
         self._load_config()
 
         # Initialize the API
+        self.backend = os.environ.get("TOPOTESTS_BACKEND") or self.config.get(
+            self.CONFIG_SECTION, "backend"
+        )
         self._mininet_reset()
         cls()
-        self.net = Mininet(controller=None, topo=self.topo)
+        # Record what gets created, for the teardown or crash recovery
+        self.manifest = manifest.Manifest()
+        if self.backend == "netns":
+            self.net = netns.Network(self.topo, self.manifest)
+        else:
+            self.net = ManifestMininet(self.manifest, controller=None, topo=self.topo)
+
         for gear in self.gears.values():
             gear.net = self.net
 
@@ -308,6 +502,24 @@ class Topogen(object):
 
         logger.info("starting topology: {}".format(self.modname))
         self.net.start()
+        self.proc_sampler = procsampler.start(
+            self, os.path.join(topotest.get_logdir_base(), self.modname)
+        )
+
+    def reuse(self, modname):
+        """
+        Hands the running topology over to the test module `modname`: its
+        logs and reports go to the `modname` log directory from now on. The
+        running daemons keep their log files.
+        """
+        logger.info("reusing topology of {} for {}".format(self.modname, modname))
+        procsampler.stop(self.proc_sampler)
+        self.modname = modname
+        logdir = os.path.join(topotest.get_logdir_base(), modname)
+        for gear in self.gears.values():
+            if isinstance(gear, TopoRouter):
+                gear.set_logdir(logdir)
+        self.proc_sampler = procsampler.start(self, logdir)
 
     def start_router(self, router=None):
         """
@@ -329,25 +541,64 @@ class Topogen(object):
         Stops the network topology. This function will call the stop() function
         of all gears before calling the mininet stop function, so they can have
         their oportunity to do a graceful shutdown. stop() is called twice. The
-        first is a simple kill with no sleep, the second will sleep if not
-        killed and try with a different signal.
+        first signals every daemon of every gear without waiting, the second
+        runs concurrently for all gears: it waits for the daemons to exit
+        (killing the ones that don't exit in time) and checks for cores and
+        memory leaks.
+
+        When the topology is kept for reuse (see `TopologyCache`) and had no
+        errors, it is left running for the next test module.
         """
+        cache = get_topology_cache()
+        if cache is not None and cache.tgen is self:
+            if not self.has_errors():
+                logger.info("keeping topology for reuse: {}".format(self.modname))
+                return
+            cache.forget(self)
+
         logger.info("stopping topology: {}".format(self.modname))
-        errors = ""
-        for gear in self.gears.values():
+        procsampler.stop(self.proc_sampler)
+        self.proc_sampler = None
+        gears = self.gears.values()
+        for gear in gears:
             gear.stop(False, False)
-        for gear in self.gears.values():
-            errors += gear.stop(True, False)
-        if len(errors) > 0:
-            assert "Errors found post shutdown - details follow:" == 0, errors
+        results = topotest.run_parallel(
+            lambda gear: gear.stop(True, False), [(gear,) for gear in gears]
+        )
+        errors = "".join(result for result in results if result)
+
+        # One report with the crash information of all routers
+        report = crashinfo.CrashReport()
+        for gear in gears:
+            router = self.net.nameToNode.get(gear.name)
+            if hasattr(router, "crashReport"):
+                report.extend(router.crashReport)
+        if len(report) > 0:
+            reportfile = os.path.join(
+                topotest.get_logdir_base(), self.modname, "crash_report.txt"
+            )
+            report.write(reportfile)
+            logger.info("crash information written to {}".format(reportfile))
 
-        self.net.stop()
+        try:
+            if len(errors) > 0:
+                assert "Errors found post shutdown - details follow:" == 0, errors
+        finally:
+            self.net.stop()
+            self.manifest.close()
 
     def mininet_cli(self):
         """
         Interrupt the test and call the command line interface for manual
         inspection. Should be only used on non production code.
+
+        Not available with the netns backend (see `backend` in pytest.ini).
         """
+        if self.backend == "netns":
+            raise EnvironmentError(
+                "mininet CLI is not available with the netns backend, "
+                "run with 'backend = mininet' in order to use it"
+            )
         if not sys.stdin.isatty():
             raise EnvironmentError(
                 "you must run pytest with '-s' in order to use mininet CLI"
@@ -377,9 +628,18 @@ class Topogen(object):
         if testname is None:
             testname = self.modname
 
+        # Routers are stopped for the report, so the topology can't be reused
+        cache = get_topology_cache()
+        if cache is not None:
+            cache.forget(self)
+
         router_list = self.routers().values()
         for router in router_list:
-            router.report_memory_leaks(self.modname)
+            router.stop(False, False)
+        topotest.run_parallel(
+            lambda router: router.report_memory_leaks(self.modname),
+            [(router,) for router in router_list],
+        )
 
     def set_error(self, message, code=None):
         "Sets an error message and signal other tests to skip."
@@ -392,6 +652,13 @@ class Topogen(object):
         self.errorsd[code] = message
         self.errors += "\n{}: {}".format(code, message)
 
+        # Keep the daemons debug output (see `log_ring_size`)
+        if self.net is not None:
+            for gear in self.routers().values():
+                node = self.net.nameToNode.get(gear.name)
+                if hasattr(node, "flushLogRings"):
+                    node.flushLogRings()
+
     def has_errors(self):
         "Returns whether errors exist or not."
         return len(self.errorsd) > 0
@@ -598,23 +865,30 @@ class TopoRouter(TopoGear):
         self.options["memleak_path"] = params.get("memleak_path", None)
 
         # Create new log directory
-        self.logdir = "/tmp/topotests/{}".format(self.tgen.modname)
+        self.set_logdir(os.path.join(topotest.get_logdir_base(), self.tgen.modname))
+        # Propagate the router log directory
+        params["logdir"] = self.logdir
+
+        self.tgen.topo.addNode(self.name, cls=self.cls, **params)
+
+    def set_logdir(self, logdir):
+        """
+        Creates the router log directory in `logdir` and opens the router log
+        file there.
+        """
+        self.logdir = logdir
         # Clean up before starting new log files: avoids removing just created
         # log files.
         self._prepare_tmpfiles()
-        # Propagate the router log directory
-        params["logdir"] = self.logdir
 
         # setup the per node directory
         dir = "{}/{}".format(self.logdir, self.name)
         os.system("mkdir -p " + dir)
-        os.system("chmod -R go+rw /tmp/topotests")
+        os.system("chmod -R go+rw " + topotest.get_logdir_base())
 
         # Open router log file
-        logfile = "{0}/{1}.log".format(self.logdir, name)
-        self.logger = logger_config.get_logger(name=name, target=logfile)
-
-        self.tgen.topo.addNode(self.name, cls=self.cls, **params)
+        logfile = "{0}/{1}.log".format(self.logdir, self.name)
+        self.logger = logger_config.set_target(self.name, logfile)
 
     def __str__(self):
         gear = super(TopoRouter, self).__str__()
@@ -640,8 +914,9 @@ class TopoRouter(TopoGear):
 
         # Try to find relevant old logfiles in /tmp and delete them
         map(os.remove, glob.glob("{}/{}/*.log".format(self.logdir, self.name)))
-        # Remove old core files
+        # Remove old core files (and their cached backtraces)
         map(os.remove, glob.glob("{}/{}/*.dmp".format(self.logdir, self.name)))
+        map(os.remove, glob.glob("{}/{}/*.dmp.bt".format(self.logdir, self.name)))
 
     def check_capability(self, daemon, param):
         """
@@ -743,6 +1018,17 @@ class TopoRouter(TopoGear):
         self.logger.debug('Killing daemons using SIGKILL..')
         return self.tgen.net[self.name].killRouterDaemons(daemons, wait, assertOnError)
 
+    def enabled_daemons(self):
+        "Returns the list of daemon names enabled in this router."
+        nrouter = self.tgen.net[self.name]
+        return [
+            daemon for daemon, enabled in nrouter.daemons.iteritems() if enabled == 1
+        ]
+
+    def vty_ready(self, daemon):
+        "Returns `True` if the `daemon` (e.g. 'bgpd') vty is answering."
+        return self.tgen.net[self.name].daemonVtyReady(daemon)
+
     def vtysh_cmd(self, command, isjson=False, daemon=None):
         """
         Runs the provided command string in the vty shell and returns a string
@@ -761,7 +1047,12 @@ class TopoRouter(TopoGear):
 
         vtysh_command = 'vtysh {} -c "{}" 2>/dev/null'.format(dparam, command)
 
-        output = self.run(vtysh_command)
+        start = time.time()
+        output = vtyshreplay.replay(self.name, command, daemon)
+        if output is None:
+            output = self.run(vtysh_command)
+            vtyshreplay.record(self.name, command, daemon, output, self.tgen.modname)
+        telemetry.record_vtysh(self.name, command, time.time() - start, len(output))
         self.logger.info(
             "\nvtysh command => {}\nvtysh output <= {}".format(command, output)
         )
@@ -783,6 +1074,12 @@ class TopoRouter(TopoGear):
         True it will show the command as they were executed in the vty shell,
         otherwise it will only show lines that failed.
         """
+        start = time.time()
+        res = vtyshreplay.replay(self.name, commands, daemon)
+        if res is not None:
+            telemetry.record_vtysh(self.name, commands, time.time() - start, len(res))
+            return res
+
         # Prepare the temporary file that will hold the commands
         fname = topotest.get_file(commands)
 
@@ -796,7 +1093,10 @@ class TopoRouter(TopoGear):
         else:
             vtysh_command = "vtysh {} -f {}".format(dparam, fname)
 
+        start = time.time()
         res = self.run(vtysh_command)
+        vtyshreplay.record(self.name, commands, daemon, res, self.tgen.modname)
+        telemetry.record_vtysh(self.name, commands, time.time() - start, len(res))
         os.unlink(fname)
 
         self.logger.info(
@@ -884,6 +1184,18 @@ class TopoSwitch(TopoGear):
         self.cls = cls
         self.tgen.topo.addSwitch(name, cls=self.cls)
 
+    def new_link(self):
+        """
+        Generates a new unique link name. Switch interfaces live in the host
+        namespace, so they are named after the switch node name (which is
+        unique among pytest-xdist workers, see `topotest.worker_node_name`).
+
+        NOTE: This function should only be called by Topogen.
+        """
+        ifname = "{}-eth{}".format(topotest.worker_node_name(self.name), self.linkn)
+        self.linkn += 1
+        return ifname
+
     def __str__(self):
         gear = super(TopoSwitch, self).__str__()
         gear += " TopoSwitch<>"
@@ -981,22 +1293,63 @@ class TopoExaBGP(TopoHost):
 # Diagnostic function
 #
 
-# Disable linter branch warning. It is expected to have these here.
-# pylint: disable=R0912
+
+# Daemons checked by the diagnostics
+FRR_DAEMONS = [
+    "zebra",
+    "ospfd",
+    "ospf6d",
+    "bgpd",
+    "ripd",
+    "ripngd",
+    "isisd",
+    "pimd",
+    "ldpd",
+    "pbrd",
+]
+QUAGGA_DAEMONS = [
+    "zebra",
+    "ospfd",
+    "ospf6d",
+    "bgpd",
+    "ripd",
+    "ripngd",
+    "isisd",
+    "pimd",
+    "pbrd",
+]
+
+
+class _LogRecorder(logging.Handler):
+    "Keeps the messages logged by the diagnostics, so they can be replayed."
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append([record.levelno, record.getMessage()])
+
+
 def diagnose_env_linux():
     """
     Run diagnostics in the running environment. Returns `True` when everything
     is ok, otherwise `False`.
-    """
-    ret = True
 
+    Successful diagnostics are cached (see lib/probecache.py) until the next
+    reboot or until the tools or the FRR/Quagga binaries change, their
+    messages are logged again from the cache.
+    """
     # Test log path exists before installing handler.
     if not os.path.isdir("/tmp"):
         logger.warning("could not find /tmp for logs")
     else:
-        os.system("mkdir /tmp/topotests")
+        logdir = topotest.get_logdir_base()
+        os.system("mkdir -p {}".format(logdir))
         # Log diagnostics to file so it can be examined later.
-        fhandler = logging.FileHandler(filename="/tmp/topotests/diagnostics.txt")
+        fhandler = logging.FileHandler(
+            filename=os.path.join(logdir, "diagnostics.txt")
+        )
         fhandler.setLevel(logging.DEBUG)
         fhandler.setFormatter(
             logging.Formatter(fmt="%(asctime)s %(levelname)s: %(message)s")
@@ -1010,6 +1363,49 @@ def diagnose_env_linux():
     pytestini_path = os.path.join(CWD, "../pytest.ini")
     config.read(pytestini_path)
 
+    frrdir = config.get("topogen", "frrdir")
+    quaggadir = config.get("topogen", "quaggadir")
+    stamps = [os.getuid()]
+    paths = [frrdir, quaggadir, "/etc/passwd", "/etc/group"]
+    paths += [os.path.join(frrdir, fname) for fname in FRR_DAEMONS]
+    paths += [os.path.join(quaggadir, fname) for fname in QUAGGA_DAEMONS]
+    for path in paths:
+        stamps.append(probecache.file_stamp(path))
+    for tool in ["mn", "ip", "gdb", "exabgp"]:
+        stamps.append(probecache.file_stamp(probecache.which(tool) or tool))
+
+    probed = []
+
+    def _diagnose():
+        probed.append(True)
+        recorder = _LogRecorder()
+        logger.addHandler(recorder)
+        try:
+            ok = _diagnose_env_linux(config)
+        finally:
+            logger.removeHandler(recorder)
+        return {"ok": ok, "messages": recorder.messages}
+
+    result = probecache.cached(
+        "diagnose_env", stamps, _diagnose, keep=lambda result: result["ok"]
+    )
+    if not probed:
+        logger.info("Using cached environment diagnostics")
+        for level, message in result["messages"]:
+            logger.log(level, message)
+
+    # After we logged the output to file, remove the handler.
+    logger.removeHandler(fhandler)
+
+    return result["ok"]
+
+
+# Disable linter branch warning. It is expected to have these here.
+# pylint: disable=R0912
+def _diagnose_env_linux(config):
+    "Runs the diagnostics of diagnose_env_linux() without cache."
+    ret = True
+
     # Assert that we are running as root
     if os.getuid() != 0:
         logger.error("you must run topotest as root")
@@ -1056,18 +1452,7 @@ def diagnose_env_linux():
         except KeyError:
             logger.warning('could not find "frrvty" group')
 
-        for fname in [
-            "zebra",
-            "ospfd",
-            "ospf6d",
-            "bgpd",
-            "ripd",
-            "ripngd",
-            "isisd",
-            "pimd",
-            "ldpd",
-            "pbrd"
-        ]:
+        for fname in FRR_DAEMONS:
             path = os.path.join(frrdir, fname)
             if not os.path.isfile(path):
                 # LDPd is an exception
@@ -1084,7 +1469,11 @@ def diagnose_env_linux():
                 if fname != "zebra":
                     continue
 
-                os.system("{} -v 2>&1 >/tmp/topotests/frr_zebra.txt".format(path))
+                os.system(
+                    "{} -v 2>&1 >{}/frr_zebra.txt".format(
+                        path, topotest.get_logdir_base()
+                    )
+                )
 
     # Assert that Quagga utilities exist
     quaggadir = config.get("topogen", "quaggadir")
@@ -1115,17 +1504,7 @@ def diagnose_env_linux():
         except KeyError:
             logger.warning('could not find "quaggavty" group')
 
-        for fname in [
-            "zebra",
-            "ospfd",
-            "ospf6d",
-            "bgpd",
-            "ripd",
-            "ripngd",
-            "isisd",
-            "pimd",
-            "pbrd"
-        ]:
+        for fname in QUAGGA_DAEMONS:
             path = os.path.join(quaggadir, fname)
             if not os.path.isfile(path):
                 logger.warning("could not find {} in {}".format(fname, quaggadir))
@@ -1134,7 +1513,11 @@ def diagnose_env_linux():
                 if fname != "zebra":
                     continue
 
-                os.system("{} -v 2>&1 >/tmp/topotests/quagga_zebra.txt".format(path))
+                os.system(
+                    "{} -v 2>&1 >{}/quagga_zebra.txt".format(
+                        path, topotest.get_logdir_base()
+                    )
+                )
 
     # Test MPLS availability
     krel = platform.release()
@@ -1166,9 +1549,6 @@ def diagnose_env_linux():
     except:
         logger.warning("failed to find exabgp or returned error")
 
-    # After we logged the output to file, remove the handler.
-    logger.removeHandler(fhandler)
-
     return ret
 
 
@@ -19,6 +19,7 @@
 #
 
 from collections import OrderedDict
+from copy import deepcopy
 from json import dumps as json_dumps
 from re import search as re_search
 import ipaddress
@@ -26,12 +27,17 @@ import pytest
 
 # Import topogen and topotest helpers
 from lib.topolog import logger
+from lib.topogen import Topogen, set_topogen, get_topology_cache, topology_key
 
 # Required to instantiate the topology builder class.
 from lib.common_config import (
     number_to_row,
     number_to_column,
     load_config_to_router,
+    save_initial_config,
+    start_topology,
+    set_topology_globals,
+    reset_config_on_routers,
     create_interfaces_cfg,
     create_static_routes,
     create_prefix_lists,
@@ -192,13 +198,16 @@ def build_topo_from_json(tgen, topo):
             )
 
 
-def build_config_from_json(tgen, topo, save_bkup=True):
+def build_config_from_json(tgen, topo, save_bkup=True, load_config=True):
     """
     Reads initial configuraiton from JSON for each router, builds
     configuration and loads its to router.
 
     * `tgen`: Topogen object
     * `topo`: json file data
+    * `load_config`: when False, the configuration is only saved as the
+      initial configuration (see save_initial_config()), to be applied by
+      reset_config_on_routers()
     """
 
     func_dict = OrderedDict(
@@ -220,9 +229,74 @@ def build_config_from_json(tgen, topo, save_bkup=True):
         func_dict.get(func_type)(tgen, data, build=True)
 
     for router in sorted(topo["routers"].keys()):
+        if not load_config:
+            save_initial_config(tgen, router)
+            continue
+
         logger.debug("Configuring router {}...".format(router))
 
         result = load_config_to_router(tgen, router, save_bkup)
         if not result:
             logger.info("Failed while configuring {}".format(router))
             pytest.exit(1)
+
+
+def apply_topology_shape(built_topo, topo):
+    """
+    Copies the data build_topo_from_json() generated for the topology shape
+    (interface names and addresses) from `built_topo` to `topo`, which must
+    have the same shape (see `topology_key()`). The rest of `topo` (the
+    router configurations) is kept.
+
+    * `built_topo`: json data the running topology was built with
+    * `topo`: json file data
+    """
+
+    for rname, router in topo["routers"].items():
+        built_router = built_topo["routers"][rname]
+        if "nextIfname" in built_router:
+            router["nextIfname"] = built_router["nextIfname"]
+        for peer, link in router.get("links", {}).items():
+            built_link = built_router["links"][peer]
+            for key in ("interface", "ipv4", "ipv6"):
+                if key in built_link:
+                    link[key] = built_link[key]
+
+
+def start_topology_from_json(cls, modname, topo):
+    """
+    Builds the `cls` topology (which builds the `topo` JSON topology with
+    build_topo_from_json()), starts it and loads the JSON configuration.
+    Returns the Topogen object.
+
+    When topology reuse is enabled (see `reuse_topology` in pytest.ini) and
+    the previous test module ran a JSON topology with the same shape (same
+    routers, links and interface addressing), that topology is reused
+    instead: it is handed over to `modname` and the router configurations
+    are replaced by the `topo` JSON configuration.
+
+    * `cls`: topology class
+    * `modname`: test module name
+    * `topo`: json file data
+    """
+
+    cache = get_topology_cache()
+    if cache is not None:
+        key = topology_key(topo)
+        tgen, built_topo = cache.get(key)
+        if tgen is not None:
+            tgen.reuse(modname)
+            set_topogen(tgen)
+            set_topology_globals(tgen)
+            apply_topology_shape(built_topo, topo)
+            build_config_from_json(tgen, topo, load_config=False)
+            reset_config_on_routers(tgen)
+            return tgen
+
+    tgen = Topogen(cls, modname)
+    start_topology(tgen)
+    build_config_from_json(tgen, topo)
+
+    if cache is not None:
+        cache.put(key, tgen, deepcopy(topo))
+    return tgen
@@ -97,6 +97,27 @@ class Logger(object):
             return self.loggers[name]
 
         nlogger = logging.Logger(name, level=log_level)
+        nlogger.addHandler(self._handler(target))
+        self.loggers[name] = nlogger
+        return nlogger
+
+    def set_target(self, name, target):
+        """
+        Makes the logger `name` write to `target` (file name or stream) from
+        now on instead of its previous target. Returns the logger.
+        """
+        if not self.loggers.has_key(name):
+            return self.get_logger(name=name, target=target)
+
+        nlogger = self.loggers[name]
+        for handler in list(nlogger.handlers):
+            nlogger.removeHandler(handler)
+            handler.close()
+        nlogger.addHandler(self._handler(target))
+        return nlogger
+
+    @staticmethod
+    def _handler(target):
         if isinstance(target, str):
             handler = logging.FileHandler(filename=target)
         else:
@@ -105,9 +126,7 @@ class Logger(object):
         handler.setFormatter(
             logging.Formatter(fmt="%(asctime)s %(levelname)s: %(message)s")
         )
-        nlogger.addHandler(handler)
-        self.loggers[name] = nlogger
-        return nlogger
+        return handler
 
 
 #
@@ -36,8 +36,23 @@ import platform
 import difflib
 import time
 import signal
+import select
+import socket
+import hashlib
+import ctypes
+
+from multiprocessing.pool import ThreadPool
 
 from lib.topolog import logger
+from lib import netlink
+from lib import crashinfo
+from lib import probecache
+from lib import telemetry
+from lib import sleepcheck
+from lib.logreader import LogFile
+from lib.logring import parse_size
+# Report helper of the instrumentation modules, for the tests to use too
+from lib.reports import write_json_report  # pylint: disable=W0611
 from copy import deepcopy
 
 if sys.version_info[0] > 2:
@@ -53,33 +68,14 @@ from mininet.cli import CLI
 from mininet.link import Intf
 
 def gdb_core(obj, daemon, corefiles):
-    gdbcmds = '''
-        info threads
-        bt full
-        disassemble
-        up
-        disassemble
-        up
-        disassemble
-        up
-        disassemble
-        up
-        disassemble
-        up
-        disassemble
-    '''
-    gdbcmds = [['-ex', i.strip()] for i in gdbcmds.strip().split('\n')]
-    gdbcmds = [item for sl in gdbcmds for item in sl]
-
-    daemon_path = os.path.join(obj.daemondir, daemon)
-    backtrace = subprocess.check_output(
-        ['gdb', daemon_path, corefiles[0], '--batch'] + gdbcmds
+    "Writes the backtrace of the `daemon` first core file to stderr and returns it."
+    backtrace = crashinfo.core_backtrace(
+        os.path.join(obj.daemondir, daemon), corefiles[0]
     )
     sys.stderr.write(
-        "\n%s: %s crashed. Core file found - Backtrace follows:\n"
-        % (obj.name, daemon)
+        "\n%s: %s crashed. Core file found - Backtrace follows:\n%s"
+        % (obj.name, daemon, backtrace)
     )
-    sys.stderr.write("%s" % backtrace)
     return backtrace
 
 class json_cmp_result(object):
@@ -325,6 +321,217 @@ def router_json_cmp(router, cmd, data, exact=False):
     return json_cmp(router.vtysh_cmd(cmd, isjson=True), data, exact)
 
 
+# JSON keys with values that change over time without any routing change
+# (timers, uptimes, message counters...).
+JSON_VOLATILE_KEYS = re.compile(
+    r"^(.*([Uu]ptime|[Tt]imer|[Tt]ime|Msec|[Ee]poch|[Ee]xpire).*|"
+    r"age|lastReset.*|msgRcvd|msgSent|inq|outq)$"
+)
+
+JSON_KEY_VALUE = re.compile(
+    r'"(?P<key>[^"]+)"\s*:\s*'
+    r'(?P<value>"(?:[^"\\]|\\.)*"|[-+.0-9eE]+|true|false|null)'
+)
+
+
+def json_volatile_strip(text, volatile=JSON_VOLATILE_KEYS):
+    """
+    Strips the values of the `volatile` keys from the JSON `text` without
+    parsing it, so outputs can be cheaply compared (or hashed) to detect
+    changes.
+    """
+
+    def strip(match):
+        if volatile.match(match.group("key")):
+            return '"{}":'.format(match.group("key"))
+        return match.group(0)
+
+    return JSON_KEY_VALUE.sub(strip, text)
+
+
+def router_output_hash(router, cmd, volatile=JSON_VOLATILE_KEYS):
+    """
+    Runs `cmd` (normally a JSON command) in router and returns the tuple
+    (digest, output) where digest is the hash of the output without the
+    `volatile` fields.
+    """
+    output = router.vtysh_cmd(cmd)
+    digest = hashlib.sha1(json_volatile_strip(output, volatile).encode("utf-8"))
+    return (digest.hexdigest(), output)
+
+
+def router_wait_quiescent(
+    router, cmd, stable=3, wait=1, timeout=60, volatile=JSON_VOLATILE_KEYS
+):
+    """
+    Waits for the `cmd` output to become stable: the output is fetched every
+    `wait` seconds and hashed without the `volatile` fields, convergence is
+    declared when the hash didn't change for `stable` intervals.
+
+    Returns (True, output) on convergence or (False, output) after `timeout`
+    seconds, `output` is the last fetched command output.
+    """
+    start_time = time.time()
+    deadline = start_time + timeout
+    last_digest = None
+    same_count = 0
+
+    logger.info(
+        "'{}' quiescence polling started (stable {} x {} secs, maximum wait {} secs)".format(
+            cmd, stable, wait, timeout
+        )
+    )
+
+    while True:
+        digest, output = router_output_hash(router, cmd, volatile)
+        if digest == last_digest:
+            same_count += 1
+        else:
+            last_digest = digest
+            same_count = 0
+
+        if same_count >= stable:
+            logger.info(
+                "'{}' output stable after {:.2f} seconds".format(
+                    cmd, time.time() - start_time
+                )
+            )
+            return (True, output)
+
+        if time.time() + wait > deadline:
+            break
+        time.sleep(wait)
+
+    logger.error(
+        "'{}' output still changing after {:.2f} seconds".format(
+            cmd, time.time() - start_time
+        )
+    )
+    return (False, output)
+
+
+def router_json_cmp_quiescent(
+    router, cmd, data, exact=False, stable=3, wait=1, timeout=60
+):
+    """
+    Like router_json_cmp(), but first waits for the `cmd` output to be
+    stable with router_wait_quiescent() (cheap hash comparisons), then runs
+    the full json_cmp() only once against the last fetched output.
+    """
+    _, output = router_wait_quiescent(router, cmd, stable, wait, timeout)
+    try:
+        output = json.loads(output)
+    except ValueError:
+        logger.warning("router_json_cmp_quiescent: failed to convert json output")
+        output = {}
+    return json_cmp(output, data, exact)
+
+
+JSON_PREFIX_KEY = re.compile(r"^[0-9a-fA-F:.]+/[0-9]{1,3}$")
+
+NARROW_ZEBRA_CMD = re.compile(
+    r"^show (?P<afi>ip|ipv6) route(?: vrf (?P<vrf>\S+))? json$"
+)
+NARROW_BGP_CMD = re.compile(r"^show (?P<ip>ip )?bgp vrf all(?P<args>.*) json$")
+
+
+def json_narrow_cmds(cmd, data):
+    """
+    Plans targeted commands that fetch only the parts of the `cmd` output
+    that the expected `data` refers to:
+
+    * `show ip[v6] route [vrf NAME|all] json` with prefix keys becomes one
+      `show ip[v6] route [vrf NAME] A.B.C.D/M json` per prefix;
+    * `vrf all` commands (zebra routes and `show [ip] bgp vrf all ...`) are
+      split into one command per expected VRF.
+
+    Returns a list of `(command, path, key)` tuples or `None` when the
+    command or the expected data can't be narrowed. The command output is
+    stored in the merged document at `path` (a tuple of keys); when `key` is
+    set only `output[key]` is stored (at `path + (key,)`).
+    """
+    if not isinstance(data, dict) or not data:
+        return None
+
+    match = NARROW_ZEBRA_CMD.match(cmd)
+    if match:
+        afi = match.group("afi")
+        vrf = match.group("vrf")
+
+        def _vrf_cmds(vrf, prefixes, path):
+            if vrf is None or vrf == "default":
+                base = "show {} route".format(afi)
+            else:
+                base = "show {} route vrf {}".format(afi, vrf)
+            if isinstance(prefixes, dict) and prefixes and all(
+                JSON_PREFIX_KEY.match(key) for key in prefixes
+            ):
+                return [
+                    ("{} {} json".format(base, prefix), path, prefix)
+                    for prefix in sorted(prefixes)
+                ]
+            return [("{} json".format(base), path, None)]
+
+        if vrf != "all":
+            if not all(JSON_PREFIX_KEY.match(key) for key in data):
+                return None
+            return _vrf_cmds(vrf, data, ())
+
+        plan = []
+        for name in sorted(data):
+            plan.extend(_vrf_cmds(name, data[name], (name,)))
+        return plan
+
+    # BGP table outputs are only split per VRF: the per prefix commands
+    # (`show bgp ipv4 unicast X json`) have a different (detailed) format.
+    match = NARROW_BGP_CMD.match(cmd)
+    if match:
+        base = "show {}bgp".format(match.group("ip") or "")
+        return [
+            ("{} vrf {}{} json".format(base, name, match.group("args")), (name,), None)
+            for name in sorted(data)
+        ]
+
+    return None
+
+
+def json_narrow_merge(results):
+    """
+    Merges the `(path, key, output)` results of the commands planned by
+    json_narrow_cmds() in a single document with the original command shape.
+    """
+    merged = {}
+    for path, key, output in results:
+        node = merged
+        for name in path[:-1] if key is None else path:
+            node = node.setdefault(name, {})
+        if key is not None:
+            if isinstance(output, dict) and key in output:
+                node[key] = output[key]
+        elif path:
+            node[path[-1]] = output
+        elif isinstance(output, dict):
+            node.update(output)
+    return merged
+
+
+def router_json_cmp_narrow(router, cmd, data, exact=False):
+    """
+    Like router_json_cmp(), but instead of fetching the whole `cmd` output
+    (e.g. the full RIB) only asks for the prefixes and VRFs present in
+    `data` (see json_narrow_cmds()). Falls back to router_json_cmp() when
+    the command can't be narrowed or when `exact` is set.
+    """
+    plan = None if exact else json_narrow_cmds(cmd, data)
+    if plan is None:
+        return router_json_cmp(router, cmd, data, exact)
+
+    results = [
+        (path, key, router.vtysh_cmd(subcmd, isjson=True)) for subcmd, path, key in plan
+    ]
+    return json_cmp(json_narrow_merge(results), data, exact)
+
+
 def run_and_expect(func, what, count=20, wait=3):
     """
     Run `func` and compare the result with `what`. Do it for `count` times
@@ -353,8 +560,14 @@ def run_and_expect(func, what, count=20, wait=3):
         )
     )
 
+    checks = 0
+    check_time = 0.0
+    token = sleepcheck.wait_started(lambda: func() == what)
     while count > 0:
+        check_start = time.time()
         result = func()
+        checks += 1
+        check_time += time.time() - check_start
         if result != what:
             time.sleep(wait)
             count -= 1
@@ -366,12 +579,20 @@ def run_and_expect(func, what, count=20, wait=3):
                 func_name, end_time - start_time
             )
         )
+        telemetry.record_wait(
+            "run_and_expect", func_name, True, end_time - start_time, checks, check_time
+        )
+        sleepcheck.wait_done(token, True, checks)
         return (True, result)
 
     end_time = time.time()
     logger.error(
         "'{}' failed after {:.2f} seconds".format(func_name, end_time - start_time)
     )
+    telemetry.record_wait(
+        "run_and_expect", func_name, False, end_time - start_time, checks, check_time
+    )
+    sleepcheck.wait_done(token, False, checks)
     return (False, result)
 
 
@@ -400,8 +621,13 @@ def run_and_expect_type(func, etype, count=20, wait=3, avalue=None):
         )
     )
 
+    checks = 0
+    check_time = 0.0
     while count > 0:
+        check_start = time.time()
         result = func()
+        checks += 1
+        check_time += time.time() - check_start
         if not isinstance(result, etype):
             logger.debug(
                 "Expected result type '{}' got '{}' instead".format(etype, type(result))
@@ -422,15 +648,285 @@ def run_and_expect_type(func, etype, count=20, wait=3, avalue=None):
                 func_name, end_time - start_time
             )
         )
+        telemetry.record_wait(
+            "run_and_expect_type",
+            func_name,
+            True,
+            end_time - start_time,
+            checks,
+            check_time,
+        )
         return (True, result)
 
     end_time = time.time()
     logger.error(
         "'{}' failed after {:.2f} seconds".format(func_name, end_time - start_time)
     )
+    telemetry.record_wait(
+        "run_and_expect_type",
+        func_name,
+        False,
+        end_time - start_time,
+        checks,
+        check_time,
+    )
     return (False, result)
 
 
+def run_and_expect_multi(
+    checks, what=None, timeout=60, wait=0.5, max_wait=5, max_workers=16
+):
+    """
+    Run many conditions concurrently until all of them return `what` or
+    `timeout` seconds pass. Conditions are dropped from the polling as soon
+    as they succeed. The interval between rounds starts at `wait` seconds
+    (at least 0.1) and grows up to `max_wait` while no condition makes
+    progress.
+
+    * `checks`: dictionary with the condition name (e.g. the router name)
+      as key and the function to run as value, or a list of (name, function)
+      tuples.
+
+    Returns (True, report) on success or (False, report) on failure. The
+    report is a dictionary keyed by condition name with:
+    * `success`: whether the condition succeeded
+    * `time`: seconds until success (`None` if it didn't succeed)
+    * `result`: the last function return value
+
+    Example:
+
+    ```py
+    checks = dict(
+        (rname, functools.partial(router_json_cmp, router, cmd, expected))
+        for rname, router in tgen.routers().iteritems()
+    )
+    success, report = run_and_expect_multi(checks, None, timeout=120)
+    assert success, "routers did not converge: {}".format(report)
+    ```
+    """
+    if isinstance(checks, dict):
+        checks = checks.items()
+    # A zero interval would never back off
+    wait = max(wait, 0.1)
+
+    start_time = time.time()
+    deadline = start_time + timeout
+    pending = dict(checks)
+    report = dict(
+        (name, {"success": False, "time": None, "result": None}) for name in pending
+    )
+
+    logger.info(
+        "polling {} conditions (interval {}-{} secs, maximum wait {} secs)".format(
+            len(pending), wait, max_wait, timeout
+        )
+    )
+
+    pool = ThreadPool(max(min(max_workers, len(pending)), 1))
+    interval = wait
+    rounds = 0
+    check_time = 0.0
+    try:
+        while pending:
+            names = sorted(pending.keys())
+            check_start = time.time()
+            results = pool.map(lambda name: pending[name](), names)
+            now = time.time()
+            rounds += 1
+            check_time += now - check_start
+
+            progress = False
+            for name, result in zip(names, results):
+                report[name]["result"] = result
+                if result != what:
+                    continue
+
+                report[name]["success"] = True
+                report[name]["time"] = now - start_time
+                del pending[name]
+                progress = True
+
+            if not pending or now >= deadline:
+                break
+
+            # Back off while nothing converges, poll fast again otherwise
+            if progress:
+                interval = wait
+            else:
+                interval = min(interval * 2, max_wait)
+            time.sleep(min(interval, deadline - now))
+    finally:
+        pool.close()
+        pool.join()
+
+    elapsed = time.time() - start_time
+    telemetry.record_wait(
+        "run_and_expect_multi",
+        ",".join(sorted(report)),
+        not pending,
+        elapsed,
+        rounds,
+        check_time,
+    )
+    if pending:
+        logger.error(
+            "{} of {} conditions failed after {:.2f} seconds: {}".format(
+                len(pending), len(report), elapsed, ", ".join(sorted(pending))
+            )
+        )
+        return (False, report)
+
+    logger.info(
+        "all {} conditions succeeded after {:.2f} seconds".format(len(report), elapsed)
+    )
+    return (True, report)
+
+
+#
+# Condition waits
+#
+# Cheap alternatives to fixed sleeps: they poll a narrow condition and return
+# as soon as it holds. All of them return `True` on success or `False` if the
+# condition didn't hold in `timeout` seconds.
+#
+
+
+def _wait_condition(func, timeout, interval):
+    "Polls `func` until it returns `True` or `timeout` seconds pass."
+    count = max(int(timeout / interval), 1)
+    success, _ = run_and_expect(func, True, count=count, wait=interval)
+    return success
+
+
+def wait_for_vty(router, daemons=None, timeout=30, interval=0.1):
+    """
+    Waits until the vty of `daemons` (list of daemon names, defaults to all
+    enabled router daemons) is answering commands.
+
+    * `router`: TopoRouter object
+    """
+    if daemons is None:
+        daemons = router.enabled_daemons()
+
+    def vty_ready():
+        return all(router.vty_ready(daemon) for daemon in daemons)
+
+    return _wait_condition(vty_ready, timeout, interval)
+
+
+def bgp_peer_state(router, peer, vrf=None):
+    "Returns the BGP state of `peer` or `None` if it doesn't exist."
+    if vrf is None:
+        cmd = "show bgp neighbors {} json".format(peer)
+    else:
+        cmd = "show bgp vrf {} neighbors {} json".format(vrf, peer)
+
+    output = router.vtysh_cmd(cmd, isjson=True)
+    return output.get(peer, {}).get("bgpState")
+
+
+def wait_for_bgp_peer_state(
+    router, peer, state="Established", vrf=None, timeout=60, interval=0.5
+):
+    """
+    Waits until the BGP neighbor `peer` reaches `state` (e.g. 'Established'
+    or 'Idle').
+
+    * `router`: TopoRouter object
+    * `peer`: neighbor address or interface name
+    * `vrf`: (optional) VRF name
+    """
+
+    def peer_in_state():
+        return bgp_peer_state(router, peer, vrf) == state
+
+    return _wait_condition(peer_in_state, timeout, interval)
+
+
+def route_present(router, prefix, vrf=None, fib=False):
+    """
+    Returns `True` if `prefix` is in the zebra RIB (selected) and, when
+    `fib` is set, installed in the kernel as well.
+    """
+    family = "ipv6" if ":" in prefix else "ip"
+    if vrf is None:
+        cmd = "show {} route {} json".format(family, prefix)
+    else:
+        cmd = "show {} route vrf {} {} json".format(family, vrf, prefix)
+
+    for route in router.vtysh_cmd(cmd, isjson=True).get(prefix, []):
+        if not route.get("selected"):
+            continue
+        if fib and not route.get("installed"):
+            continue
+        return True
+    return False
+
+
+def wait_for_route(router, prefix, vrf=None, fib=False, timeout=60, interval=0.5):
+    """
+    Waits until `prefix` (e.g. '10.0.0.0/24') is selected in the RIB and,
+    when `fib` is set, also installed in the FIB.
+
+    * `router`: TopoRouter object
+    * `vrf`: (optional) VRF name
+    """
+    return _wait_condition(
+        lambda: route_present(router, prefix, vrf, fib), timeout, interval
+    )
+
+
+def interface_oper_up(router, ifname):
+    "Returns `True` if interface `ifname` is administratively and operationally up."
+    output = router.run("ip -o link show dev {} 2>/dev/null".format(ifname))
+    flags = re.search(r"<([^>]*)>", output)
+    if flags is None:
+        return False
+
+    flags = flags.group(1).split(",")
+    return "UP" in flags and "LOWER_UP" in flags
+
+
+def wait_for_interface_up(router, ifname, timeout=30, interval=0.2):
+    """
+    Waits until interface `ifname` is operationally up.
+
+    * `router`: TopoRouter object
+    """
+    return _wait_condition(lambda: interface_oper_up(router, ifname), timeout, interval)
+
+
+def kernel_monitor(node, routes=True, links=True, rules=True, prefixes=None):
+    """
+    Returns a netlink.RtnlMonitor following the kernel routes, links and
+    rules of `node`. Unlike polling `ip route`, RtnlMonitor.wait() wakes up
+    as soon as the kernel notifies the change. Routes are only counted,
+    except those of the watched `prefixes`.
+
+    Usage example:
+
+        with topotest.kernel_monitor(router) as kernel:
+            router.vtysh_cmd('sharp install routes 10.0.0.0 nexthop 192.168.1.1 1000')
+            assert kernel.wait(lambda mon: mon.route_count(protocol=194) == 1000)
+    """
+    return netlink.RtnlMonitor(node_pid(node), routes, links, rules, prefixes=prefixes)
+
+
+def wait_for_kernel_routes(
+    router, count, protocol=None, family=None, table=None, timeout=60
+):
+    """
+    Waits until the `router` kernel has exactly `count` routes (optionally
+    only of `protocol` number or name, `family` and `table`).
+    """
+    protocol = _proto_number(protocol)
+    table = netlink.table_number(table)
+    with kernel_monitor(router, links=False, rules=False) as kernel:
+        return kernel.wait(
+            lambda mon: mon.route_count(family, table, protocol) == count, timeout
+        )
+
+
 def int2dpid(dpid):
     "Converting Integer to DPID"
 
@@ -472,6 +968,195 @@ def pid_exists(pid):
         return True
 
 
+def pid_running(pid):
+    """
+    Check whether pid is running. Unlike pid_exists() zombie processes are
+    reported as not running, since they already exited.
+    """
+    try:
+        with open("/proc/{}/stat".format(pid), "r") as stat_file:
+            stat = stat_file.read()
+    except IOError:
+        # No procfs available (e.g. FreeBSD): fallback to signal probing.
+        if not os.path.isdir("/proc/self"):
+            return pid_exists(pid)
+        return False
+
+    # The process state comes right after the command name: 'pid (comm) S'
+    return stat[stat.rfind(")") + 2] not in ("Z", "X")
+
+
+# pidfd_open() system call number: 434 since the syscall table unification
+# in Linux 5.3, except on the architectures with their own offset. MIPS
+# numbers depend on the ABI: `/proc` is polled there instead.
+SYS_PIDFD_OPEN = 434
+SYS_PIDFD_OPEN_ARCH = {"alpha": 544, "ia64": 1458}
+SYS_PIDFD_OPEN_UNKNOWN = ("mips",)
+
+
+def pidfd_open_number(machine=None):
+    "Returns the pidfd_open() system call number of `machine`, or `None`."
+    if machine is None:
+        machine = platform.machine()
+    if machine.startswith(SYS_PIDFD_OPEN_UNKNOWN):
+        return None
+    for arch, number in SYS_PIDFD_OPEN_ARCH.items():
+        if machine.startswith(arch):
+            return number
+    return SYS_PIDFD_OPEN
+
+
+def pidfd_open(pid):
+    """
+    Returns a file descriptor referring to the process `pid` which becomes
+    readable once the process exits, or `None` if the running kernel doesn't
+    support pidfds.
+    """
+    number = pidfd_open_number()
+    if not sys.platform.startswith("linux") or number is None:
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.syscall(number, ctypes.c_int(pid), ctypes.c_uint(0))
+    except (OSError, AttributeError):
+        return None
+
+    if fd < 0:
+        return None
+    return fd
+
+
+def wait_pids_exit(deadlines, kill_wait=5):
+    """
+    Waits for the processes in `deadlines` to exit. `deadlines` is a
+    dictionary with the pid as key and the time (as returned by time.time())
+    until which the process is allowed to exit gracefully as value.
+
+    Every process that is still running after its own deadline is sent a
+    SIGKILL and waited for another `kill_wait` seconds.
+
+    The waiting is done on pidfds when the kernel supports them, otherwise
+    `/proc` is polled, so no shell is involved.
+
+    Returns the list of pids that had to be killed.
+    """
+    deadlines = dict(deadlines)
+    pending = set(deadlines.keys())
+    killed = []
+
+    pidfds = {}
+    poller = select.poll()
+    for pid in pending:
+        fd = pidfd_open(pid)
+        if fd is not None:
+            pidfds[pid] = fd
+            poller.register(fd, select.POLLIN)
+
+    try:
+        while pending:
+            for pid in [pid for pid in pending if not pid_running(pid)]:
+                pending.discard(pid)
+                if pid in pidfds:
+                    poller.unregister(pidfds[pid])
+
+            now = time.time()
+            for pid in sorted(pending):
+                if deadlines[pid] > now:
+                    continue
+
+                if pid in killed:
+                    logger.error("pid {} survived SIGKILL".format(pid))
+                    pending.discard(pid)
+                    continue
+
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError as err:
+                    if err.errno != errno.ESRCH:
+                        raise
+                killed.append(pid)
+                deadlines[pid] = now + kill_wait
+
+            if not pending:
+                break
+
+            timeout = min(deadlines[pid] for pid in pending) - now
+            # Processes without pidfd have to be polled through /proc
+            if [pid for pid in pending if pid not in pidfds]:
+                timeout = min(timeout, 0.05)
+            poller.poll(max(timeout, 0) * 1000)
+    finally:
+        for fd in pidfds.values():
+            os.close(fd)
+
+    return killed
+
+
+def get_worker_id():
+    """
+    Returns the pytest-xdist worker id (e.g. `gw0`) or `None` when the tests
+    are not running in parallel.
+    """
+    return os.environ.get("PYTEST_XDIST_WORKER")
+
+
+def get_logdir_base():
+    """
+    Returns the base directory for logs and temporary files: `/tmp/topotests`
+    or, when running with pytest-xdist, `/tmp/topotests/<worker id>` so the
+    workers don't share files.
+    """
+    worker = get_worker_id()
+    if worker is None:
+        return "/tmp/topotests"
+    return os.path.join("/tmp/topotests", worker)
+
+
+def worker_node_name(name):
+    """
+    Returns `name` prefixed with the pytest-xdist worker id (e.g. `gw0-s1`).
+    Used for the nodes living in the host network namespace (switches and
+    their interfaces), whose names must be unique among all workers.
+    """
+    worker = get_worker_id()
+    if worker is None:
+        return name
+    return "{}-{}".format(worker, name)
+
+
+def mininet_cleanup():
+    """
+    Cleans up the mininet environment (`mn -c`). Does nothing when running
+    with pytest-xdist: it would remove the topologies of the other workers.
+    """
+    if get_worker_id() is not None:
+        return
+    os.system("mn -c > /dev/null 2>&1")
+
+
+def run_parallel(func, args_list, max_workers=None):
+    """
+    Runs `func` once for every argument tuple in `args_list` in a pool of
+    threads and returns the results in the same order of `args_list`.
+
+    The first exception raised by `func` is re-raised after all calls are
+    done.
+    """
+    if not args_list:
+        return []
+
+    if max_workers is None:
+        max_workers = len(args_list)
+
+    pool = ThreadPool(min(max_workers, len(args_list)))
+    try:
+        return pool.map(lambda args: func(*args), args_list)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def get_textdiff(text1, text2, title1="", title2="", **opts):
     "Returns empty string if same or formatted diff"
 
@@ -516,15 +1201,24 @@ def normalize_text(text):
     return text
 
 
+# Updated by depmod when modules are installed or removed
+MODULES_DEP = "/lib/modules/{}/modules.dep"
+
+
+def module_loaded_linux(module):
+    "Returns whether `module` is loaded."
+    with open("/proc/modules", "r") as modules_file:
+        return module.replace("-", "_") in modules_file.read()
+
+
 def module_present_linux(module, load):
     """
     Returns whether `module` is present.
 
     If `load` is true, it will try to load it via modprobe.
     """
-    with open("/proc/modules", "r") as modules_file:
-        if module.replace("-", "_") in modules_file.read():
-            return True
+    if module_loaded_linux(module):
+        return True
     cmd = "/sbin/modprobe {}{}".format("" if load else "-n ", module)
     if os.system(cmd) != 0:
         return False
@@ -537,12 +1231,52 @@ def module_present_freebsd(module, load):
 
 
 def module_present(module, load=True):
+    """
+    Returns whether the kernel `module` is present (see
+    `module_present_linux()`). The result is cached until the installed
+    modules change or the next reboot (see lib/probecache.py), except that
+    a module to load is looked for in /proc/modules first: it may have been
+    removed since.
+    """
     if sys.platform.startswith("linux"):
-        return module_present_linux(module, load)
+        if load and module_loaded_linux(module):
+            return True
+        return probecache.cached(
+            "module_present {} {}".format(module, load),
+            [probecache.file_stamp(MODULES_DEP.format(platform.release()))],
+            lambda: module_present_linux(module, load),
+            # Not loaded: a cached success would skip modprobe
+            keep=(lambda present: not present) if load else None,
+        )
     elif sys.platform.startswith("freebsd"):
         return module_present_freebsd(module, load)
 
 
+def daemon_version(daemon_path):
+    """
+    Returns the version reported by `daemon_path -v` or `None`. The result is
+    cached until the binary changes (see lib/probecache.py).
+    """
+
+    def _version():
+        try:
+            output = subprocess.check_output(
+                [daemon_path, "-v"], stderr=subprocess.STDOUT
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        if sys.version_info[0] > 2:
+            output = output.decode("utf-8", "replace")
+        fields = output.split()
+        if len(fields) < 3:
+            return None
+        return fields[2]
+
+    return probecache.cached(
+        "daemon_version", [probecache.file_stamp(daemon_path)], _version
+    )
+
+
 def version_cmp(v1, v2):
     """
     Compare two version strings and returns:
@@ -551,8 +1285,12 @@ def version_cmp(v1, v2):
     * `0`: if `v1` is equal to `v2`
     * `1`: if `v1` is greater than `v2`
 
-    Raises `ValueError` if versions are not well formated.
+    Raises `ValueError` if versions are not well formated or unknown (`None`,
+    e.g. when daemon_version() failed).
     """
+    if v1 is None or v2 is None:
+        raise ValueError("got an unknown version (None)")
+
     vregex = r"(?P<whole>\d+(\.(\d+))*)"
     v1m = re.match(vregex, v1)
     v2m = re.match(vregex, v2)
@@ -680,11 +1418,107 @@ def proto_name_to_number(protocol):
     )  # default return same as input
 
 
-def ip4_route(node):
+def node_pid(node):
+    """
+    Returns the pid of the `node` shell process (the process that owns the
+    node namespaces). Accepts topogen gears and mininet nodes.
+    """
+    pid = getattr(node, "pid", None)
+    if pid is None:
+        pid = node.tgen.net[node.name].pid
+    return pid
+
+
+def _proto_number(protocol):
+    "Converts a route protocol name (FRR or iproute2) or number to a number."
+    if protocol is None:
+        return None
+    protocol = str(proto_name_to_number(protocol))
+    if protocol.isdigit():
+        return int(protocol)
+    for number, name in netlink.RT_PROTOS.items():
+        if name == protocol:
+            return number
+    raise ValueError("unknown route protocol: {}".format(protocol))
+
+
+def _proto_str(protocol):
+    # FRR protocols are reported by number, like ip4_route() always did
+    if 186 <= protocol <= 196:
+        return str(protocol)
+    return netlink.RT_PROTOS.get(protocol, str(protocol))
+
+
+def _prefix_str(family, address, plen):
+    "Formats a prefix like iproute2: `default`, host address or prefix."
+    if plen == 0:
+        return "default"
+    if address is None:
+        address = b"\0" * (4 if family == socket.AF_INET else 16)
+    text = netlink.attr_addr(family, address)
+    if plen == len(address) * 8:
+        return text
+    return "{}/{}".format(text, plen)
+
+
+def _ip_route(node, family, table, protocol, prefix):
+    pid = node_pid(node)
+    with netlink.RtnlSocket(pid) as sock:
+        ifnames = netlink.links(sock=sock)
+        result = {}
+        for route in netlink.routes(
+            pid,
+            family,
+            netlink.table_number(table),
+            _proto_number(protocol),
+            prefix,
+            sock=sock,
+        ):
+            entry = {}
+            if route["oif"] is not None:
+                entry["dev"] = ifnames.get(route["oif"], str(route["oif"]))
+            if route["gateway"] is not None:
+                entry["via"] = netlink.attr_addr(family, route["gateway"])
+            # iproute2 doesn't show the default protocol
+            if route["protocol"] != 3:
+                entry["proto"] = _proto_str(route["protocol"])
+            if route["priority"] is not None:
+                entry["metric"] = str(route["priority"])
+            if family == socket.AF_INET and route["scope"] != 0:
+                entry["scope"] = netlink.RT_SCOPES.get(
+                    route["scope"], str(route["scope"])
+                )
+            if family == socket.AF_INET6 and route["pref"] is not None:
+                entry["pref"] = netlink.RT_PREFS.get(route["pref"], str(route["pref"]))
+            if route["type"] != 1:
+                entry["type"] = netlink.RT_TYPES.get(route["type"], str(route["type"]))
+            if route["multipath"] is not None:
+                entry["nexthops"] = []
+                for nexthop in route["multipath"]:
+                    hop = {
+                        "dev": ifnames.get(nexthop["oif"], str(nexthop["oif"])),
+                        "weight": str(nexthop["weight"]),
+                    }
+                    if nexthop["gateway"] is not None:
+                        hop["via"] = netlink.attr_addr(family, nexthop["gateway"])
+                    entry["nexthops"].append(hop)
+            key = _prefix_str(family, route["dst"], route["dst_len"])
+            result[key] = entry
+
+    return result
+
+
+def ip4_route(node, table=None, protocol=None, prefix=None):
     """
     Gets a structured return of the command 'ip route'. It can be used in
     conjuction with json_cmp() to provide accurate assert explanations.
 
+    The routes are dumped with rtnetlink from the node namespace. Optional
+    filters:
+    * `table`: table number or name (defaults to `main`, `all` for all tables);
+    * `protocol`: protocol number or name (e.g. `194` or `sharp`);
+    * `prefix`: only this exact prefix (e.g. `10.0.1.0/24`).
+
     Return example:
     {
         '10.0.1.0/24': {
@@ -698,34 +1532,16 @@ def ip4_route(node):
         }
     }
     """
-    output = normalize_text(node.run("ip route")).splitlines()
-    result = {}
-    for line in output:
-        columns = line.split(" ")
-        route = result[columns[0]] = {}
-        prev = None
-        for column in columns:
-            if prev == "dev":
-                route["dev"] = column
-            if prev == "via":
-                route["via"] = column
-            if prev == "proto":
-                # translate protocol names back to numbers
-                route["proto"] = proto_name_to_number(column)
-            if prev == "metric":
-                route["metric"] = column
-            if prev == "scope":
-                route["scope"] = column
-            prev = column
-
-    return result
+    return _ip_route(node, socket.AF_INET, table, protocol, prefix)
 
 
-def ip6_route(node):
+def ip6_route(node, table=None, protocol=None, prefix=None):
     """
     Gets a structured return of the command 'ip -6 route'. It can be used in
     conjuction with json_cmp() to provide accurate assert explanations.
 
+    Accepts the same filters as ip4_route().
+
     Return example:
     {
         '2001:db8:1::/64': {
@@ -738,34 +1554,17 @@ def ip6_route(node):
         }
     }
     """
-    output = normalize_text(node.run("ip -6 route")).splitlines()
-    result = {}
-    for line in output:
-        columns = line.split(" ")
-        route = result[columns[0]] = {}
-        prev = None
-        for column in columns:
-            if prev == "dev":
-                route["dev"] = column
-            if prev == "via":
-                route["via"] = column
-            if prev == "proto":
-                # translate protocol names back to numbers
-                route["proto"] = proto_name_to_number(column)
-            if prev == "metric":
-                route["metric"] = column
-            if prev == "pref":
-                route["pref"] = column
-            prev = column
-
-    return result
+    return _ip_route(node, socket.AF_INET6, table, protocol, prefix)
 
 
-def ip_rules(node):
+def ip_rules(node, table=None, protocol=None):
     """
     Gets a structured return of the command 'ip rule'. It can be used in
     conjuction with json_cmp() to provide accurate assert explanations.
 
+    The rules are dumped with rtnetlink from the node namespace, they can be
+    filtered by `table` (number or name) and `protocol`.
+
     Return example:
     [
         {
@@ -785,28 +1584,34 @@ def ip_rules(node):
         }
     ]
     """
-    output = normalize_text(node.run("ip rule")).splitlines()
+    family = socket.AF_INET
+    table = None if table is None else netlink.table_number(table)
+    protocol = _proto_number(protocol)
     result = []
-    for line in output:
-        columns = line.split(" ")
-
-        route = {}
-        # remove last character, since it is ':'
-        pref = columns[0][:-1]
-        route["pref"] = pref
-        prev = None
-        for column in columns:
-            if prev == "from":
-                route["from"] = column
-            if prev == "to":
-                route["to"] = column
-            if prev == "proto":
-                route["proto"] = column
-            if prev == "iif":
-                route["iif"] = column
-            if prev == "fwmark":
-                route["fwmark"] = column
-            prev = column
+    for rule in netlink.rules(node_pid(node), family):
+        if table is not None and rule["table"] != table:
+            continue
+        if protocol is not None and rule["protocol"] != protocol:
+            continue
+
+        route = {"pref": str(rule["priority"])}
+        if rule["src"] is not None:
+            route["from"] = _prefix_str(family, rule["src"], rule["src_len"])
+        else:
+            route["from"] = "all"
+        if rule["dst"] is not None:
+            route["to"] = _prefix_str(family, rule["dst"], rule["dst_len"])
+        # iproute2 doesn't show the unspec and kernel protocols
+        if rule["protocol"] not in (None, 0, 2):
+            route["proto"] = netlink.RT_PROTOS.get(
+                rule["protocol"], str(rule["protocol"])
+            )
+        if rule["iifname"] is not None:
+            route["iif"] = rule["iifname"]
+        if rule["fwmark"] is not None:
+            route["fwmark"] = "0x{:x}".format(rule["fwmark"])
+            if rule["fwmask"] not in (None, 0xFFFFFFFF):
+                route["fwmark"] += "/0x{:x}".format(rule["fwmask"])
 
         result.append(route)
     return result
@@ -821,6 +1626,7 @@ def sleep(amount, reason=None):
     else:
         logger.info(reason + " ({} seconds)".format(amount))
 
+    telemetry.record_sleep(amount)
     time.sleep(amount)
 
 
@@ -917,6 +1723,7 @@ class Router(Node):
                 "quaggadir": "/usr/lib/quagga",
                 "routertype": "frr",
                 "memleak_path": None,
+                "log_ring_size": None,
             }
         )
         self.config_defaults.read(
@@ -927,15 +1734,15 @@ class Router(Node):
         # specified, then attempt to generate an unique logdir.
         if self.logdir is None:
             cur_test = os.environ["PYTEST_CURRENT_TEST"]
-            self.logdir = "/tmp/topotests/" + cur_test[
-                0 : cur_test.find(".py")
-            ].replace("/", ".")
+            self.logdir = os.path.join(
+                get_logdir_base(), cur_test[0 : cur_test.find(".py")].replace("/", ".")
+            )
 
         # If the logdir is not created, then create it and set the
         # appropriated permissions.
         if not os.path.isdir(self.logdir):
             os.system("mkdir -p " + self.logdir + "/" + name)
-            os.system("chmod -R go+rw /tmp/topotests")
+            os.system("chmod -R go+rw " + get_logdir_base())
 
         self.daemondir = None
         self.hasmpls = False
@@ -960,7 +1767,20 @@ class Router(Node):
         }
         self.daemons_options = {"zebra": ""}
         self.reportCores = True
+        # Cores, leaks and sanitizer errors found (see checkRouterCores)
+        self.crashReport = crashinfo.CrashReport()
         self.version = None
+        # Pending graceful stop deadlines (key is the daemon pid)
+        self.stopDeadlines = {}
+        # (daemon, log): LogFile
+        self.logFiles = {}
+        # Daemon output ring buffer size (None to write everything to disk)
+        self.logRingSize = parse_size(
+            os.environ.get("TOPOTESTS_LOG_RING")
+            or self.config_defaults.get("topogen", "log_ring_size")
+        )
+        # daemon: logring.py process pid
+        self.logRingPids = {}
 
     def _config_frr(self, **params):
         "Configure FRR binaries"
@@ -1023,80 +1843,178 @@ class Router(Node):
         set_sysctl(self, "net.ipv4.ip_forward", 0)
         set_sysctl(self, "net.ipv6.conf.all.forwarding", 0)
         super(Router, self).terminate()
-        os.system("chmod -R go+rw /tmp/topotests")
+        os.system("chmod -R go+rw " + get_logdir_base())
+
+    def getDaemonPids(self):
+        """
+        Returns a dictionary with the daemons that have a pidfile (key is the
+        daemon name and value is the pid).
+
+        The pidfiles are read directly through the router shell mount
+        namespace (see readDaemonPidfiles()) to avoid shell round trips, the
+        router shell is only used as a fallback.
+        """
+        pids = self.readDaemonPidfiles()
+        if pids is not None:
+            return pids
+
+        pids = {}
+        output = self.cmd("grep -H . /var/run/%s/*.pid 2>/dev/null" % self.routertype)
+        for line in output.splitlines():
+            pidfile, _, daemonpid = line.strip().partition(":")
+            if daemonpid.isdigit():
+                daemonname = os.path.basename(pidfile).rsplit(".", 1)[0]
+                pids[daemonname] = int(daemonpid)
+        return pids
+
+    def readDaemonPidfiles(self):
+        """
+        Returns the daemon pids like getDaemonPids(), read from the pidfiles
+        through the router shell mount namespace (`/proc/<pid>/root`), or
+        `None` when they can't be reached that way. Never uses the router
+        shell, so it is safe to call from other threads.
+        """
+        rundir = "/proc/{}/root/var/run/{}".format(self.pid, self.routertype)
+        if not os.path.isdir(rundir):
+            return None
+
+        pids = {}
+        for pidfile in glob.glob(os.path.join(rundir, "*.pid")):
+            try:
+                with open(pidfile, "r") as pfile:
+                    daemonpid = pfile.read().strip()
+            except IOError:
+                continue
+            if daemonpid.isdigit():
+                daemonname = os.path.basename(pidfile).rsplit(".", 1)[0]
+                pids[daemonname] = int(daemonpid)
+        return pids
+
+    def daemonVtyReady(self, daemon, timeout=1):
+        """
+        Returns `True` if the daemon vty socket accepts connections and
+        answers commands.
+
+        The socket is reached through the router shell mount namespace
+        (`/proc/<pid>/root`), so no vtysh process is spawned.
+        """
+        path = "/proc/{}/root/var/run/{}/{}.vty".format(
+            self.pid, self.routertype, daemon
+        )
+        if not os.path.exists(path):
+            if os.path.isdir("/proc/{}/root".format(self.pid)):
+                return False
+            # No procfs: fallback to vtysh in the router shell
+            output = self.cmd(
+                'vtysh -d {} -c "show version" 2>/dev/null'.format(daemon)
+            )
+            return len(output.strip()) > 0
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path)
+            sock.sendall(b"show version\0")
+            # Command output is terminated by three NUL bytes and a status
+            # byte.
+            data = b""
+            while data.find(b"\0\0\0") == -1:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    return False
+                data += chunk
+            return True
+        except (socket.error, socket.timeout):
+            return False
+        finally:
+            sock.close()
+
+    def removeDaemonPidfile(self, daemon):
+        "Removes the daemon pidfile after it was forcefully killed."
+        self.cmd("rm -f -- /var/run/{}/{}.pid".format(self.routertype, daemon))
 
     # Return count of running daemons
     def listDaemons(self):
-        ret = []
-        rundaemons = self.cmd("ls -1 /var/run/%s/*.pid" % self.routertype)
-        errors = ""
-        if re.search(r"No such file or directory", rundaemons):
+        pids = self.getDaemonPids()
+        if not pids:
             return 0
-        if rundaemons is not None:
-            for d in StringIO.StringIO(rundaemons):
-                daemonpid = self.cmd("cat %s" % d.rstrip()).rstrip()
-                if daemonpid.isdigit() and pid_exists(int(daemonpid)):
-                    ret.append(os.path.basename(d.rstrip().rsplit(".", 1)[0]))
-        return ret
+        return [daemon for daemon, daemonpid in pids.items() if pid_running(daemonpid)]
+
+    def signalDaemons(self, timeout=10):
+        """
+        Sends SIGTERM to all running daemons without waiting for them.
+        Daemons that were already signaled are not signaled again, so the
+        deadline (`timeout` seconds after the first signal) is kept per
+        process.
+
+        Returns `None` if there are no pidfiles, otherwise a dictionary with
+        the daemon name as key and the (pid, deadline) tuple as value.
+        """
+        pids = self.getDaemonPids()
+        if not pids:
+            return None
+
+        signaled = {}
+        for daemonname, daemonpid in pids.items():
+            if not pid_running(daemonpid):
+                self.stopDeadlines.pop(daemonpid, None)
+                continue
+
+            if daemonpid not in self.stopDeadlines:
+                logger.info("{}: stopping {}".format(self.name, daemonname))
+                try:
+                    os.kill(daemonpid, signal.SIGTERM)
+                except OSError as err:
+                    if err.errno == errno.ESRCH:
+                        logger.error(
+                            "{}: {} left a dead pidfile (pid={})".format(
+                                self.name, daemonname, daemonpid
+                            )
+                        )
+                        continue
+                    logger.info(
+                        "{}: {} could not kill pid {}: {}".format(
+                            self.name, daemonname, daemonpid, str(err)
+                        )
+                    )
+                self.stopDeadlines[daemonpid] = time.time() + timeout
+
+            signaled[daemonname] = (daemonpid, self.stopDeadlines[daemonpid])
+
+        return signaled
 
     def stopRouter(self, wait=True, assertOnError=True, minErrorVersion="5.1"):
         # Stop Running FRR Daemons
-        rundaemons = self.cmd("ls -1 /var/run/%s/*.pid" % self.routertype)
         errors = ""
-        if re.search(r"No such file or directory", rundaemons):
+        signaled = self.signalDaemons()
+        if signaled is None:
+            self.stopLogRings()
             return errors
-        if rundaemons is not None:
-            for d in StringIO.StringIO(rundaemons):
-                daemonpid = self.cmd("cat %s" % d.rstrip()).rstrip()
-                if daemonpid.isdigit() and pid_exists(int(daemonpid)):
-                    daemonname = os.path.basename(d.rstrip().rsplit(".", 1)[0])
-                    logger.info(
-                        "{}: stopping {}".format(
-                            self.name, daemonname
-                        )
-                    )
-                    try:
-                        os.kill(int(daemonpid), signal.SIGTERM)
-                    except OSError as err:
-                        if err.errno == errno.ESRCH:
-                            logger.error("{}: {} left a dead pidfile (pid={})".format(self.name, daemonname, daemonpid))
-                        else:
-                            logger.info("{}: {} could not kill pid {}: {}".format(self.name, daemonname, daemonpid, str(err)))
-
-            if not wait:
-                return errors
-
-            running = self.listDaemons()
-
-            if running:
-                sleep(0.1, "{}: waiting for daemons stopping: {}".format(self.name, ', '.join(running)))
-                running = self.listDaemons()
-
-                counter = 20
-                while counter > 0 and running:
-                    sleep(0.5, "{}: waiting for daemons stopping: {}".format(self.name, ', '.join(running)))
-                    running = self.listDaemons()
-                    counter -= 1
-
-            if running:
-                # 2nd round of kill if daemons didn't exit
-                for d in StringIO.StringIO(rundaemons):
-                    daemonpid = self.cmd("cat %s" % d.rstrip()).rstrip()
-                    if daemonpid.isdigit() and pid_exists(int(daemonpid)):
-                        logger.info(
-                            "{}: killing {}".format(
-                                self.name,
-                                os.path.basename(d.rstrip().rsplit(".", 1)[0]),
-                            )
-                        )
-                        self.cmd("kill -7 %s" % daemonpid)
-                        self.waitOutput()
-                    self.cmd("rm -- {}".format(d.rstrip()))
 
         if not wait:
             return errors
 
+        if signaled:
+            logger.info(
+                "{}: waiting for daemons stopping: {}".format(
+                    self.name, ", ".join(sorted(signaled.keys()))
+                )
+            )
+            killed = wait_pids_exit(dict(signaled.values()))
+            for daemonname, (daemonpid, _) in signaled.items():
+                self.stopDeadlines.pop(daemonpid, None)
+                if daemonpid not in killed:
+                    continue
+
+                # Daemon didn't exit in time and was killed with SIGKILL
+                logger.info("{}: killing {}".format(self.name, daemonname))
+                self.removeDaemonPidfile(daemonname)
+
         errors = self.checkRouterCores(reportOnce=True)
+        # Keep the full debug output of crashed/leaking daemons
+        if errors:
+            self.flushLogRings()
+        self.stopLogRings()
         if self.checkRouterVersion("<", minErrorVersion):
             # ignore errors in old versions
             errors = ""
@@ -1221,8 +2139,79 @@ class Router(Node):
     def getStdOut(self, daemon):
         return self.getLog("out", daemon)
 
-    def getLog(self, log, daemon):
-        return self.cmd("cat {}/{}/{}.{}".format(self.logdir, self.name, daemon, log))
+    def getLog(self, log, daemon, consumer=None):
+        """
+        Returns the `daemon` log (`log` is `log`, `err` or `out`). When
+        `consumer` is set only the data written since the last call with the
+        same consumer is returned.
+        """
+        return self.getLogFile(log, daemon).read(consumer)
+
+    def getLogFile(self, log, daemon):
+        "Returns the LogFile (incremental reader) of a `daemon` log."
+        key = (daemon, log)
+        if key not in self.logFiles:
+            self.logFiles[key] = LogFile(
+                "{}/{}/{}.{}".format(self.logdir, self.name, daemon, log)
+            )
+        return self.logFiles[key]
+
+    def resetLogFiles(self, daemon):
+        "Forgets the read offsets of the (truncated) `daemon` logs."
+        for (ldaemon, _), logfile in self.logFiles.items():
+            if ldaemon == daemon:
+                logfile.reset()
+
+    def daemonOutput(self, daemon):
+        """
+        Returns the shell redirection of the `daemon` standard output: its
+        `.out` file or, when a log ring is configured, a FIFO read by a
+        lib/logring.py process that keeps the debug output in memory and only
+        a small tail on disk (see flushLogRings()).
+
+        Must be called from the router log directory.
+        """
+        if not self.logRingSize:
+            return "> {}.out".format(daemon)
+
+        self.stopLogRings([daemon])
+        fifo = "{}.out.fifo".format(daemon)
+        self.cmd("rm -f {0} && mkfifo {0}".format(fifo))
+        self.cmd(
+            "{} {} --size {} {}.out < {} > {}.ring.err 2>&1 &".format(
+                sys.executable,
+                os.path.join(os.path.dirname(os.path.realpath(__file__)), "logring.py"),
+                self.logRingSize,
+                daemon,
+                fifo,
+                daemon,
+            )
+        )
+        pid = self.cmd("echo $!").strip()
+        if pid.isdigit():
+            self.logRingPids[daemon] = int(pid)
+        return "> {}".format(fifo)
+
+    def flushLogRings(self):
+        "Writes the whole daemon output ring buffers to the `.out` files."
+        for daemon, pid in self.logRingPids.items():
+            if pid_running(pid):
+                logger.info(
+                    "{}: flushing {} output ring buffer".format(self.name, daemon)
+                )
+                os.kill(pid, signal.SIGUSR1)
+
+    def stopLogRings(self, daemons=None):
+        "Stops the output ring buffer processes (without flushing them)."
+        deadlines = {}
+        for daemon in list(self.logRingPids):
+            if daemons is not None and daemon not in daemons:
+                continue
+            pid = self.logRingPids.pop(daemon)
+            if pid_running(pid):
+                os.kill(pid, signal.SIGTERM)
+                deadlines[pid] = time.time() + 5
+        wait_pids_exit(deadlines)
 
     def startRouterDaemons(self, daemons=None):
         "Starts all FRR daemons for this router."
@@ -1246,9 +2235,7 @@ class Router(Node):
 
         # XXX: glue code forward ported from removed function.
         if self.version == None:
-            self.version = self.cmd(
-                os.path.join(self.daemondir, "bgpd") + " -v"
-            ).split()[2]
+            self.version = daemon_version(os.path.join(self.daemondir, "bgpd"))
             logger.info("{}: running version: {}".format(self.name, self.version))
 
         # If `daemons` was specified then some upper API called us with
@@ -1264,9 +2251,10 @@ class Router(Node):
         if "zebra" in daemons_list:
             zebra_path = os.path.join(self.daemondir, "zebra")
             zebra_option = self.daemons_options["zebra"]
+            self.resetLogFiles("zebra")
             self.cmd(
-                "{0} {1} --log stdout --log-level debug -d > zebra.out 2> zebra.err".format(
-                    zebra_path, zebra_option, self.logdir, self.name
+                "{0} {1} --log stdout --log-level debug -d {2} 2> zebra.err".format(
+                    zebra_path, zebra_option, self.daemonOutput("zebra")
                 )
             )
             logger.debug("{}: {} zebra started".format(self, self.routertype))
@@ -1279,9 +2267,10 @@ class Router(Node):
         if "staticd" in daemons_list:
             staticd_path = os.path.join(self.daemondir, "staticd")
             staticd_option = self.daemons_options["staticd"]
+            self.resetLogFiles("staticd")
             self.cmd(
-                "{0} {1} --log stdout --log-level debug -d > staticd.out 2> staticd.err".format(
-                    staticd_path, staticd_option, self.logdir, self.name
+                "{0} {1} --log stdout --log-level debug -d {2} 2> staticd.err".format(
+                    staticd_path, staticd_option, self.daemonOutput("staticd")
                 )
             )
             logger.debug("{}: {} staticd started".format(self, self.routertype))
@@ -1303,9 +2292,13 @@ class Router(Node):
                 continue
 
             daemon_path = os.path.join(self.daemondir, daemon)
+            self.resetLogFiles(daemon)
             self.cmd(
-                "{0} {1} --log stdout --log-level debug -d > {2}.out 2> {2}.err".format(
-                    daemon_path, self.daemons_options.get(daemon, ""), daemon
+                "{0} {1} --log stdout --log-level debug -d {2} 2> {3}.err".format(
+                    daemon_path,
+                    self.daemons_options.get(daemon, ""),
+                    self.daemonOutput(daemon),
+                    daemon,
                 )
             )
             logger.debug("{}: {} {} started".format(self, self.routertype, daemon))
@@ -1345,12 +2338,12 @@ class Router(Node):
                             if pid_exists(int(daemonpid)):
                                 numRunning += 1
                         if wait and numRunning > 0:
-                            sleep(
-                                2,
+                            logger.info(
                                 "{}: waiting for {} daemon to be stopped".format(
                                     self.name, daemon
-                                ),
+                                )
                             )
+                            wait_pids_exit({int(daemonpid): time.time() + 2})
                             # 2nd round of kill if daemons didn't exit
                             for d in StringIO.StringIO(rundaemons):
                                 if re.search(r"%s" % daemon, d):
@@ -1384,58 +2377,28 @@ class Router(Node):
         return errors
 
     def checkRouterCores(self, reportLeaks=True, reportOnce=False):
+        """
+        Looks for core files, memory leaks and AddressSanitizer errors of all
+        router daemons (concurrently). The findings are written to stderr and
+        kept in `self.crashReport`, the errors summary is returned.
+        """
         if reportOnce and not self.reportCores:
-            return
-        reportMade = False
-        traces = ""
-        for daemon in self.daemons:
-            if self.daemons[daemon] == 1:
-                # Look for core file
-                corefiles = glob.glob(
-                    "{}/{}/{}_core*.dmp".format(self.logdir, self.name, daemon)
-                )
-                if len(corefiles) > 0:
-                    backtrace = gdb_core(self, daemon, corefiles)
-                    traces = (
-                        traces
-                        + "\n%s: %s crashed. Core file found - Backtrace follows:\n%s"
-                        % (self.name, daemon, backtrace)
-                    )
-                    reportMade = True
-                elif reportLeaks:
-                    log = self.getStdErr(daemon)
-                    if "memstats" in log:
-                        sys.stderr.write(
-                            "%s: %s has memory leaks:\n" % (self.name, daemon)
-                        )
-                        traces = traces + "\n%s: %s has memory leaks:\n" % (
-                            self.name,
-                            daemon,
-                        )
-                        log = re.sub("core_handler: ", "", log)
-                        log = re.sub(
-                            r"(showing active allocations in memory group [a-zA-Z0-9]+)",
-                            r"\n  ## \1",
-                            log,
-                        )
-                        log = re.sub("memstats:  ", "    ", log)
-                        sys.stderr.write(log)
-                        reportMade = True
-                # Look for AddressSanitizer Errors and append to /tmp/AddressSanitzer.txt if found
-                if checkAddressSanitizerError(
-                    self.getStdErr(daemon), self.name, daemon
-                ):
-                    sys.stderr.write(
-                        "%s: Daemon %s killed by AddressSanitizer" % (self.name, daemon)
-                    )
-                    traces = traces + "\n%s: Daemon %s killed by AddressSanitizer" % (
-                        self.name,
-                        daemon,
-                    )
-                    reportMade = True
-        if reportMade:
-            self.reportCores = False
-        return traces
+            return ""
+        daemons = [d for d in self.daemons if self.daemons[d] == 1]
+        reports = run_parallel(
+            lambda daemon: crashinfo.collect_daemon(self, daemon, reportLeaks),
+            [(daemon,) for daemon in daemons],
+        )
+        report = crashinfo.CrashReport()
+        for daemon_report in reports:
+            report.extend(daemon_report)
+        if len(report) == 0:
+            return ""
+
+        sys.stderr.write(str(report))
+        self.crashReport.extend(report)
+        self.reportCores = False
+        return report.summary()
 
     def checkRouterRunning(self):
         "Check if router daemons are running and collect crashinfo they don't run"
@@ -1452,6 +2415,7 @@ class Router(Node):
         for daemon in self.daemons:
             if (self.daemons[daemon] == 1) and not (daemon in daemonsRunning):
                 sys.stderr.write("%s: Daemon %s not running\n" % (self.name, daemon))
+                self.flushLogRings()
                 if daemon is "staticd":
                     sys.stderr.write(
                         "You may have a copy of staticd installed but are attempting to test against\n"
@@ -1468,17 +2432,9 @@ class Router(Node):
                     gdb_core(self, daemon, corefiles)
                 else:
                     # No core found - If we find matching logfile in /tmp, then print last 20 lines from it.
-                    if os.path.isfile(
-                        "{}/{}/{}.log".format(self.logdir, self.name, daemon)
-                    ):
-                        log_tail = subprocess.check_output(
-                            [
-                                "tail -n20 {}/{}/{}.log 2> /dev/null".format(
-                                    self.logdir, self.name, daemon
-                                )
-                            ],
-                            shell=True,
-                        )
+                    logfile = self.getLogFile("log", daemon)
+                    if os.path.isfile(logfile.path):
+                        log_tail = logfile.tail(20)
                         sys.stderr.write(
                             "\nFrom %s %s %s log file:\n"
                             % (self.routertype, self.name, daemon)
@@ -1487,7 +2443,7 @@ class Router(Node):
 
                 # Look for AddressSanitizer Errors and append to /tmp/AddressSanitzer.txt if found
                 if checkAddressSanitizerError(
-                    self.getStdErr(daemon), self.name, daemon
+                    self.getLog("err", daemon, "asan"), self.name, daemon
                 ):
                     return "%s: Daemon %s not running - killed by AddressSanitizer" % (
                         self.name,
@@ -1512,14 +2468,16 @@ class Router(Node):
 
         # Make sure we have version information first
         if self.version == None:
-            self.version = self.cmd(
-                os.path.join(self.daemondir, "bgpd") + " -v"
-            ).split()[2]
+            self.version = daemon_version(os.path.join(self.daemondir, "bgpd"))
             logger.info("{}: running version: {}".format(self.name, self.version))
 
         rversion = self.version
         if rversion is None:
-            return False
+            raise Exception(
+                "{}: unable to get the router version from '{} -v'".format(
+                    self.name, os.path.join(self.daemondir, "bgpd")
+                )
+            )
 
         result = version_cmp(rversion, version)
         if cmpop == ">=":
@@ -1586,40 +2544,27 @@ class Router(Node):
     def report_memory_leaks(self, filename_prefix, testscript):
         "Report Memory Leaks to file prefixed with given string"
 
-        leakfound = False
         filename = filename_prefix + re.sub(r"\.py", "", testscript) + ".txt"
+        report = ""
         for daemon in self.daemons:
             if self.daemons[daemon] == 1:
-                log = self.getStdErr(daemon)
-                if "memstats" in log:
+                leaks = crashinfo.leak_report(
+                    self.getLogFile("err", daemon).lines(), "####", True
+                )
+                if leaks:
                     # Found memory leak
                     logger.info(
-                        "\nRouter {} {} StdErr Log:\n{}".format(self.name, daemon, log)
-                    )
-                    if not leakfound:
-                        leakfound = True
-                        # Check if file already exists
-                        fileexists = os.path.isfile(filename)
-                        leakfile = open(filename, "a")
-                        if not fileexists:
-                            # New file - add header
-                            leakfile.write(
-                                "# Memory Leak Detection for topotest %s\n\n"
-                                % testscript
-                            )
-                        leakfile.write("## Router %s\n" % self.name)
-                    leakfile.write("### Process %s\n" % daemon)
-                    log = re.sub("core_handler: ", "", log)
-                    log = re.sub(
-                        r"(showing active allocations in memory group [a-zA-Z0-9]+)",
-                        r"\n#### \1\n",
-                        log,
+                        "\nRouter {} {} StdErr Log:\n{}".format(
+                            self.name, daemon, leaks
+                        )
                     )
-                    log = re.sub("memstats:  ", "    ", log)
-                    leakfile.write(log)
-                    leakfile.write("\n")
-        if leakfound:
-            leakfile.close()
+                    report += "### Process %s\n%s\n" % (daemon, leaks)
+        if report:
+            crashinfo.append_file(
+                filename,
+                "## Router %s\n%s" % (self.name, report),
+                "# Memory Leak Detection for topotest %s\n\n" % testscript,
+            )
 
 
 class LinuxRouter(Router):
@@ -1662,5 +2607,18 @@ class LegacySwitch(OVSSwitch):
     "A Legacy Switch without OpenFlow"
 
     def __init__(self, name, **params):
-        OVSSwitch.__init__(self, name, failMode="standalone", **params)
+        # The switch (an OVS bridge) lives in the host namespace: its name
+        # must be unique among pytest-xdist workers. The topology still
+        # refers to it by the original name.
+        nodename = worker_node_name(name)
+        if nodename != name and "dpid" not in params:
+            params["dpid"] = self.workerDpid(name)
+        OVSSwitch.__init__(self, nodename, failMode="standalone", **params)
         self.switchIP = None
+
+    @staticmethod
+    def workerDpid(name):
+        "Datapath ID from the switch and worker numbers (see `worker_node_name`)."
+        switch = re.findall(r"\d+", name)
+        worker = re.findall(r"\d+", get_worker_id())
+        return "%016x" % ((int(worker[0]) << 32) + int(switch[0] if switch else 0))
@@ -0,0 +1,253 @@
+#
+# vtyshprofile.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+vtysh command profiling.
+
+Enabled with `pytest --vtysh-profile` (or the TOPOTESTS_VTYSH_PROFILE
+environment variable). Every vtysh command run through TopoRouter is
+normalized into a pattern (e.g. `show bgp vrf <V> ipv4 unicast <P> json`)
+and its latency and output size are added to histograms per pattern and
+router for the whole run, along with the library functions calling it
+(thin wrappers like run_frr_cmd() are shown next to their caller, e.g.
+`bgp.py:verify_rib (run_frr_cmd)`).
+
+At the end of the session `vtysh_profile.json` (all the data) and
+`vtysh_profile.txt` (patterns ranked by total time) are written to the log
+directory.
+"""
+
+import os
+import re
+import sys
+import threading
+
+from lib import reports
+
+# Histogram bucket upper bounds
+TIME_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20]
+
+# Keywords followed by a name
+NAME_KEYWORDS = {
+    "vrf": "<V>",
+    "interface": "<I>",
+    "route-map": "<RM>",
+    "prefix-list": "<PL>",
+    "community-list": "<CL>",
+    "large-community-list": "<CL>",
+    "extcommunity-list": "<CL>",
+    "peer-group": "<PG>",
+    "access-list": "<AL>",
+    "table": "<N>",
+    "daemon": "<D>",
+}
+
+TOKEN_PATTERNS = [
+    (re.compile(r"^\d+\.\d+\.\d+\.\d+/\d+$"), "<P>"),
+    (re.compile(r"^[0-9a-fA-F.]*:[0-9a-fA-F:.]*/\d+$"), "<P>"),
+    (re.compile(r"^\d+\.\d+\.\d+\.\d+$"), "<A>"),
+    (re.compile(r"^([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2}$"), "<MAC>"),
+    (re.compile(r"^\d+(\.\d+\.\d+\.\d+)?:\d+$"), "<RD>"),
+    (re.compile(r"^[0-9a-fA-F.]*:[0-9a-fA-F.]*:[0-9a-fA-F:.]*$"), "<A>"),
+    (re.compile(r"^\d+$"), "<N>"),
+]
+
+# Files running the vtysh commands (TopoRouter) and recording them
+CALLER_SKIP_FILES = ["topogen.py", "vtyshreplay.py", "telemetry.py", "vtyshprofile.py"]
+# Thin wrappers around the vtysh commands (e.g. run_frr_cmd(), which runs
+# json commands a second time without json for the log): their caller is
+# the interesting one.
+WRAPPER_FILES = ["topotest.py"]
+WRAPPER_FUNCTIONS = ["run_frr_cmd"]
+
+_lock = threading.Lock()
+_patterns = {}
+
+
+# enabled(): returns `True` when the vtysh commands are being profiled.
+# enable(value=True): enables (or disables) the vtysh profiling.
+enabled, enable = reports.toggle()
+
+
+def reset():
+    "Forgets all the collected data."
+    with _lock:
+        _patterns.clear()
+
+
+def normalize_token(token):
+    for regexp, placeholder in TOKEN_PATTERNS:
+        if regexp.match(token):
+            return placeholder
+    return token
+
+
+def normalize_command(command):
+    """
+    Returns the pattern of the vtysh `command`: names, addresses, prefixes
+    and numbers are replaced by placeholders. Multiple commands are reduced
+    to the first one followed by `[+<N>]`.
+    """
+    lines = [line.strip() for line in command.strip().splitlines() if line.strip()]
+    if not lines:
+        return ""
+
+    result = []
+    placeholder = None
+    for token in lines[0].split():
+        if placeholder is not None:
+            result.append(placeholder)
+            placeholder = None
+            continue
+        result.append(normalize_token(token))
+        placeholder = NAME_KEYWORDS.get(token.lower())
+    pattern = " ".join(result)
+    if len(lines) > 1:
+        pattern += " [+{}]".format(len(lines) - 1)
+    return pattern
+
+
+def _bucket(buckets, value):
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return index
+    return len(buckets)
+
+
+def _caller():
+    """
+    Returns the library or test function running the vtysh command, with the
+    innermost thin wrapper it went through (e.g.
+    `bgp.py:verify_rib (run_frr_cmd)`).
+    """
+    frame = sys._getframe(1)
+    wrapper = None
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        function = frame.f_code.co_name
+        if filename in CALLER_SKIP_FILES:
+            pass
+        elif filename in WRAPPER_FILES or function in WRAPPER_FUNCTIONS:
+            wrapper = wrapper or function
+        elif wrapper is not None:
+            return "{}:{} ({})".format(filename, function, wrapper)
+        else:
+            return "{}:{}".format(filename, function)
+        frame = frame.f_back
+    return "<unknown>"
+
+
+def new_entry():
+    return {
+        "calls": 0,
+        "time": 0.0,
+        "max_time": 0.0,
+        "bytes": 0,
+        "max_bytes": 0,
+        "time_histogram": [0] * (len(TIME_BUCKETS) + 1),
+        "size_histogram": [0] * (len(SIZE_BUCKETS) + 1),
+        "callers": {},
+    }
+
+
+def record(router, command, seconds, size):
+    "Adds a vtysh call to the `command` pattern histograms of `router`."
+    if not enabled():
+        return
+    pattern = normalize_command(command)
+    caller = _caller()
+    with _lock:
+        entry = _patterns.setdefault(pattern, {}).get(router)
+        if entry is None:
+            entry = _patterns[pattern][router] = new_entry()
+        entry["calls"] += 1
+        entry["time"] += seconds
+        entry["max_time"] = max(entry["max_time"], seconds)
+        entry["bytes"] += size
+        entry["max_bytes"] = max(entry["max_bytes"], size)
+        entry["time_histogram"][_bucket(TIME_BUCKETS, seconds)] += 1
+        entry["size_histogram"][_bucket(SIZE_BUCKETS, size)] += 1
+        entry["callers"][caller] = entry["callers"].get(caller, 0) + 1
+
+
+def report():
+    """
+    Returns the profile: a dictionary by pattern with the totals of all
+    routers (`total`) and the data per router (`routers`).
+    """
+    with _lock:
+        result = {}
+        for pattern, routers in _patterns.items():
+            total = new_entry()
+            for entry in routers.values():
+                for key in ["calls", "time", "bytes"]:
+                    total[key] += entry[key]
+                for key in ["max_time", "max_bytes"]:
+                    total[key] = max(total[key], entry[key])
+                for key in ["time_histogram", "size_histogram"]:
+                    total[key] = [a + b for a, b in zip(total[key], entry[key])]
+                for caller, count in entry["callers"].items():
+                    total["callers"][caller] = total["callers"].get(caller, 0) + count
+            result[pattern] = {"total": total, "routers": dict(routers)}
+        return result
+
+
+def format_report(profile, top=50):
+    "Returns the `top` patterns of `profile` by total time, as text."
+    lines = [
+        "{:>8} {:>10} {:>8} {:>8} {:>10}  {}".format(
+            "calls", "time(s)", "avg(ms)", "max(ms)", "avg(KB)", "pattern"
+        )
+    ]
+    ranked = sorted(profile.items(), key=lambda item: -item[1]["total"]["time"])
+    for pattern, data in ranked[:top]:
+        total = data["total"]
+        lines.append(
+            "{:>8} {:>10.2f} {:>8.1f} {:>8.1f} {:>10.1f}  {}".format(
+                total["calls"],
+                total["time"],
+                total["time"] * 1000 / total["calls"],
+                total["max_time"] * 1000,
+                total["bytes"] / 1024.0 / total["calls"],
+                pattern,
+            )
+        )
+        callers = sorted(total["callers"].items(), key=lambda item: -item[1])
+        for caller, count in callers[:3]:
+            lines.append("{}<- {} ({})".format(" " * 50, caller, count))
+    return "\n".join(lines) + "\n"
+
+
+def write_report(directory):
+    "Writes the profile to `directory` (JSON and text versions)."
+    profile = report()
+    if not profile:
+        return None
+    data = {
+        "time_buckets": TIME_BUCKETS,
+        "size_buckets": SIZE_BUCKETS,
+        "patterns": profile,
+    }
+    return reports.write_json_report(
+        directory, "vtysh_profile", data, format_report(profile)
+    )
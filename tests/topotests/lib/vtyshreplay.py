@@ -0,0 +1,306 @@
+#
+# vtyshreplay.py
+# Library of helper functions for NetDEF Topology Tests
+#
+# Copyright (c) 2020 by
+# Network Device Education Foundation, Inc. ("NetDEF")
+#
+# Permission to use, copy, modify, and/or distribute this software
+# for any purpose with or without fee is hereby granted, provided
+# that the above copyright notice and this permission notice appear
+# in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND NETDEF DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL NETDEF BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY
+# DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+# WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE
+# OF THIS SOFTWARE.
+#
+
+"""
+vtysh record and replay.
+
+Run the tests with `pytest --vtysh-record=<archive>` (or the
+TOPOTESTS_VTYSH_RECORD environment variable) and every
+TopoRouter.vtysh_cmd() and vtysh_multicmd() output is recorded by test
+module, router and command, in order, and written at the end of the session
+to the archive (gzip compressed JSON, repeated outputs are stored once with a
+count).
+
+The archive can then be replayed without namespaces nor daemons, to test or
+profile the library helpers (e.g. `verify_rib()` or
+`verify_bgp_convergence()`) in milliseconds:
+
+    tgen = ReplayTopogen("bgp_basic.json.gz", "test_bgp_basic")
+    assert verify_bgp_convergence(tgen, topo) is True
+
+A replay serves the outputs of one test module (it can be omitted when the
+archive has only one). Every (router, command) serves its recorded outputs
+in their order and then keeps serving the last one. With start_replay() the
+TopoRouter objects of a topology also serve the archive instead of running
+vtysh.
+
+The library helpers don't wait while replaying: the `retry` sleeps are
+skipped and no support bundle is generated on failure (see replaying()).
+"""
+
+import os
+import json
+import gzip
+import time
+import threading
+
+from lib.topolog import logger
+from lib import telemetry
+
+ARCHIVE_VERSION = 2
+
+_lock = threading.Lock()
+_recording = [False]
+_recorded = {}
+_replayer = [None]
+
+
+class ReplayError(Exception):
+    "A command was not recorded in the archive being replayed."
+
+    pass
+
+
+def command_key(command, daemon=None):
+    "Returns the archive key of `command` run on `daemon` (all when `None`)."
+    command = command.strip()
+    if daemon is None:
+        return command
+    return "-d {} {}".format(daemon, command)
+
+
+def recording():
+    "Returns `True` when the vtysh outputs are being recorded."
+    return _recording[0]
+
+
+def start_recording():
+    "Starts recording the vtysh outputs (previous records are dropped)."
+    with _lock:
+        _recorded.clear()
+        _recording[0] = True
+
+
+def stop_recording():
+    "Stops recording the vtysh outputs."
+    _recording[0] = False
+
+
+def record(router, command, daemon, output, module=None):
+    "Records the `output` of `command` on `router` of `module` when recording."
+    if not _recording[0]:
+        return
+    key = command_key(command, daemon)
+    with _lock:
+        routers = _recorded.setdefault(module or "<unknown>", {})
+        outputs = routers.setdefault(router, {}).setdefault(key, [])
+        # Polling loops repeat the same output: keep a count
+        if outputs and outputs[-1][0] == output:
+            outputs[-1][1] += 1
+        else:
+            outputs.append([output, 1])
+
+
+def write_archive(path):
+    "Writes the recorded outputs to the archive `path`."
+    with _lock:
+        content = json.dumps(
+            {"version": ARCHIVE_VERSION, "modules": _recorded}, sort_keys=True
+        )
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        archive = gzip.open(path, "wb")
+        try:
+            archive.write(content.encode("utf-8"))
+        finally:
+            archive.close()
+    except (IOError, OSError) as error:
+        logger.warning("vtysh record: failed to write archive: {}".format(error))
+        return None
+    logger.info("vtysh record archive written to {}".format(path))
+    return path
+
+
+def load_archive(path):
+    """
+    Returns the recorded outputs of the archive `path` by test module, router
+    and command.
+    """
+    archive = gzip.open(path, "rb")
+    try:
+        content = json.loads(archive.read().decode("utf-8"))
+    finally:
+        archive.close()
+    if content.get("version") != ARCHIVE_VERSION:
+        raise ValueError(
+            "{}: unsupported archive version {}".format(path, content.get("version"))
+        )
+    return content["modules"]
+
+
+class Replayer(object):
+    """
+    Serves the outputs of test module `module` of a vtysh record archive
+    (path or load_archive()). `module` can be omitted when the archive has
+    only one.
+    """
+
+    def __init__(self, archive, module=None):
+        if not isinstance(archive, dict):
+            archive = load_archive(archive)
+        if module is None:
+            if len(archive) != 1:
+                raise ValueError(
+                    "archive has {} modules, choose one of: {}".format(
+                        len(archive), ", ".join(sorted(archive))
+                    )
+                )
+            module = list(archive)[0]
+        if module not in archive:
+            raise ValueError("module not recorded in the archive: {}".format(module))
+        self.module = module
+        self.routers = archive[module]
+        self.lock = threading.Lock()
+        # Position (output index, times served) by router and command
+        self.cursors = {}
+
+    def replay(self, router, command, daemon=None):
+        "Returns the next recorded output of `command` on `router`."
+        key = command_key(command, daemon)
+        try:
+            outputs = self.routers[router][key]
+        except KeyError:
+            raise ReplayError(
+                "{}: command not recorded: {}".format(router, key.splitlines()[0])
+            )
+        with self.lock:
+            index, served = self.cursors.get((router, key), (0, 0))
+            output, count = outputs[index]
+            served += 1
+            if served >= count and index + 1 < len(outputs):
+                index, served = index + 1, 0
+            self.cursors[(router, key)] = (index, served)
+        return output
+
+    def rewind(self):
+        "Serves all the outputs again from the first one."
+        with self.lock:
+            self.cursors.clear()
+
+
+def start_replay(archive, module=None):
+    """
+    Makes the TopoRouter vtysh commands serve `archive` (a path or a
+    Replayer; see Replayer for `module`) instead of running vtysh. Returns
+    the Replayer.
+    """
+    replayer = archive
+    if not isinstance(replayer, Replayer):
+        replayer = Replayer(archive, module)
+    _replayer[0] = replayer
+    return replayer
+
+
+def stop_replay():
+    "Makes the TopoRouter vtysh commands run vtysh again."
+    _replayer[0] = None
+
+
+def replaying(tgen=None):
+    """
+    Returns `True` when the vtysh outputs are replayed: by the TopoRouter
+    objects (start_replay()) or by `tgen` (a ReplayTopogen).
+    """
+    return _replayer[0] is not None or isinstance(tgen, ReplayTopogen)
+
+
+def replay(router, command, daemon=None):
+    """
+    Returns the replayed output of `command` on `router`, or `None` when not
+    replaying.
+    """
+    replayer = _replayer[0]
+    if replayer is None:
+        return None
+    return replayer.replay(router, command, daemon)
+
+
+class ReplayRouter(object):
+    "Router serving the vtysh outputs of a Replayer, see TopoRouter."
+
+    def __init__(self, name, replayer):
+        self.name = name
+        self.replayer = replayer
+
+    def __str__(self):
+        return "ReplayRouter<{}>".format(self.name)
+
+    def vtysh_cmd(self, command, isjson=False, daemon=None):
+        "See TopoRouter.vtysh_cmd()."
+        if command.find("\n") != -1:
+            return self.vtysh_multicmd(command, daemon=daemon)
+
+        start = time.time()
+        output = self.replayer.replay(self.name, command, daemon)
+        telemetry.record_vtysh(self.name, command, time.time() - start, len(output))
+        if isjson is False:
+            return output
+
+        try:
+            return json.loads(output)
+        except ValueError:
+            logger.warning("vtysh_cmd: failed to convert json output")
+            return {}
+
+    def vtysh_multicmd(self, commands, pretty_output=True, daemon=None):
+        "See TopoRouter.vtysh_multicmd()."
+        start = time.time()
+        output = self.replayer.replay(self.name, commands, daemon)
+        telemetry.record_vtysh(self.name, commands, time.time() - start, len(output))
+        return output
+
+    def run(self, command):
+        "Shell commands are not recorded."
+        raise ReplayError(
+            "{}: shell commands can't be replayed: {}".format(self.name, command)
+        )
+
+
+class ReplayTopogen(object):
+    """
+    Stand-in for Topogen serving the routers of test module `modname` of a
+    vtysh record archive (a path or a Replayer; see Replayer for `modname`),
+    for the library helpers taking a `tgen`.
+    """
+
+    def __init__(self, archive, modname=None):
+        replayer = archive
+        if not isinstance(replayer, Replayer):
+            replayer = Replayer(archive, modname)
+        self.replayer = replayer
+        self.modname = replayer.module
+        self.net = None
+        self.gears = dict(
+            (name, ReplayRouter(name, self.replayer)) for name in self.replayer.routers
+        )
+
+    def routers(self):
+        "Returns the replayed routers by name."
+        return dict(self.gears)
+
+    def has_errors(self):
+        return False
+
+    def routers_have_failure(self):
+        return False
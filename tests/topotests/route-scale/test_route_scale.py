@@ -124,9 +124,15 @@ def run_one_setup(r1, s):
 
     logger.info("Testing 1 million routes X {} ecmp".format(s['ecmp']))
 
-    r1.vtysh_cmd("sharp install route 1.0.0.0 \
-                  nexthop-group {} 1000000".format(s['nhg']),
-                 isjson=False)
+    # Follow the kernel table to wake up as soon as all routes are there
+    with topotest.kernel_monitor(r1, links=False, rules=False) as kernel:
+        r1.vtysh_cmd("sharp install route 1.0.0.0 \
+                      nexthop-group {} 1000000".format(s['nhg']),
+                     isjson=False)
+        success = kernel.wait(
+            lambda mon: mon.route_count(protocol=194) == 1000000, count * wait
+        )
+    assert success, "Route scale test: kernel routes not installed"
 
     test_func = partial(topotest.router_json_cmp, r1, "show ip route summary json", expected_installed)
     success, result = topotest.run_and_expect(test_func, None, count, wait)
@@ -135,7 +141,13 @@ def run_one_setup(r1, s):
     output = r1.vtysh_cmd("sharp data route", isjson=False)
     logger.info("1 million routes X {} ecmp installed".format(s['ecmp']))
     logger.info(output)
-    r1.vtysh_cmd("sharp remove route 1.0.0.0 1000000", isjson=False)
+    with topotest.kernel_monitor(r1, links=False, rules=False) as kernel:
+        r1.vtysh_cmd("sharp remove route 1.0.0.0 1000000", isjson=False)
+        success = kernel.wait(
+            lambda mon: mon.route_count(protocol=194) == 0, count * wait
+        )
+    assert success, "Route scale test: kernel routes not removed"
+
     test_func = partial(topotest.router_json_cmp, r1, "show ip route summary json", expected_removed)
     success, result = topotest.run_and_expect(test_func, None, count, wait)
     assert success, "Route scale test remove failed:\n{}".format(result)